@@ -1,11 +1,14 @@
 import streamlit as st
 import os
-import pandas as pd
 from pathlib import Path
 import config
-from tta_core import TTADocumentAnalyzer, TTAReconciliationSystem
+from tta_core import TTADocumentAnalyzer, TTAReconciliationSystem, with_readable_key
+from tta_dedup import DocumentHashIndex, can_reuse, diff_results
+from tta_store import ExtractionStore
+from auditor_page import attach_run, publish_snapshot
+from tta_snapshot import ResultSnapshot
+from tta_results import get_shared_results
 import json
-from datetime import datetime
 import time
 
 def show():
@@ -81,9 +84,16 @@ def show():
     
     st.markdown("---")
     
+    # ตัวเลือกใช้ผลวิเคราะห์เดิมกับเอกสารที่สแกนซ้ำ
+    reuse_previous = st.checkbox(
+        "♻️ ใช้ผลวิเคราะห์เดิมกับเอกสารที่สแกนซ้ำ",
+        value=config.DEDUP_ENABLED,
+        help="ไฟล์เดียวกับที่เคยวิเคราะห์แล้วจะไม่เรียก Gemini ซ้ำ เอกสารที่หน้าคล้ายกัน (perceptual hash) จะวิเคราะห์ใหม่แล้วเทียบกับผลเดิม"
+    )
+    
     # ปุ่มเริ่มประมวลผล
     if st.button("🚀 เริ่มประมวลผลทั้งหมด", type="primary", use_container_width=True):
-        process_all_files()
+        process_all_files(reuse_previous=reuse_previous)
     
     # แสดงผลลัพธ์ถ้ามี
     if 'processing_done' in st.session_state and st.session_state.processing_done:
@@ -187,7 +197,7 @@ def check_and_display_files():
     st.markdown('</div>', unsafe_allow_html=True)
 
 
-def process_all_files():
+def process_all_files(reuse_previous: bool = False):
     """ประมวลผลไฟล์ทั้งหมดอัตโนมัติ"""
     
     # ตรวจสอบไฟล์
@@ -214,43 +224,106 @@ def process_all_files():
         status_text.markdown("### 📄 Step 1: วิเคราะห์เอกสาร PDF")
         analyzer = TTADocumentAnalyzer(config.GEMINI_API_KEY)
         
-        analysis_results = []
-        json_files = []
+        try:
+            analysis_results = []
+            doc_keys = []
+            store = ExtractionStore()
+        
+            # หาเอกสารที่เคยวิเคราะห์แล้ว (สแกนซ้ำ) เพื่อใช้ผลเดิม
+            hash_index = None
+            reused = {}
+            similar = {}
+            if reuse_previous:
+                hash_index = DocumentHashIndex()
+                with st.spinner("กำลังตรวจเอกสารที่เคยวิเคราะห์แล้ว..."):
+                    for pdf_file in pdf_files:
+                        match = hash_index.find_match(str(pdf_file))
+                        if can_reuse(match):
+                            reused[str(pdf_file)] = match
+                        elif match:
+                            # near match: วิเคราะห์ใหม่แล้วเทียบกับผลเดิม (แบบฟอร์มเดียวกันอาจต่างแค่ vendor / rate)
+                            similar[str(pdf_file)] = match
+        
+            # โหมด batch: วิเคราะห์ทั้งหมดก่อน แล้วค่อยแสดงผลทีละไฟล์
+            batch_results = None
+            if analyzer.batching:
+                pending = [str(f) for f in pdf_files if str(f) not in reused]
+                with st.spinner(f"กำลังวิเคราะห์แบบ batch {len(pending)} ไฟล์..."):
+                    batch_results = analyzer.analyze_documents(pending)
         
-        for idx, pdf_file in enumerate(pdf_files):
-            progress = (idx + 1) / (len(pdf_files) + 2)  # +2 สำหรับ AP/AR processing
-            progress_bar.progress(progress)
+            for idx, pdf_file in enumerate(pdf_files):
+                progress = (idx + 1) / (len(pdf_files) + 2)  # +2 สำหรับ AP/AR processing
+                progress_bar.progress(progress)
             
-            with st.expander(f"📄 {pdf_file.name}", expanded=True):
-                st.info(f"กำลังวิเคราะห์... ({idx + 1}/{len(pdf_files)})")
+                with st.expander(f"📄 {pdf_file.name}", expanded=True):
+                    match = reused.get(str(pdf_file))
+                    if match:
+                        result = match['entry']['result']
+                        new_pages = match['new_pages']
+                        st.success(
+                            f"♻️ ใช้ผลวิเคราะห์เดิมจาก {match['entry']['file']} "
+                            f"(เหมือนกัน {match['similarity'] * 100:.0f}%)"
+                        )
+                        if not match['exact']:
+                            st.warning("⚠️ ไม่ใช่ไฟล์เดียวกัน (หน้าคล้ายกัน) - ตรวจสอบ vendor / rate / ยอดเงิน")
+                        if new_pages:
+                            st.warning(f"⚠️ หน้าที่ไม่ตรงกับเอกสารเดิม: {', '.join(map(str, new_pages))} - ตรวจสอบว่ามีเงื่อนไขเพิ่มหรือไม่")
+                    elif batch_results is not None:
+                        result = batch_results.get(str(pdf_file))
+                    else:
+                        st.info(f"กำลังวิเคราะห์... ({idx + 1}/{len(pdf_files)})")
+                        result = analyzer.analyze_document(str(pdf_file))
+                    
+                    candidate = similar.get(str(pdf_file))
+                    if result and candidate:
+                        differences = diff_results(candidate['entry']['result'], result)
+                        if differences:
+                            st.info(
+                                f"🔎 คล้ายเอกสารเดิม {candidate['entry']['file']} "
+                                f"({candidate['similarity'] * 100:.0f}%) แต่ผลต่างกัน: " + " · ".join(differences)
+                            )
+                        else:
+                            st.info(f"🔎 ผลตรงกับเอกสารเดิม {candidate['entry']['file']}")
                 
-                result = analyzer.analyze_document(str(pdf_file))
+                    if result and not match and hash_index is not None:
+                        hash_index.add(str(pdf_file), result)
                 
-                if result:
-                    st.success("✅ วิเคราะห์สำเร็จ")
+                    if result:
+                        if not match:
+                            st.success("✅ วิเคราะห์สำเร็จ")
                     
-                    # แสดงข้อมูลสรุป
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("Vendor Code", result.get('vendor_code', 'N/A'))
-                    with col2:
-                        st.metric("Division", result.get('Division_name', 'N/A'))
-                    with col3:
-                        st.metric("Allowances", len(result.get('allowances', [])))
+                        # แสดงข้อมูลสรุป
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("Vendor Code", result.get('vendor_code', 'N/A'))
+                        with col2:
+                            st.metric("Division", result.get('Division_name', 'N/A'))
+                        with col3:
+                            st.metric("Allowances", len(result.get('allowances', [])))
                     
-                    # บันทึก JSON
-                    json_filename = pdf_file.stem + '_summary.json'
-                    # สร้าง folder ถ้ายังไม่มี
-                    temp_folder = Path(config.TEMP_FOLDER)
-                    temp_folder.mkdir(parents=True, exist_ok=True)
+                        # บันทึกลง extraction store
+                        store.append(pdf_file.stem, result)
                     
-                    json_path = temp_folder / json_filename
-                    analyzer.save_summary(result, str(json_path))
-                    
-                    analysis_results.append(result)
-                    json_files.append(str(json_path.absolute()))
-                else:
-                    st.error("❌ การวิเคราะห์ล้มเหลว")
+                        analysis_results.append(result)
+                        doc_keys.append(pdf_file.stem)
+                    else:
+                        st.error("❌ การวิเคราะห์ล้มเหลว")
+        
+            # index ของ extraction store บันทึกครั้งเดียวต่อ run
+            store.save_index()
+            if hash_index is not None:
+                hash_index.save()
+        
+            # สรุปการใช้ token ของ Gemini
+            usage = analyzer.usage_stats()
+            st.caption(
+                f"🔢 Gemini: {usage['requests']} requests · "
+                f"input {usage['prompt_tokens']:,} tokens (cached {usage['cached_tokens']:,}) · "
+                f"output {usage['output_tokens']:,} tokens"
+            )
+        finally:
+            # ลบ context cache ของ Gemini แม้การวิเคราะห์ล้มเหลวกลางทาง
+            analyzer.close()
         
         # Step 2: คำนวณและเปรียบเทียบ
         if analysis_results:
@@ -261,12 +334,8 @@ def process_all_files():
             recon = TTAReconciliationSystem(base_folder=config.TEMP_FOLDER)
             
             # โหลด TTA
-            st.info("📊 กำลังโหลดข้อมูล TTA...")
-            st.write(f"Debug: พบ {len(json_files)} ไฟล์ JSON")
-            for jf in json_files:
-                st.write(f"- {jf}")
-            
-            tta_loaded = recon.load_tta_summaries(json_files)
+            st.info(f"📊 กำลังโหลดข้อมูล TTA ({len(doc_keys)} เอกสาร)...")
+            tta_loaded = recon.load_tta_summaries(keys=doc_keys)
             
             if tta_loaded:
                 # โหลด AP
@@ -295,18 +364,31 @@ def process_all_files():
                                 if reconciliation is not None:
                                     st.success(f"✅ เปรียบเทียบสำเร็จ: {len(reconciliation)} รายการ")
                         
+                        # เปรียบเทียบรายงวดตาม payment_terms
+                        periods = recon.reconcile_by_period()
+                        if periods is not None:
+                            st.success(f"✅ เปรียบเทียบรายงวดสำเร็จ: {len(periods)} รายการ")
+                        
                         # Export ผลลัพธ์
                         progress_bar.progress(0.95)
                         st.info("💾 กำลัง Export รายงาน...")
-                        output_file = recon.export_results(output_folder=config.OUTPUT_FOLDER)
+                        output_file = recon.export_results(
+                            output_folder=config.OUTPUT_FOLDER,
+                            run_info=analyzer.run_info(),
+                            inputs={'documents': [str(f) for f in pdf_files]}
+                        )
                         
                         if output_file:
                             st.success(f"✅ Export สำเร็จ: {os.path.basename(output_file)}")
                             
-                            # เก็บข้อมูลใน session state
-                            st.session_state.reconciliation_system = recon
+                            # เก็บเฉพาะผลลัพธ์แบบย่อใน session (ข้อมูล AP/AR/TTA ดิบถูกทิ้งเมื่อจบ run)
+                            snapshot = ResultSnapshot.from_system(recon, output_file)
+                            snapshot.save()
+                            st.session_state.reconciliation_system = snapshot
                             st.session_state.processing_done = True
                             st.session_state.output_file = output_file
+                            st.session_state.exported_files = recon.exported_files
+                            st.session_state.run_id = publish_snapshot(snapshot)
                             
                             progress_bar.progress(1.0)
                             status_text.markdown("### ✅ ประมวลผลเสร็จสมบูรณ์!")
@@ -319,8 +401,7 @@ def process_all_files():
                     st.error("❌ โหลดข้อมูล AP ล้มเหลว")
             else:
                 st.error("❌ โหลดข้อมูล TTA ล้มเหลว")
-                st.write(f"Debug: json_files = {json_files}")
-                st.write(f"Debug: TEMP_FOLDER = {config.TEMP_FOLDER}")
+                st.caption(f"ไฟล์ผลการสกัดข้อมูล: {store.path}")
         
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -397,7 +478,7 @@ def display_results():
             
             st.markdown("### 💰 ยอดที่ควรเรียกเก็บ")
             st.dataframe(
-                recon.calculated_allowances.style.format({
+                with_readable_key(recon.calculated_allowances).style.format({
                     'total_purchase': '฿{:,.2f}',
                     'should_collect': '฿{:,.2f}',
                     'rate_percent': '{:.2f}%',
@@ -411,37 +492,49 @@ def display_results():
     st.markdown("---")
     st.markdown("### 💾 ดาวน์โหลดรายงาน")
     
-    if 'output_file' in st.session_state and os.path.exists(st.session_state.output_file):
-        with open(st.session_state.output_file, 'rb') as f:
+    exported = st.session_state.get('exported_files', {})
+    col1, col2 = st.columns(2)
+    
+    excel_file = exported.get('excel')
+    if excel_file and os.path.exists(excel_file):
+        with col1, open(excel_file, 'rb') as f:
             st.download_button(
                 label="📥 ดาวน์โหลด Excel Report",
                 data=f,
-                file_name=os.path.basename(st.session_state.output_file),
+                file_name=os.path.basename(excel_file),
                 mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
                 type="primary",
                 use_container_width=True
             )
     
+    bundle_file = exported.get('bundle')
+    if bundle_file and os.path.exists(bundle_file):
+        with col2, open(bundle_file, 'rb') as f:
+            st.download_button(
+                label="📦 ดาวน์โหลด Result Bundle",
+                data=f,
+                file_name=os.path.basename(bundle_file),
+                mime='application/zip',
+                help="Parquet + manifest เปิดใน Dashboard ได้เร็วกว่า Excel",
+                use_container_width=True
+            )
+    
     # ปุ่มไป Dashboard
     st.markdown("---")
     if st.button("📊 ดูผลใน Dashboard", type="primary", use_container_width=True):
-        # โหลดข้อมูลเข้า auditor mode
-        if 'output_file' in st.session_state:
-            try:
-                calculated_df = pd.read_excel(st.session_state.output_file, sheet_name='Calculated')
-                reconciliation_df = pd.read_excel(st.session_state.output_file, sheet_name='Reconciliation')
-                summary_df = pd.read_excel(st.session_state.output_file, sheet_name='Summary')
-                
-                st.session_state.auditor_data = {
-                    'calculated': calculated_df,
-                    'reconciliation': reconciliation_df,
-                    'summary': summary_df,
-                    'upload_time': datetime.now()
-                }
-                
-                st.session_state.mode = "auditor"
-                st.rerun()
-            except Exception as e:
-                st.error(f"❌ Error loading data: {e}")
+        # เปิด run นี้ใน auditor mode จาก shared store (ไม่ต้องอ่านไฟล์ Excel กลับมา)
+        if recon.reconciliation_result is None:
+            st.error("❌ ไม่มีข้อมูล AR สำหรับ Dashboard")
+        elif 'output_file' in st.session_state:
+            store = get_shared_results()
+            handle = store.attach(st.session_state.get('run_id', ''))
+            if handle is None:
+                # run ถูก evict ไปแล้ว: publish ใหม่จากระบบที่ยังอยู่ใน session
+                st.session_state.run_id = publish_snapshot(recon)
+                handle = store.attach(st.session_state.run_id)
+            
+            attach_run(handle)
+            st.session_state.mode = "auditor"
+            st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
@@ -4,7 +4,21 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import os
+import hashlib
 import config
+from tta_charts import dataset_fingerprint, figure_cache, histogram_trace, top_n
+from tta_artifacts import FAILED, PENDING, READY, artifact_name, get_export_cache
+from tta_bundle import BUNDLE_EXTENSION, write_bundle
+from tta_core import with_readable_key
+from tta_excel import write_workbook
+from tta_keys import parse_match_key
+from tta_results import get_shared_results
+from tta_statements import export_vendor_statements
+from tta_snapshot import ResultSnapshot, list_snapshots, snapshot_run_id
+from tta_workbook import WorkbookError, read_results
+from tta_scenarios import ScenarioEngine, summarize_scenarios
+
+DASHBOARD_VIEWS = ["📊 Dashboard Overview", "🔍 Vendor Details", "📈 Advanced Analysis"]
 
 def show():
     # Custom CSS
@@ -73,34 +87,93 @@ def display_no_data():
         </div>
     """, unsafe_allow_html=True)
     
+    store = get_shared_results()
+    labels = {
+        run['run_id']: f"{run['label']} ({run['created']:%d/%m %H:%M}, เปิดอยู่ {run['sessions']} session)"
+        for run in store.runs()
+    }
+    # snapshot ที่บันทึกไว้บนดิสก์ (เช่น หลังรีสตาร์ทแอป) ที่ยังไม่อยู่ในหน่วยความจำ
+    saved = {snapshot_run_id(path): path for path in list_snapshots()}
+    for run_id in saved:
+        labels.setdefault(run_id, f"💾 {run_id}")
+    
+    if labels:
+        st.markdown("### 🔗 เปิดผลที่ประมวลผลไว้แล้ว")
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            run_id = st.selectbox("Run", list(labels), format_func=labels.get, label_visibility="collapsed")
+        with col2:
+            if st.button("เปิด", use_container_width=True):
+                handle = store.attach(run_id)
+                if handle is None and run_id in saved:
+                    snapshot = ResultSnapshot.load(saved[run_id])
+                    if snapshot is not None and snapshot.reconciliation_result is not None:
+                        handle = store.attach(publish_snapshot(snapshot, run_id))
+                if handle is not None:
+                    attach_run(handle)
+                    st.rerun()
+                st.error("❌ เปิด Run นี้ไม่ได้")
+    
     st.markdown("### 📥 อัปโหลดไฟล์ Excel (Optional)")
     
     excel_file = st.file_uploader(
         "อัปโหลดไฟล์ผลลัพธ์ที่ Export จาก Analysis Mode",
-        type=['xlsx'],
-        help="ไฟล์ Excel ที่มี 3 sheets: Calculated, Reconciliation, Summary"
+        type=['xlsx', 'zip'],
+        help="ไฟล์ Excel ที่มี 3 sheets: Calculated, Reconciliation, Summary หรือ Result Bundle (.bundle.zip เปิดเร็วกว่า)"
     )
     
     if excel_file:
         try:
-            calculated_df = pd.read_excel(excel_file, sheet_name='Calculated')
-            reconciliation_df = pd.read_excel(excel_file, sheet_name='Reconciliation')
-            summary_df = pd.read_excel(excel_file, sheet_name='Summary')
+            # ไฟล์เดียวกัน (hash เดียวกัน) ที่มีคนอัปโหลดไว้แล้วใช้ข้อมูลชุดเดิม ไม่ต้องอ่านซ้ำ
+            run_id = f"upload_{hashlib.sha1(excel_file.getvalue()).hexdigest()[:12]}"
+            handle = store.attach(run_id)
+            if handle is None:
+                frames = read_results(excel_file, excel_file.name)
+                store.publish(run_id, excel_file.name, frames)
+                handle = store.attach(run_id)
             
-            st.session_state.auditor_data = {
-                'calculated': calculated_df,
-                'reconciliation': reconciliation_df,
-                'summary': summary_df,
-                'upload_time': datetime.now()
-            }
+            attach_run(handle)
             
             st.success("✅ โหลดข้อมูลสำเร็จ!")
             st.rerun()
             
+        except WorkbookError as e:
+            st.error(f"❌ ไฟล์ไม่ถูกต้อง: {e}")
         except Exception as e:
             st.error(f"❌ Error loading file: {e}")
 
 
+def publish_snapshot(snapshot, run_id=None):
+    """เก็บผลของ run ไว้ใน shared store ให้ทุก session เปิดดูได้ (run id เริ่มต้น = ชื่อไฟล์ export)"""
+    run_id = run_id or os.path.basename(snapshot.output_file).split('.')[0]
+    frames = {
+        'calculated': with_readable_key(snapshot.calculated_allowances),
+        'reconciliation': (
+            with_readable_key(snapshot.reconciliation_result) if snapshot.reconciliation_result is not None else None
+        ),
+        'summary': snapshot.generate_summary_report(),
+        'periods': with_readable_key(snapshot.period_result) if snapshot.period_result is not None else None,
+    }
+    label = os.path.basename(snapshot.output_file) if snapshot.output_file else run_id
+    get_shared_results().publish(run_id, label, frames, system=snapshot)
+    return run_id
+
+
+def attach_run(handle):
+    """ให้ session นี้ใช้ run จาก shared store (ปล่อย run เดิมของ session ก่อน)"""
+    previous = st.session_state.get('run_handle')
+    if previous is not None and previous is not handle:
+        previous.release()
+    
+    st.session_state.run_handle = handle
+    st.session_state.auditor_data = {
+        **handle.data,
+        'run_id': handle.run_id,
+        'system': handle.system,
+        'upload_time': handle.created
+    }
+
+
 def display_dashboard():
     """แสดง Dashboard หลัก"""
     
@@ -108,21 +181,164 @@ def display_dashboard():
     summary_df = data['summary']
     reconciliation_df = data['reconciliation']
     
-    # Tabs
-    tab1, tab2, tab3 = st.tabs([
-        "📊 Dashboard Overview",
-        "🔍 Vendor Details",
-        "📈 Advanced Analysis"
-    ])
+    manifest = data.get('manifest')
+    if manifest:
+        st.caption(
+            f"📦 {manifest.get('run_id') or '-'} · {manifest.get('created') or '-'} · "
+            f"model {manifest.get('model') or '-'} · prompt {manifest.get('prompt_hash') or '-'}"
+        )
     
-    with tab1:
-        display_overview_tab(summary_df, reconciliation_df)
+    # เลือก view ด้วย radio แทน st.tabs: st.tabs รันโค้ดของทุก tab ทุกครั้งที่ rerun
+    # แบบนี้คำนวณเฉพาะ view ที่กำลังดูอยู่
+    view = st.radio(
+        "View",
+        list(DASHBOARD_VIEWS),
+        horizontal=True,
+        label_visibility="collapsed",
+        key="auditor_view"
+    )
     
-    with tab2:
+    if view == "📊 Dashboard Overview":
+        display_overview_tab(summary_df, reconciliation_df)
+    elif view == "🔍 Vendor Details":
         display_vendor_tab(reconciliation_df)
+    else:
+        display_analysis_tab(summary_df, reconciliation_df, data.get('periods'), data.get('calculated'))
+
+
+def cached_figure(name, build, *args):
+    """สร้าง figure ครั้งแรกที่ถูกเรียกแล้วเก็บ JSON ไว้ตาม fingerprint ของชุดข้อมูล (rerun ถัดไปใช้ figure เดิม)
     
-    with tab3:
-        display_analysis_tab(summary_df, reconciliation_df)
+    fingerprint คำนวณครั้งเดียวต่อชุดข้อมูล session ที่โหลดไฟล์เดียวกันใช้ cache ร่วมกัน
+    """
+    return figure_cache.get_or_build(data_fingerprint(), name, build, *args)
+
+
+def data_fingerprint():
+    """fingerprint ของชุดข้อมูลใน session (คำนวณครั้งเดียว ใช้เป็น key ของ figure cache / export cache)"""
+    data = st.session_state.auditor_data
+    if 'fingerprint' not in data:
+        data['fingerprint'] = dataset_fingerprint(data['summary'], data['reconciliation'])
+    return data['fingerprint']
+
+
+def build_status_pie(summary_df):
+    status_counts = summary_df['status'].value_counts()
+    
+    fig = go.Figure(data=[go.Pie(
+        labels=status_counts.index,
+        values=status_counts.values,
+        hole=0.5,
+        marker_colors=['#43A047', '#FB8C00', '#E53935'],
+        textinfo='label+percent',
+        textfont_size=13
+    )])
+    fig.update_layout(
+        showlegend=True,
+        height=350,
+        margin=dict(l=20, r=20, t=20, b=20),
+        legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5)
+    )
+    return fig
+
+
+def build_top_vendors_chart(summary_df):
+    # 10 อันดับแรก + แท่ง "อื่นๆ" ยอดรวมของกราฟจึงเท่ากับยอดรวมที่แสดงข้างกัน
+    top_vendors = top_n(summary_df, 'vendor_name', 'should_collect', n=10)
+    
+    fig = go.Figure(data=[
+        go.Bar(
+            y=top_vendors['vendor_name'],
+            x=top_vendors['should_collect'],
+            orientation='h',
+            text=top_vendors['should_collect'].apply(lambda x: f'฿{x/1000000:.1f}M'),
+            textposition='auto',
+            marker_color='#667eea',
+            hovertemplate='<b>%{y}</b><br>฿%{x:,.0f}<extra></extra>'
+        )
+    ])
+    fig.update_layout(
+        showlegend=False,
+        height=350,
+        xaxis_title="Amount (THB)",
+        yaxis_title="",
+        margin=dict(l=20, r=20, t=20, b=20),
+        yaxis=dict(autorange="reversed")
+    )
+    return fig
+
+
+def build_variance_histogram(summary_df):
+    # นับ bin ฝั่ง server ส่งไปแค่ bin ละแท่ง
+    fig = go.Figure(data=[
+        histogram_trace(
+            summary_df['variance_pct'],
+            value_label='Variance (%)',
+            marker_color='#667eea',
+            opacity=0.8
+        )
+    ])
+    fig.update_layout(
+        xaxis_title="Variance (%)",
+        yaxis_title="Number of Vendors",
+        height=300,
+        bargap=0,
+        margin=dict(l=20, r=20, t=20, b=40),
+        showlegend=False
+    )
+    fig.add_vline(x=0, line_dash="dash", line_color="red", opacity=0.5)
+    return fig
+
+
+def build_collection_bars(df, label, height, keep_order=False):
+    """กราฟแท่งคู่ Should Collect / Actually Collected (top-N ตาม should_collect ที่เหลือรวมเป็น "อื่นๆ")"""
+    bars = df if keep_order else top_n(df, label, 'should_collect', columns=['should_collect', 'actually_collected'])
+    fig = go.Figure(data=[
+        go.Bar(
+            name='Should Collect',
+            x=bars[label],
+            y=bars['should_collect'],
+            marker_color='#667eea'
+        ),
+        go.Bar(
+            name='Actually Collected',
+            x=bars[label],
+            y=bars['actually_collected'],
+            marker_color='#43A047'
+        )
+    ])
+    fig.update_layout(
+        barmode='group',
+        height=height,
+        margin=dict(l=20, r=20, t=20, b=40)
+    )
+    return fig
+
+
+def build_difference_chart(vendor_data):
+    # Sort by absolute variance (top-N ที่เหลือรวมเป็น "อื่นๆ")
+    vendor_data_sorted = top_n(vendor_data, 'category_code', 'difference', by_abs=True)
+    
+    colors = vendor_data_sorted['difference'].apply(
+        lambda x: '#43A047' if x >= -1 else '#E53935'
+    )
+    
+    fig = go.Figure(data=[
+        go.Bar(
+            x=vendor_data_sorted['category_code'],
+            y=vendor_data_sorted['difference'],
+            marker_color=colors,
+            text=vendor_data_sorted['difference'].apply(lambda x: f'฿{x:,.0f}'),
+            textposition='outside'
+        )
+    ])
+    fig.update_layout(
+        height=300,
+        margin=dict(l=20, r=20, t=20, b=20),
+        showlegend=False
+    )
+    fig.add_hline(y=0, line_dash="dash", line_color="gray")
+    return fig
 
 
 def display_overview_tab(summary_df, reconciliation_df):
@@ -178,76 +394,19 @@ def display_overview_tab(summary_df, reconciliation_df):
     with col1:
         st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
         st.markdown("#### 📊 Collection Status")
-        
-        status_counts = summary_df['status'].value_counts()
-        
-        fig_status = go.Figure(data=[go.Pie(
-            labels=status_counts.index,
-            values=status_counts.values,
-            hole=0.5,
-            marker_colors=['#43A047', '#FB8C00', '#E53935'],
-            textinfo='label+percent',
-            textfont_size=13
-        )])
-        fig_status.update_layout(
-            showlegend=True,
-            height=350,
-            margin=dict(l=20, r=20, t=20, b=20),
-            legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5)
-        )
-        st.plotly_chart(fig_status, use_container_width=True)
+        st.plotly_chart(cached_figure('status_pie', build_status_pie, summary_df), use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     with col2:
         st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
         st.markdown("#### 💰 Top 10 Vendors by Amount")
-        
-        top_vendors = summary_df.nlargest(10, 'should_collect')
-        
-        fig_top = go.Figure(data=[
-            go.Bar(
-                y=top_vendors['vendor_name'],
-                x=top_vendors['should_collect'],
-                orientation='h',
-                text=top_vendors['should_collect'].apply(lambda x: f'฿{x/1000000:.1f}M'),
-                textposition='auto',
-                marker_color='#667eea',
-                hovertemplate='<b>%{y}</b><br>฿%{x:,.0f}<extra></extra>'
-            )
-        ])
-        fig_top.update_layout(
-            showlegend=False,
-            height=350,
-            xaxis_title="Amount (THB)",
-            yaxis_title="",
-            margin=dict(l=20, r=20, t=20, b=20),
-            yaxis=dict(autorange="reversed")
-        )
-        st.plotly_chart(fig_top, use_container_width=True)
+        st.plotly_chart(cached_figure('top_vendors', build_top_vendors_chart, summary_df), use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
     # Variance Distribution
     st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
     st.markdown("#### 📈 Variance Distribution")
-    
-    fig_variance = go.Figure(data=[
-        go.Histogram(
-            x=summary_df['variance_pct'],
-            nbinsx=30,
-            marker_color='#667eea',
-            opacity=0.8,
-            hovertemplate='Variance: %{x:.1f}%<br>Count: %{y}<extra></extra>'
-        )
-    ])
-    fig_variance.update_layout(
-        xaxis_title="Variance (%)",
-        yaxis_title="Number of Vendors",
-        height=300,
-        margin=dict(l=20, r=20, t=20, b=40),
-        showlegend=False
-    )
-    fig_variance.add_vline(x=0, line_dash="dash", line_color="red", opacity=0.5)
-    st.plotly_chart(fig_variance, use_container_width=True)
+    st.plotly_chart(cached_figure('variance_histogram', build_variance_histogram, summary_df), use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Summary Table
@@ -292,15 +451,16 @@ def display_vendor_tab(reconciliation_df):
     
     st.markdown("### 🔍 Vendor Analysis")
     
-    # Vendor Selector
-    vendors = sorted(reconciliation_df['vendor_code'].unique())
+    # Vendor Selector (map ชื่อครั้งเดียว แทนการ filter ทั้งตารางต่อ option)
+    vendor_names = reconciliation_df.drop_duplicates('vendor_code').set_index('vendor_code')['vendor_name']
+    vendors = sorted(vendor_names.index)
     
     col1, col2 = st.columns([3, 1])
     with col1:
         selected_vendor = st.selectbox(
             "Select Vendor",
             options=vendors,
-            format_func=lambda x: f"{x} - {reconciliation_df[reconciliation_df['vendor_code']==x]['vendor_name'].iloc[0]}"
+            format_func=lambda x: f"{x} - {vendor_names[x]}"
         )
     
     with col2:
@@ -345,26 +505,11 @@ def display_vendor_tab(reconciliation_df):
         st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
         st.markdown("#### 📊 By Category")
         
-        fig_cat = go.Figure(data=[
-            go.Bar(
-                name='Should Collect',
-                x=vendor_data['category_code'],
-                y=vendor_data['should_collect'],
-                marker_color='#667eea'
-            ),
-            go.Bar(
-                name='Actually Collected',
-                x=vendor_data['category_code'],
-                y=vendor_data['actually_collected'],
-                marker_color='#43A047'
-            )
-        ])
-        fig_cat.update_layout(
-            barmode='group',
-            height=300,
-            margin=dict(l=20, r=20, t=20, b=20),
-            legend=dict(orientation="h", yanchor="bottom", y=-0.3)
+        fig_cat = cached_figure(
+            ('vendor_categories', selected_vendor, status_filter), build_collection_bars,
+            vendor_data, 'category_code', 300
         )
+        fig_cat.update_layout(legend=dict(orientation="h", yanchor="bottom", y=-0.3))
         st.plotly_chart(fig_cat, use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -372,28 +517,9 @@ def display_vendor_tab(reconciliation_df):
         st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
         st.markdown("#### 📈 Variance by Category")
         
-        # Sort by absolute variance
-        vendor_data_sorted = vendor_data.sort_values('difference', key=abs, ascending=False)
-        
-        colors = vendor_data_sorted['difference'].apply(
-            lambda x: '#43A047' if x >= -1 else '#E53935'
-        )
-        
-        fig_diff = go.Figure(data=[
-            go.Bar(
-                x=vendor_data_sorted['category_code'],
-                y=vendor_data_sorted['difference'],
-                marker_color=colors,
-                text=vendor_data_sorted['difference'].apply(lambda x: f'฿{x:,.0f}'),
-                textposition='outside'
-            )
-        ])
-        fig_diff.update_layout(
-            height=300,
-            margin=dict(l=20, r=20, t=20, b=20),
-            showlegend=False
+        fig_diff = cached_figure(
+            ('vendor_difference', selected_vendor, status_filter), build_difference_chart, vendor_data
         )
-        fig_diff.add_hline(y=0, line_dash="dash", line_color="gray")
         st.plotly_chart(fig_diff, use_container_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
     
@@ -401,7 +527,7 @@ def display_vendor_tab(reconciliation_df):
     st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
     st.markdown("#### 📋 Detailed Breakdown")
     
-    st.dataframe(
+    event = st.dataframe(
         vendor_data[[
             'category_code', 'category_name', 'should_collect',
             'actually_collected', 'difference', 'status', 'variance_pct'
@@ -416,10 +542,17 @@ def display_vendor_tab(reconciliation_df):
                       'color: #E53935; font-weight: 600'),
             subset=['status']
         ),
-        use_container_width=True
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"vendor_detail_{selected_vendor}_{status_filter}"
     )
+    st.caption("เลือกแถวเพื่อดูรายการ AR / AP ที่อยู่เบื้องหลัง")
     st.markdown('</div>', unsafe_allow_html=True)
     
+    if event.selection.rows:
+        display_drilldown(vendor_data.iloc[event.selection.rows[0]])
+    
     # Export this vendor
     st.markdown("---")
     csv_data = vendor_data.to_csv(index=False, encoding='utf-8-sig')
@@ -432,20 +565,65 @@ def display_vendor_tab(reconciliation_df):
     )
 
 
-def display_analysis_tab(summary_df, reconciliation_df):
+def display_drilldown(row):
+    """รายการ AR / AP ของแถว reconciliation ที่เลือก (แบ่งหน้า)"""
+    
+    recon = st.session_state.auditor_data.get('system')
+    drilldown = getattr(recon, 'drilldown', None)
+    
+    st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
+    st.markdown(f"#### 🔎 รายการของ {row['category_code']} - {row['category_name']}")
+    
+    if not drilldown:
+        st.info("ℹ️ ดูรายการ AR / AP ได้เมื่อประมวลผลใน Analysis Mode (ไฟล์ Excel ไม่มีรายการต้นทาง)")
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+    
+    match_key = int(row['match_key']) if 'match_key' in row.index else int(parse_match_key([row['tta_key']])[0])
+    source = st.radio("Source", ["AR (เรียกเก็บ)", "AP (ยอดซื้อ)"], horizontal=True, key="drilldown_source")
+    if source.startswith("AR"):
+        index, key = drilldown.get('ar'), (match_key, str(row['category_code']))
+    else:
+        index, key = drilldown.get('ap'), (match_key,)
+    
+    if index is None or not index.count(*key):
+        st.warning("ไม่พบรายการ")
+        st.markdown('</div>', unsafe_allow_html=True)
+        return
+    
+    total_pages = index.pages(*key)
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        page = st.number_input(f"หน้า (จาก {total_pages})", min_value=1, max_value=total_pages, value=1,
+                               key=f"drilldown_page_{source}_{key}")
+    with col2:
+        st.metric("รวม", f"฿{index.total(*key):,.2f}", help=f"{index.count(*key):,} รายการ")
+    
+    st.dataframe(
+        index.lookup(*key, page=int(page) - 1).style.format({'EXTENDED_AMOUNT': '฿{:,.2f}'}),
+        use_container_width=True,
+        hide_index=True
+    )
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+def display_analysis_tab(summary_df, reconciliation_df, periods_df=None, calculated_df=None):
     """Tab 3: Advanced Analysis"""
     
     st.markdown("### 📈 Advanced Analytics")
     
-    analysis_type = st.selectbox(
-        "Select Analysis Type",
-        [
-            "Variance Analysis",
-            "Category Distribution",
-            "Problem Vendors",
-            "Performance Ranking"
-        ]
-    )
+    analysis_types = [
+        "Variance Analysis",
+        "Category Distribution",
+        "Problem Vendors",
+        "Performance Ranking"
+    ]
+    if periods_df is not None and not periods_df.empty:
+        analysis_types.append("Period Timeline")
+    if calculated_df is not None and not calculated_df.empty:
+        analysis_types.append("Scenario Comparison")
+    
+    analysis_type = st.selectbox("Select Analysis Type", analysis_types)
     
     st.markdown("---")
     
@@ -457,6 +635,10 @@ def display_analysis_tab(summary_df, reconciliation_df):
         analyze_problems(summary_df)
     elif analysis_type == "Performance Ranking":
         analyze_performance(summary_df)
+    elif analysis_type == "Period Timeline":
+        analyze_periods(periods_df)
+    elif analysis_type == "Scenario Comparison":
+        analyze_scenarios(calculated_df, reconciliation_df)
 
 
 def analyze_variance(summary_df):
@@ -520,27 +702,7 @@ def analyze_categories(reconciliation_df):
     st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
     st.markdown("#### 📊 Collection by Category")
     
-    fig = go.Figure(data=[
-        go.Bar(
-            name='Should Collect',
-            x=category_summary['category_code'],
-            y=category_summary['should_collect'],
-            marker_color='#667eea'
-        ),
-        go.Bar(
-            name='Actually Collected',
-            x=category_summary['category_code'],
-            y=category_summary['actually_collected'],
-            marker_color='#43A047'
-        )
-    ])
-    
-    fig.update_layout(
-        barmode='group',
-        height=400,
-        margin=dict(l=20, r=20, t=20, b=40)
-    )
-    
+    fig = cached_figure('category_distribution', build_collection_bars, category_summary, 'category_code', 400)
     st.plotly_chart(fig, use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
     
@@ -671,6 +833,190 @@ def analyze_performance(summary_df):
     st.markdown('</div>', unsafe_allow_html=True)
 
 
+def analyze_periods(periods_df):
+    """Period Timeline - ยอดที่ควรเรียกเก็บเทียบกับที่เรียกเก็บจริงรายงวด"""
+    
+    vendors = periods_df[['vendor_code', 'vendor_name']].drop_duplicates()
+    vendor_labels = (vendors['vendor_code'].astype(str) + ' - ' + vendors['vendor_name'].astype(str)).tolist()
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        selected = st.selectbox("Vendor", vendor_labels)
+    vendor_code = vendors['vendor_code'].iloc[vendor_labels.index(selected)]
+    vendor_periods = periods_df[periods_df['vendor_code'] == vendor_code]
+    with col2:
+        category = st.selectbox("Category", sorted(vendor_periods['category_code'].astype(str).unique()))
+    
+    timeline = vendor_periods[vendor_periods['category_code'].astype(str) == category].sort_values('period')
+    
+    st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
+    st.markdown(f"#### 📅 {category} รายงวด ({timeline['payment_terms'].iloc[0]})")
+    
+    fig = go.Figure(data=[
+        go.Bar(
+            name='Should Collect',
+            x=timeline['period'].astype(str),
+            y=timeline['expected'],
+            marker_color='#667eea'
+        ),
+        go.Bar(
+            name='Actually Collected',
+            x=timeline['period'].astype(str),
+            y=timeline['collected'],
+            marker_color='#43A047'
+        ),
+        go.Scatter(
+            name='Cumulative Difference',
+            x=timeline['period'].astype(str),
+            y=timeline['cumulative_difference'],
+            mode='lines+markers',
+            line=dict(color='#E53935')
+        )
+    ])
+    fig.update_layout(barmode='group', height=400, margin=dict(l=20, r=20, t=20, b=40))
+    st.plotly_chart(fig, use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    shortfalls = timeline[timeline['difference'] <= -1]
+    st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
+    st.markdown(f"#### ❌ งวดที่เรียกเก็บขาด ({len(shortfalls)} งวด)")
+    if not shortfalls.empty:
+        st.dataframe(
+            shortfalls[['period', 'purchase', 'expected', 'collected', 'difference', 'cumulative_difference']].style.format({
+                'purchase': '฿{:,.0f}',
+                'expected': '฿{:,.0f}',
+                'collected': '฿{:,.0f}',
+                'difference': '฿{:,.0f}',
+                'cumulative_difference': '฿{:,.0f}'
+            }),
+            use_container_width=True
+        )
+    else:
+        st.success("✅ ไม่มีงวดที่เรียกเก็บขาด")
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+def rule_categories(calculated_df):
+    """category ที่มีแถวคิดตาม tier/เงื่อนไข (rule_note / applied_rate ต่างจาก rate_percent / ไม่ผ่านเงื่อนไข)"""
+    ruled = pd.Series(False, index=calculated_df.index)
+    if 'rule_note' in calculated_df.columns:
+        ruled |= calculated_df['rule_note'].fillna('').astype(str).str.strip() != ''
+    if 'applied_rate' in calculated_df.columns:
+        rate = pd.to_numeric(calculated_df['rate_percent'], errors='coerce').fillna(0)
+        applied = pd.to_numeric(calculated_df['applied_rate'], errors='coerce').fillna(0)
+        ruled |= (rate - applied).abs() > 1e-9
+    if 'condition_met' in calculated_df.columns:
+        ruled |= ~calculated_df['condition_met'].fillna(True).astype(bool)
+    return set(calculated_df.loc[ruled, 'category_code'].astype(str))
+
+
+def analyze_scenarios(calculated_df, reconciliation_df):
+    """Scenario Comparison - what-if ของ rate / fix amount / ยอดซื้อ"""
+    
+    categories = sorted(calculated_df['category_code'].astype(str).unique())
+    
+    # ใช้ยอดซื้อรายเดือนจริงและ tier/เงื่อนไขถ้ามีระบบที่เพิ่งประมวลผล ไม่เช่นนั้นคำนวณจากไฟล์ Excel
+    # (เฉลี่ยยอดซื้อเท่ากันทุกเดือน และไม่มี tier/เงื่อนไข: rate ของแถวที่คิดตาม tier/เงื่อนไขเปลี่ยนไม่ได้)
+    recon = st.session_state.auditor_data.get('system')
+    has_rules = (
+        recon is not None and recon.calculated_allowances is not None
+        and len(recon.calculated_allowances) == len(calculated_df)
+    )
+    ruled_categories = set() if has_rules else rule_categories(calculated_df)
+    if ruled_categories:
+        st.info(
+            f"ℹ️ ไฟล์ Excel ไม่มีข้อมูล tier/เงื่อนไข: ปรับ Rate ของ {', '.join(sorted(ruled_categories))} ไม่ได้ "
+            "(ประมวลผลใหม่ใน Analysis Mode เพื่อจำลอง rate ของแถวที่มี tier/เงื่อนไข)"
+        )
+    
+    count = int(st.number_input("จำนวน Scenario", min_value=1, max_value=4, value=2))
+    
+    scenarios = []
+    for i, col in enumerate(st.columns(count)):
+        with col:
+            name = st.text_input("ชื่อ", f"Scenario {i + 1}", key=f"scenario_name_{i}")
+            category = st.selectbox("Category", categories, key=f"scenario_category_{i}")
+            rate = st.number_input(
+                "Rate ใหม่ (%)", min_value=0.0, value=None, step=0.25, key=f"scenario_rate_{i}",
+                disabled=category in ruled_categories
+            )
+            fix = st.number_input("Fix Amount ใหม่", min_value=0.0, value=None, step=1000.0, key=f"scenario_fix_{i}")
+            quarters = st.multiselect("ไม่นับยอดซื้อไตรมาส", [1, 2, 3, 4], key=f"scenario_quarters_{i}")
+            scale = st.slider("ยอดซื้อ (%)", 50, 150, 100, step=5, key=f"scenario_scale_{i}")
+        
+        scenario = {'name': name, 'exclude_quarters': quarters, 'purchase_scale': scale / 100}
+        if rate is not None and category not in ruled_categories:
+            scenario['rate_overrides'] = {category: rate}
+        if fix is not None:
+            scenario['fix_overrides'] = {category: fix}
+        scenarios.append(scenario)
+    
+    if has_rules:
+        results = recon.run_scenarios(scenarios)
+    else:
+        collected = (
+            reconciliation_df['actually_collected'].to_numpy()
+            if len(reconciliation_df) == len(calculated_df) else None
+        )
+        results = ScenarioEngine(calculated_df, collected=collected).run(scenarios)
+    
+    summary = summarize_scenarios(results)
+    
+    st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
+    st.markdown("#### 🔮 Scenario Comparison")
+    
+    fig = build_collection_bars(summary, 'scenario', 400, keep_order=True)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.dataframe(
+        summary.style.format({
+            'purchase': '฿{:,.0f}',
+            'should_collect': '฿{:,.0f}',
+            'actually_collected': '฿{:,.0f}',
+            'difference': '฿{:,.0f}',
+            'change_vs_baseline': '฿{:+,.0f}'
+        }),
+        use_container_width=True
+    )
+    st.markdown('</div>', unsafe_allow_html=True)
+    
+    # ยอดที่ควรเรียกเก็บต่อ vendor แยกตาม scenario
+    st.markdown('<div class="dashboard-card">', unsafe_allow_html=True)
+    st.markdown("#### 📋 ยอดที่ควรเรียกเก็บต่อ Vendor")
+    by_vendor = results.pivot_table(
+        index=['vendor_code', 'vendor_name'], columns='scenario', values='should_collect',
+        aggfunc='sum', sort=False
+    )
+    st.dataframe(by_vendor.style.format('฿{:,.0f}'), use_container_width=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+# รูปแบบไฟล์ -> (นามสกุล, mime, ข้อความปุ่ม, prefix ชื่อไฟล์)
+EXPORT_FORMATS = {
+    "Excel (.xlsx)": ('.xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                      "📥 Download Excel", "TTA_Export"),
+    "CSV (.csv)": ('.csv', 'text/csv', "📥 Download CSV", "TTA_Export"),
+    "Result Bundle (.zip)": (BUNDLE_EXTENSION, "application/zip", "📥 Download Bundle", "TTA_Export"),
+}
+
+
+def build_export(path, summary_df, reconciliation_df, export_type, file_format, info=None):
+    """เขียนไฟล์ export ลง path (รันใน background thread ของ export cache ห้ามใช้ st.*)"""
+    tables = {}
+    if export_type in ["Summary", "Both (Excel)"]:
+        tables['Summary'] = summary_df
+    if export_type in ["Detailed Reconciliation", "Both (Excel)"]:
+        tables['Details' if file_format == "Excel (.xlsx)" else 'Reconciliation'] = reconciliation_df
+    
+    if file_format == "Result Bundle (.zip)":
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        write_bundle(tables, path, f"TTA_Export_{timestamp}", info=info)
+    elif file_format == "Excel (.xlsx)":
+        write_workbook(tables, path)
+    else:
+        next(iter(tables.values())).to_csv(path, index=False, encoding='utf-8-sig')
+
+
 def display_export_section(summary_df, reconciliation_df):
     """Export Section"""
     
@@ -688,45 +1034,114 @@ def display_export_section(summary_df, reconciliation_df):
     with col2:
         file_format = st.selectbox(
             "File Format",
-            ["Excel (.xlsx)", "CSV (.csv)"]
+            ["Excel (.xlsx)", "CSV (.csv)", "Result Bundle (.zip)"]
         )
     
+    if file_format == "CSV (.csv)" and export_type == "Both (Excel)":
+        # CSV มีได้ตารางเดียว (ใช้ Detailed Reconciliation เหมือนเดิม)
+        export_type = "Detailed Reconciliation"
+    
+    extension, mime, label, prefix = EXPORT_FORMATS[file_format]
+    if file_format == "CSV (.csv)":
+        prefix = "TTA_Summary" if export_type == "Summary" else "TTA_Details"
+    
+    cache = get_export_cache()
+    name = artifact_name(data_fingerprint(), export_type, file_format, extension)
+    
     if st.button("📥 Generate Export", type="primary", use_container_width=True):
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # ที่มาของผลลัพธ์เดิม (model / prompt / inputs) สำหรับ manifest อ่านจาก session ก่อนส่งไป background
+        source = st.session_state.auditor_data.get('manifest') or {}
+        info = {key: source[key] for key in ('model', 'prompt_hash', 'inputs') if key in source}
+        info['source_run_id'] = source.get('run_id') or st.session_state.auditor_data.get('run_id')
         
-        if file_format == "Excel (.xlsx)":
-            import io
-            output = io.BytesIO()
-            
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                if export_type in ["Summary", "Both (Excel)"]:
-                    summary_df.to_excel(writer, sheet_name='Summary', index=False)
-                if export_type in ["Detailed Reconciliation", "Both (Excel)"]:
-                    reconciliation_df.to_excel(writer, sheet_name='Details', index=False)
-            
-            output.seek(0)
-            
+        cache.request(name, lambda path: build_export(
+            path, summary_df, reconciliation_df, export_type, file_format, info
+        ))
+        st.session_state.export_requested = name
+    
+    # แสดงสถานะ/ปุ่ม download เฉพาะไฟล์ที่ผู้ใช้ขอ (ค้างไว้จนกว่าตัวเลือก/ข้อมูลเปลี่ยน)
+    if st.session_state.get('export_requested') == name:
+        polling = cache.status(name) == PENDING
+        # ระหว่างสร้างไฟล์ rerun เฉพาะส่วนนี้เป็นระยะ (ไม่ rerun ทั้งหน้า)
+        show_export_status = st.fragment(
+            display_export_status, run_every=config.EXPORT_POLL_SECONDS if polling else None
+        )
+        show_export_status(cache, name, file_format, prefix, polling)
+    
+    display_statement_export(summary_df, reconciliation_df)
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+def display_export_status(cache, name, file_format, prefix, polling):
+    """สถานะของไฟล์ export ที่ขอไว้ + ปุ่ม download เมื่อไฟล์พร้อม"""
+    status = cache.status(name)
+    if polling and status != PENDING:
+        # สร้างเสร็จแล้ว: rerun ทั้งหน้าเพื่อหยุดการตรวจสถานะเป็นระยะ
+        st.rerun()
+    
+    if status == PENDING:
+        st.info("⏳ กำลังสร้างไฟล์ใน background (หน้านี้จะอัปเดตเองเมื่อเสร็จ)")
+    elif status == FAILED:
+        st.error(f"❌ {cache.error(name)}")
+    elif status == READY:
+        handle = cache.open_file(name)
+        if handle is None:
+            st.warning("⚠️ ไฟล์หมดอายุจาก cache แล้ว กด Generate Export อีกครั้ง")
+            return
+        extension, mime, label, _ = EXPORT_FORMATS[file_format]
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        with handle:
             st.download_button(
-                label="📥 Download Excel",
-                data=output,
-                file_name=f"TTA_Export_{timestamp}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                label=label,
+                data=handle,
+                file_name=f"{prefix}_{timestamp}{extension}",
+                mime=mime,
                 use_container_width=True
             )
+    else:
+        # ไฟล์ถูกลบออกจาก cache (เช่น prune จาก session อื่น) ก่อนผู้ใช้รับไฟล์
+        st.warning("⚠️ ไฟล์หมดอายุจาก cache แล้ว กด Generate Export อีกครั้ง")
+
+
+def display_statement_export(summary_df, reconciliation_df):
+    """Statement รายผู้ขาย (1 workbook ต่อ vendor) รวมเป็น zip ใน OUTPUT_FOLDER"""
+    data = st.session_state.auditor_data
+    calculated_df = data.get('calculated')
+    
+    st.markdown("#### 📑 Vendor Statements")
+    names = dict(zip(summary_df['vendor_code'].astype(str), summary_df['vendor_name']))
+    vendors = st.multiselect(
+        "เลือก Vendor (ว่าง = ทุก vendor)",
+        list(names),
+        format_func=lambda code: f"{code} - {names[code]}"
+    )
+    
+    if st.button("📑 สร้าง Statement รายผู้ขาย", use_container_width=True):
+        progress_bar = st.progress(0.0)
+        status_text = st.empty()
+        
+        def update(done, total):
+            progress_bar.progress(done / total)
+            status_text.text(f"สร้าง statement {done:,} / {total:,}")
+        
+        zip_path = export_vendor_statements(
+            reconciliation_df, calculated_df, summary_df, data.get('periods'),
+            vendors=vendors or None, progress=update
+        )
+        if zip_path is None:
+            st.error("❌ สร้าง statement ไม่สำเร็จ")
         else:
-            if export_type == "Summary":
-                csv_data = summary_df.to_csv(index=False, encoding='utf-8-sig')
-                filename = f"TTA_Summary_{timestamp}.csv"
-            else:
-                csv_data = reconciliation_df.to_csv(index=False, encoding='utf-8-sig')
-                filename = f"TTA_Details_{timestamp}.csv"
-            
+            st.session_state.statement_zip = zip_path
+            st.success(f"✅ บันทึกที่ {zip_path}")
+    
+    zip_path = st.session_state.get('statement_zip')
+    if zip_path and os.path.exists(zip_path):
+        with open(zip_path, 'rb') as f:
             st.download_button(
-                label="📥 Download CSV",
-                data=csv_data,
-                file_name=filename,
-                mime='text/csv',
+                label="📥 Download Statements",
+                data=f,
+                file_name=os.path.basename(zip_path),
+                mime="application/zip",
                 use_container_width=True
             )
-    
-    st.markdown('</div>', unsafe_allow_html=True)
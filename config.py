@@ -23,8 +23,56 @@ APP_TITLE = "TTA Reconciliation System"
 APP_ICON = "📊"
 PAGE_LAYOUT = "wide"
 
+# Extraction Store (ผลการวิเคราะห์ทุกเอกสารในไฟล์ JSON Lines เดียว เก็บใน TEMP_FOLDER)
+EXTRACTION_STORE_FILE = "extractions.jsonl"
+
+# จัดประเภทรายการ AR ที่ไม่มี REF_TYPE จาก DESCRIPTION/DESC2
+AR_CLASSIFIER_ENABLED = True
+AR_CLASSIFIER_MIN_CONFIDENCE = 0.6  # ต่ำกว่านี้บันทึก pattern ไว้แต่ไม่นำไปจับคู่
+
 # Gemini API Settings
 GEMINI_MODEL = "gemini-1.5-flash"
+GEMINI_MAX_REPAIR_REQUESTS = 2  # จำนวนครั้งสูงสุดที่ขอเฉพาะฟิลด์ที่ขาดเมื่อ response ไม่ครบ
+GEMINI_COMPACT_OUTPUT = True  # ให้ model ตอบด้วย key แบบย่อเพื่อลด output tokens
+
+# Gemini Rate Limit Settings (ใช้ร่วมกันทั้ง process)
+GEMINI_REQUESTS_PER_MINUTE = 10
+GEMINI_MAX_CONCURRENCY = 4
+GEMINI_MAX_RETRIES = 5
+GEMINI_BACKOFF_BASE = 2.0  # วินาที
+GEMINI_BACKOFF_MAX = 60.0  # วินาที
+
+# Hedged Requests (ยิง request ซ้ำเมื่อเอกสารช้ากว่าปกติ)
+GEMINI_HEDGE_ENABLED = False
+GEMINI_HEDGE_PERCENTILE = 90  # hedge เมื่อใช้เวลาเกิน percentile นี้ของ latency ที่ผ่านมา
+GEMINI_HEDGE_MIN_SAMPLES = 3  # จำนวนเอกสารขั้นต่ำก่อนเริ่ม hedge
+GEMINI_HEDGE_BUDGET_RATIO = 0.1  # hedge ได้ไม่เกิน 10% ของจำนวนเอกสาร (+1)
+
+# Batching (รวม PDF เล็กหลายไฟล์ไว้ใน request เดียว)
+GEMINI_BATCH_ENABLED = False
+GEMINI_BATCH_SMALL_DOC_PAGES = 2  # เอกสารที่มีหน้าไม่เกินนี้จึงจะถูก batch
+GEMINI_BATCH_MAX_PAGES = 10
+GEMINI_BATCH_MAX_INPUT_TOKENS = 8000
+GEMINI_BATCH_MAX_OUTPUT_TOKENS = 8000
+GEMINI_OUTPUT_TOKENS_PER_DOC = 1500  # ประมาณ output tokens ต่อเอกสาร
+
+# Page Split (แยกเอกสารหลายหน้าเป็นกลุ่มหน้าแล้วดึงข้อมูลพร้อมกัน)
+GEMINI_PAGE_SPLIT_ENABLED = False
+GEMINI_PAGE_SPLIT_DPI = 150
+GEMINI_PAGE_GROUP_SIZE = 2  # จำนวนหน้าต่อกลุ่มสำหรับหน้า 2 เป็นต้นไป
+
+# Context Caching (ลงทะเบียนคำสั่งวิเคราะห์เป็น cached context ใช้ซ้ำทุกเอกสาร)
+GEMINI_CONTEXT_CACHE_ENABLED = True
+GEMINI_CONTEXT_CACHE_TTL_MINUTES = 60
+
+# Near-duplicate Detection (ใช้ผลวิเคราะห์เดิมกับเอกสารที่สแกนใหม่)
+DEDUP_ENABLED = True
+DEDUP_INDEX_FILE = "phash_index.json"  # เก็บใน TEMP_FOLDER
+DEDUP_DPI = 50
+DEDUP_HASH_SIZE = 16  # dhash 16x16 = 256 bit ต่อหน้า
+DEDUP_PAGE_MAX_DISTANCE = 12  # จำนวน bit ที่ต่างได้สูงสุดเพื่อถือว่าเป็นหน้าเดียวกัน
+DEDUP_SIMILARITY_THRESHOLD = 0.95  # สัดส่วนหน้าของเอกสารเดิมที่ต้องพบในเอกสารใหม่
+DEDUP_NEAR_MATCH_REUSE = False  # ใช้ผลเดิมกับ near match โดยไม่วิเคราะห์ใหม่ (ปกติใช้ผลเดิมเฉพาะไฟล์เดียวกัน near match วิเคราะห์ใหม่แล้วเทียบผล)
 
 # File Settings
 MAX_FILE_SIZE_MB = 10
@@ -39,6 +87,17 @@ HIGH_VARIANCE_THRESHOLD = 10.0
 # Export Settings
 EXPORT_DATE_FORMAT = "%Y%m%d_%H%M%S"
 EXCEL_ENGINE = "openpyxl"
+EXPORT_RESULT_BUNDLE = True        # export result bundle (.bundle.zip: Parquet + manifest ต้องติดตั้ง pyarrow)
+EXPORT_EXCEL = True                # export รายงาน Excel ด้วย (ถ้าเขียน bundle ไม่ได้จะ export Excel เสมอ)
+EXCEL_CHUNK_ROWS = 50000           # จำนวนแถวที่แปลงต่อรอบตอนเขียน Excel แบบ streaming (ดู tta_excel)
+STATEMENT_WORKERS = None           # จำนวน process สร้าง statement รายผู้ขาย (None = จำนวน CPU)
+STATEMENT_PARALLEL_MIN_ROWS = 50000 # ข้อมูลน้อยกว่านี้ (แถวรวม) สร้าง statement ใน process เดียว
+
+# Export Cache (ไฟล์ export ของ Auditor เก็บบนดิสก์ตาม fingerprint + ตัวเลือก ใช้ร่วมกันทุก session)
+EXPORT_CACHE_FOLDER = "exports"    # โฟลเดอร์ใน TEMP_FOLDER
+EXPORT_CACHE_MAX_FILES = 32        # จำนวนไฟล์ที่เก็บไว้ (เกินแล้วลบไฟล์ที่ใช้ล่าสุดนานที่สุด)
+EXPORT_CACHE_WORKERS = 2           # จำนวน thread ที่สร้างไฟล์ใน background
+EXPORT_POLL_SECONDS = 2            # ระยะห่างการตรวจสถานะไฟล์ที่กำลังสร้าง (วินาที)
 
 # Display Settings
 CURRENCY_FORMAT = "฿{:,.2f}"
@@ -59,6 +118,19 @@ COLOR_INFO = "#00ACC1"
 COLOR_BACKGROUND = "#F5F7FA"
 COLOR_CARD = "#FFFFFF"
 
+# Chart Data Settings (Auditor dashboard)
+CHART_HISTOGRAM_BINS = 30          # จำนวน bin ของ histogram (นับฝั่ง server)
+CHART_TOP_N = 15                   # กราฟแท่งแสดง N อันดับแรก ที่เหลือรวมเป็น "อื่นๆ"
+CHART_CACHE_SIZE = 64              # จำนวน figure JSON ที่เก็บไว้ (LRU ใช้ร่วมกันทุก session)
+DRILLDOWN_PAGE_SIZE = 50           # จำนวนรายการ AR/AP ต่อหน้าใน drill-down
+
+# Shared Results (ใช้ร่วมกันทุก session)
+SHARED_RESULTS_MAX_RUNS = 8        # จำนวน run ที่เก็บไว้ในหน่วยความจำ (run ที่มี session ใช้อยู่ไม่ถูกลบ)
+
+# Result Snapshot (ผลลัพธ์แบบย่อที่เก็บใน session แทนระบบทั้งชุด)
+SNAPSHOT_FOLDER = "snapshots"      # โฟลเดอร์ใน TEMP_FOLDER สำหรับ snapshot ที่บันทึกลงดิสก์
+SNAPSHOT_ARROW = True              # ใช้ Arrow dtype กับคอลัมน์ข้อความถ้าติดตั้ง pyarrow
+
 # Session State Keys
 SESSION_MODE = "mode"
 SESSION_ANALYSIS_RESULTS = "analysis_results"
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tta_core import TTAReconciliationSystem
+
+AP_FILE = os.path.join(ROOT, 'data', 'ap', 'Account_Payable - Purchase_by_Dept.csv')
+AR_FILE = os.path.join(ROOT, 'data', 'ar', 'Account_Receiveable.xlsx - AR_Detail.csv')
+
+TTA_DATA = [{
+    'vendor_code': '7001537', 'vendor_name': 'เทค ทอยส์', 'Division_code': '02', 'Department_code': ['30', '40'],
+    'allowances': [
+        {'category_code': 'ARB', 'rate_percent': 2.5},
+        {'category_code': 'CRB', 'fix_amount': 10000},
+    ],
+}]
+
+
+def _system(tmp_path, ap_file):
+    system = TTAReconciliationSystem(str(tmp_path))
+    assert system.load_ap_data(ap_file)
+    assert system.load_ar_data(AR_FILE)
+    system.tta_data = [dict(vendor) for vendor in TTA_DATA]
+    system.calculate_allowances()
+    system.reconcile_with_ar()
+    return system
+
+
+@pytest.fixture
+def system(tmp_path):
+    """ระบบที่คำนวณจากข้อมูลตัวอย่าง (AP มี INV_YEAR)"""
+    return _system(tmp_path, AP_FILE)
+
+
+@pytest.fixture
+def no_date_system(tmp_path):
+    """ระบบที่ AP ไม่มีคอลัมน์วันที่/เดือน/ปี"""
+    ap_file = tmp_path / 'Account_Payable_no_date.csv'
+    pd.read_csv(AP_FILE, dtype=str).drop(columns=['INV_YEAR']).to_csv(ap_file, index=False)
+    return _system(tmp_path, str(ap_file))
@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tta_artifacts import FAILED, PENDING, READY, ExportArtifactCache
+
+
+def wait_for(cache, name, timeout=5):
+    deadline = time.monotonic() + timeout
+    while cache.status(name) == PENDING and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return cache.status(name)
+
+
+def write(content):
+    def build(path):
+        with open(path, 'wb') as f:
+            f.write(content)
+    return build
+
+
+def test_request_builds_file_once(tmp_path):
+    cache = ExportArtifactCache(str(tmp_path), max_files=4, workers=1)
+
+    assert cache.status('a.xlsx') is None
+    assert cache.request('a.xlsx', write(b'data')) == PENDING
+    assert wait_for(cache, 'a.xlsx') == READY
+    assert cache.request('a.xlsx', write(b'other')) == READY
+
+    with cache.open_file('a.xlsx') as handle:
+        assert handle.read() == b'data'
+    assert not [f for f in os.listdir(tmp_path) if f.endswith('.tmp')]
+
+
+def test_pending_request_is_not_built_twice(tmp_path):
+    cache = ExportArtifactCache(str(tmp_path), max_files=4, workers=2)
+    release = threading.Event()
+    calls = []
+
+    def build(path):
+        calls.append(path)
+        release.wait(5)
+        write(b'data')(path)
+
+    assert cache.request('a.csv', build) == PENDING
+    assert cache.request('a.csv', build) == PENDING
+    release.set()
+
+    assert wait_for(cache, 'a.csv') == READY
+    assert len(calls) == 1
+
+
+def test_failed_build_reports_error_and_can_retry(tmp_path):
+    cache = ExportArtifactCache(str(tmp_path), max_files=4, workers=1)
+
+    def broken(path):
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+        raise ValueError('disk full')
+
+    cache.request('a.zip', broken)
+
+    assert wait_for(cache, 'a.zip') == FAILED
+    assert cache.error('a.zip') == 'disk full'
+    assert cache.open_file('a.zip') is None
+    assert os.listdir(tmp_path) == []
+
+    cache.request('a.zip', write(b'data'))
+    assert wait_for(cache, 'a.zip') == READY
+    assert cache.error('a.zip') is None
+
+
+def test_prune_removes_least_recently_used(tmp_path):
+    cache = ExportArtifactCache(str(tmp_path), max_files=2, workers=1)
+    for index, name in enumerate(['a.csv', 'b.csv']):
+        cache.request(name, write(b'data'))
+        wait_for(cache, name)
+        os.utime(cache.path(name), (index, index))
+    cache.open_file('a.csv').close()  # a ใช้ล่าสุด
+
+    cache.request('c.csv', write(b'data'))
+    wait_for(cache, 'c.csv')
+
+    assert sorted(os.listdir(tmp_path)) == ['a.csv', 'c.csv']
+    assert cache.status('b.csv') is None
@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import tta_excel
+from tta_excel import CURRENCY_FORMAT, PERCENT_FORMAT, write_workbook
+
+
+def summary():
+    return pd.DataFrame({
+        'vendor_code': ['1', '2', '3'],
+        'should_collect': [100.0, 0.0, np.nan],
+        'difference': [-10.0, 5.0, 0.0],
+        'variance_pct': [-10.0, np.inf, -np.inf],
+        'status': [config.STATUS_UNDER, config.STATUS_OVER, config.STATUS_COMPLETE],
+    })
+
+
+def test_round_trip_values_and_formats(tmp_path):
+    path = tmp_path / 'report.xlsx'
+    write_workbook({'Summary': summary()}, str(path))
+
+    ws = load_workbook(path)['Summary']
+    rows = list(ws.iter_rows(values_only=True))
+    assert rows[0] == ('vendor_code', 'should_collect', 'difference', 'variance_pct', 'status')
+    assert [row[3] for row in rows[1:]] == [-10.0, 'inf', '-inf']
+    assert rows[3][1] is None
+    assert ws['B2'].number_format == CURRENCY_FORMAT
+    assert ws['D2'].number_format == PERCENT_FORMAT
+    assert ws.freeze_panes == 'A2'
+    assert ws.auto_filter.ref == 'A1:E4'
+
+    rules = [rule for ranges in ws.conditional_formatting for rule in ranges.rules]
+    formulas = sorted(rule.formula[0] for rule in rules)
+    assert formulas == sorted(f'"{status}"' for status in tta_excel.STATUS_STYLES)
+    assert [str(ranges.sqref) for ranges in ws.conditional_formatting] == ['E2:E4']
+
+
+def test_rows_split_across_sheets(tmp_path, monkeypatch):
+    monkeypatch.setattr(tta_excel, 'EXCEL_MAX_ROWS', 4)
+    df = pd.DataFrame({'vendor_code': [str(i) for i in range(10)], 'purchase': np.arange(10, dtype=float)})
+    path = tmp_path / 'big.xlsx'
+
+    write_workbook({'Reconciliation': df}, str(path), chunk_rows=3)
+
+    wb = load_workbook(path)
+    assert wb.sheetnames == ['Reconciliation', 'Reconciliation_2', 'Reconciliation_3']
+    values = []
+    for ws in wb.worksheets:
+        rows = list(ws.iter_rows(values_only=True))
+        assert rows[0] == ('vendor_code', 'purchase')
+        values += [row[1] for row in rows[1:]]
+    assert values == list(np.arange(10, dtype=float))
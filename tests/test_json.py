@@ -0,0 +1,91 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tta_core import _drop_truncated_tail, merge_partial_result
+from tta_json import TolerantJSONParser, find_missing_fields, repair_json, sub_schema
+
+
+ARB = {'category_code': 'ARB', 'rate_percent': 2.5, 'description': 'Annual rebate'}
+DTS = {'category_code': 'DTS', 'fix_amount': 50000, 'description': 'Display'}
+
+
+def test_merge_skips_allowances_already_in_base():
+    base = {'vendor_code': '1', 'allowances': [ARB]}
+
+    merged = merge_partial_result(base, {'allowances': [dict(ARB), DTS], 'vendor_name': 'A'})
+
+    assert merged['allowances'] == [ARB, DTS]
+    assert merged['vendor_name'] == 'A'
+
+
+def test_merge_keeps_repeated_new_allowances():
+    dts_q1 = dict(DTS, description='Display Q1')
+    base = {'allowances': [ARB]}
+
+    merged = merge_partial_result(base, {'allowances': [DTS, DTS, dts_q1]})
+
+    assert merged['allowances'] == [ARB, DTS, DTS, dts_q1]
+
+
+def test_merge_matches_base_rows_one_to_one():
+    base = {'allowances': [DTS]}
+
+    merged = merge_partial_result(base, {'allowances': [DTS, DTS]})
+
+    assert merged['allowances'] == [DTS, DTS]
+
+
+def test_merge_keeps_allowances_with_different_conditions():
+    tiered = dict(ARB, conditions={'min_purchase': 1000000})
+
+    merged = merge_partial_result({'allowances': [ARB]}, {'allowances': [tiered]})
+
+    assert merged['allowances'] == [ARB, tiered]
+
+
+def test_parses_fenced_json_with_trailing_comma():
+    result, complete, field = repair_json('Here:\n```json\n{"vendor_code": "1", "allowances": [1, 2,],}\n```\nbye')
+
+    assert result == {'vendor_code': '1', 'allowances': [1, 2]}
+    assert complete and field is None
+
+
+def test_truncated_stream_keeps_complete_items():
+    parser = TolerantJSONParser()
+    text = '{"vendor_code": "7001537", "allowances": [{"category_code": "ARB"}, {"category_code": "DT'
+    for start in range(0, len(text), 7):
+        parser.feed(text[start:start + 7])
+
+    result, complete = parser.result()
+
+    assert not complete
+    assert result['vendor_code'] == '7001537'
+    assert result['allowances'][0] == {'category_code': 'ARB'}
+    assert parser.truncated_field == 'allowances'
+    # รายการสุดท้ายที่ถูกตัดกลางคันถูกทิ้งก่อนขอข้อมูลเพิ่ม
+    assert _drop_truncated_tail(result, parser.truncated_field)['allowances'] == [{'category_code': 'ARB'}]
+
+
+def test_braces_inside_strings_are_ignored():
+    result, complete, _ = repair_json('{"description": "rebate {tier} [1]", "x": 1}')
+
+    assert complete
+    assert result == {'description': 'rebate {tier} [1]', 'x': 1}
+
+
+def test_no_json_returns_none():
+    assert repair_json('no json here') == (None, False, None)
+    assert TolerantJSONParser().result() == (None, False)
+
+
+def test_missing_fields_include_truncated_field():
+    schema = {'properties': {'vendor_code': {}, 'allowances': {}, 'period': {}}, 'required': ['vendor_code', 'allowances']}
+
+    assert find_missing_fields(None, schema) == ['vendor_code', 'allowances']
+    assert find_missing_fields({'vendor_code': '', 'allowances': [1]}, schema) == ['vendor_code']
+    assert find_missing_fields({'vendor_code': '1', 'allowances': [1]}, schema, 'period') == ['period']
+    assert sub_schema(schema, ['allowances', 'unknown']) == {
+        'type': 'object', 'properties': {'allowances': {}}, 'required': ['allowances']
+    }
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tta_periods import ap_monthly, payment_frequency
+
+
+def test_period_expected_sums_to_should_collect(system):
+    periods = system.reconcile_by_period()
+
+    expected = periods.groupby(['match_key', 'category_code'])['expected'].sum()
+    should = system.calculated_allowances.groupby(['match_key', 'category_code'])['should_collect'].sum()
+    should = should[should != 0]
+    assert expected.reindex(should.index).to_numpy() == pytest.approx(should.to_numpy())
+
+
+def test_ap_without_dates_gives_typed_empty_frame():
+    ap = pd.DataFrame({'MATCH_KEY': [1, 2], 'EXTENDED_AMOUNT': [100.0, 200.0]})
+
+    purchases = ap_monthly(ap)
+
+    assert purchases.empty
+    assert pd.api.types.is_datetime64_any_dtype(purchases['month'])
+    assert purchases['amount'].dtype == 'float64'
+
+
+def test_reconcile_by_period_without_ap_dates(no_date_system):
+    periods = no_date_system.reconcile_by_period()
+
+    assert periods is not None
+    assert (periods['expected'] == 0).all()
+    assert periods['collected'].sum() > 0
+
+
+def test_payment_frequency():
+    terms = pd.Series(['Monthly', 'quarterly (3 months)', 'every 12 months', 'รายเดือน', None])
+
+    assert payment_frequency(terms).tolist() == ['M', 'Q', 'Y', 'M', 'Y']
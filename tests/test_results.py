@@ -0,0 +1,66 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tta_results import SharedResultStore, freeze_frame
+from tta_snapshot import ResultSnapshot
+
+
+def frames():
+    return {'summary': pd.DataFrame({'vendor_code': ['1'], 'should_collect': [1.0]})}
+
+
+def test_publish_keeps_new_run_when_all_runs_are_attached():
+    store = SharedResultStore(max_runs=2)
+    store.publish('r0', 'run 0', frames())
+    store.publish('r1', 'run 1', frames())
+    handles = [store.attach('r0'), store.attach('r1')]
+
+    run = store.publish('r2', 'run 2', frames())
+
+    assert run.run_id == 'r2'
+    assert 'r2' in store and 'r0' in store and 'r1' in store
+    assert store.attach('r2') is not None
+    assert all(handle is not None for handle in handles)
+
+
+def test_publish_evicts_oldest_idle_run():
+    store = SharedResultStore(max_runs=2)
+    store.publish('r0', 'run 0', frames())
+    store.publish('r1', 'run 1', frames())
+    handle = store.attach('r0')
+
+    store.publish('r2', 'run 2', frames())
+
+    assert 'r1' not in store
+    assert 'r0' in store and 'r2' in store
+    handle.release()
+
+
+def test_frozen_frame_shares_memory_and_is_read_only():
+    source = pd.DataFrame({'should_collect': [1.0, 2.0], 'vendor_code': ['1', '2']})
+
+    frozen = freeze_frame(source)
+
+    values = frozen['should_collect'].to_numpy()
+    assert np.shares_memory(values, source['should_collect'].to_numpy())
+    with pytest.raises(ValueError):
+        values[0] = 5.0
+    assert frozen['vendor_code'].tolist() == ['1', '2']
+
+
+def test_published_snapshot_frames_are_not_copied(system):
+    snapshot = ResultSnapshot.from_system(system)
+    frames = {'calculated': snapshot.calculated_allowances, 'summary': snapshot.summary}
+
+    run = SharedResultStore(max_runs=2).publish('r0', 'run 0', frames, system=snapshot)
+
+    for name, df in frames.items():
+        for col in df.columns:
+            if isinstance(df[col].dtype, np.dtype):
+                assert np.shares_memory(run.data[name][col].to_numpy(), df[col].to_numpy())
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tta_scenarios import BASELINE, ScenarioEngine, summarize_scenarios
+
+
+def baseline(results):
+    return results[results['scenario'] == BASELINE['name']]
+
+
+@pytest.mark.parametrize('fixture', ['system', 'no_date_system'])
+def test_baseline_equals_should_collect(fixture, request):
+    system = request.getfixturevalue(fixture)
+
+    results = system.run_scenarios([])
+
+    expected = system.calculated_allowances['should_collect'].to_numpy(dtype=float)
+    assert baseline(results)['should_collect'].to_numpy() == pytest.approx(expected)
+    assert expected.sum() > 0
+
+
+def test_no_date_matrix_spreads_total_purchase(no_date_system):
+    matrix = no_date_system.monthly_purchase_matrix()
+
+    total = no_date_system.calculated_allowances['total_purchase'].to_numpy(dtype=float)
+    assert matrix.sum(axis=1) == pytest.approx(total)
+    assert np.allclose(matrix, matrix[:, :1])
+
+
+def test_excluded_quarter_and_overrides():
+    calculated = pd.DataFrame({
+        'vendor_code': ['1', '1'], 'vendor_name': ['A', 'A'], 'category_code': ['ARB', 'DTS'],
+        'total_purchase': [1200.0, 1200.0], 'rate_percent': [10.0, 0.0], 'fix_amount': [0.0, 50.0],
+    })
+    engine = ScenarioEngine(calculated)
+
+    results = engine.run([
+        {'name': 'No Q4', 'exclude_quarters': [4]},
+        {'name': 'Higher', 'rate_overrides': {'1:ARB': 20.0}, 'fix_overrides': {'DTS': 80}},
+    ])
+
+    summary = summarize_scenarios(results).set_index('scenario')
+    assert summary.loc['Baseline', 'should_collect'] == pytest.approx(170.0)
+    assert summary.loc['No Q4', 'should_collect'] == pytest.approx(140.0)
+    assert summary.loc['Higher', 'change_vs_baseline'] == pytest.approx(150.0)
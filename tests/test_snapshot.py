@@ -0,0 +1,31 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tta_snapshot import ResultSnapshot
+
+
+def test_snapshot_keeps_fallback_matrix(no_date_system):
+    snapshot = ResultSnapshot.from_system(no_date_system)
+
+    total = no_date_system.calculated_allowances['total_purchase'].to_numpy(dtype=float)
+    assert snapshot.monthly_purchase.sum(axis=1) == pytest.approx(total)
+
+    results = snapshot.run_scenarios([])
+    expected = no_date_system.calculated_allowances['should_collect'].to_numpy(dtype=float)
+    assert results['should_collect'].to_numpy() == pytest.approx(expected)
+
+
+def test_zero_matrix_from_older_snapshot_falls_back(no_date_system, tmp_path):
+    snapshot = ResultSnapshot.from_system(no_date_system)
+    snapshot.monthly_purchase = np.zeros_like(snapshot.monthly_purchase)
+    loaded = ResultSnapshot.load(snapshot.save(str(tmp_path / 'old.snapshot.pkl')))
+
+    results = loaded.run_scenarios([])
+
+    expected = no_date_system.calculated_allowances['should_collect'].to_numpy(dtype=float)
+    assert results['should_collect'].to_numpy() == pytest.approx(expected)
@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tta_store import ExtractionStore
+
+
+def result(vendor, name):
+    return {'vendor_code': vendor, 'vendor_name': name, 'allowances': []}
+
+
+def test_append_replaces_record_and_loads_by_vendor(tmp_path):
+    store = ExtractionStore(str(tmp_path / 'store.jsonl'))
+    store.append('a.pdf', result('1', 'old'))
+    store.append_many([('b.pdf', result('2', 'B')), ('a.pdf', result('1', 'A'))])
+
+    assert len(store) == 2
+    assert store.vendors() == ['1', '2']
+    assert store.keys() == ['b.pdf', 'a.pdf']
+    assert [r['vendor_name'] for r in store.load()] == ['B', 'A']
+    assert store.load(vendors=['1']) == [result('1', 'A')]
+    assert store.load(keys=['b.pdf', 'missing']) == [result('2', 'B')]
+
+
+def test_reopen_scans_records_appended_after_index(tmp_path):
+    path = str(tmp_path / 'store.jsonl')
+    store = ExtractionStore(path)
+    store.append_many([('a.pdf', result('1', 'A'))])
+    store.append('b.pdf', result('2', 'B'))  # ไม่บันทึก index
+
+    reopened = ExtractionStore(path)
+
+    assert reopened.keys() == ['a.pdf', 'b.pdf']
+    assert reopened.load(vendors=['2']) == [result('2', 'B')]
+
+
+def test_rewritten_file_invalidates_index(tmp_path):
+    path = str(tmp_path / 'store.jsonl')
+    store = ExtractionStore(path)
+    store.append_many([('a.pdf', result('1', 'A' * 100)), ('b.pdf', result('2', 'B'))])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'key': 'c.pdf', 'vendor': '3', 'result': result('3', 'C')}) + '\n')
+
+    reopened = ExtractionStore(path)
+
+    assert reopened.keys() == ['c.pdf']
+
+
+def test_truncated_tail_is_overwritten_on_next_append(tmp_path):
+    path = str(tmp_path / 'store.jsonl')
+    store = ExtractionStore(path)
+    store.append_many([('a.pdf', result('1', 'A'))])
+    with open(path, 'ab') as f:
+        f.write(b'{"key": "b.pdf", "vendor": "2", "res')  # เขียนไม่จบ (process ถูก kill)
+
+    reopened = ExtractionStore(path)
+    assert reopened.keys() == ['a.pdf']
+    reopened.append('c.pdf', result('3', 'C'))
+
+    again = ExtractionStore(path)
+    assert again.keys() == ['a.pdf', 'c.pdf']
+    assert [r['vendor_name'] for r in again.load()] == ['A', 'C']
+
+
+def test_compact_keeps_latest_records(tmp_path):
+    path = str(tmp_path / 'store.jsonl')
+    store = ExtractionStore(path)
+    for name in ['v1', 'v2', 'v3']:
+        store.append('a.pdf', result('1', name))
+    store.append('b.pdf', result('2', 'B'))
+    size = os.path.getsize(path)
+
+    assert store.compact()
+
+    assert os.path.getsize(path) < size
+    assert [r['vendor_name'] for r in ExtractionStore(path).load()] == ['v3', 'B']
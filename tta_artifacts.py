@@ -0,0 +1,128 @@
+"""
+Cache ไฟล์ export (Excel / CSV / bundle) บนดิสก์ ตาม fingerprint ของข้อมูล + ตัวเลือก export
+
+- ไฟล์เดียวต่อ key ใช้ร่วมกันทุก session (ชื่อไฟล์มาจาก key จึงใช้ต่อได้หลังรีสตาร์ทแอป)
+- สร้างใน background thread (request ไม่ block): กดซ้ำ / rerun / session อื่นที่ขอ key เดียวกันใช้งานเดิม ไม่สร้างซ้ำ
+- เขียนลงไฟล์ชั่วคราวแล้ว os.replace จึงไม่มีใครเห็นไฟล์ที่เขียนไม่เสร็จ
+- หน้าเว็บส่ง file handle ให้ปุ่ม download (ไม่เก็บ bytes ค้างใน session_state)
+- เกิน EXPORT_CACHE_MAX_FILES ลบไฟล์ที่ใช้ล่าสุดนานที่สุดก่อน
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import config
+
+READY = 'ready'
+PENDING = 'pending'
+FAILED = 'failed'
+
+
+def artifact_name(fingerprint: str, export_type: str, file_format: str, extension: str) -> str:
+    """ชื่อไฟล์ของ artifact (ตัวเลือก export เป็น slug)"""
+    slug = lambda text: re.sub(r'[^0-9A-Za-z]+', '-', text).strip('-').lower()
+    return f"{fingerprint}_{slug(export_type)}_{slug(file_format)}{extension}"
+
+
+class ExportArtifactCache:
+    """ไฟล์ export ที่สร้างแล้วบนดิสก์ + งานที่กำลังสร้างใน background"""
+
+    def __init__(self, folder: str = None, max_files: int = None, workers: int = None):
+        self.folder = folder or os.path.join(config.TEMP_FOLDER, config.EXPORT_CACHE_FOLDER)
+        self.max_files = max_files or config.EXPORT_CACHE_MAX_FILES
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or config.EXPORT_CACHE_WORKERS, thread_name_prefix="tta-export"
+        )
+        self._pending: Dict[str, Future] = {}
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def status(self, name: str) -> Optional[str]:
+        """READY / PENDING / FAILED หรือ None (ยังไม่เคยขอ)"""
+        with self._lock:
+            if name in self._pending:
+                return PENDING
+            if os.path.exists(self.path(name)):
+                return READY
+            return FAILED if name in self._errors else None
+
+    def error(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._errors.get(name)
+
+    def request(self, name: str, build: Callable[[str], None]) -> str:
+        """ขอ artifact: มีแล้วคืน READY, ไม่มีเริ่มสร้างใน background (build(path ชั่วคราว)) คืน PENDING"""
+        with self._lock:
+            if name in self._pending:
+                return PENDING
+            if os.path.exists(self.path(name)):
+                self._touch(name)
+                return READY
+            self._errors.pop(name, None)
+            self._pending[name] = self._executor.submit(self._build, name, build)
+            return PENDING
+
+    def open_file(self, name: str):
+        """เปิด artifact สำหรับอ่าน (ผู้เรียกต้องปิดเอง) None = ยังไม่มี หรือถูกลบออกจาก cache ไปแล้ว"""
+        try:
+            handle = open(self.path(name), 'rb')
+        except FileNotFoundError:
+            return None
+        self._touch(name)
+        return handle
+
+    def _build(self, name: str, build: Callable[[str], None]):
+        target = self.path(name)
+        temp = f"{target}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            build(temp)
+            os.replace(temp, target)
+            self._prune()
+        except Exception as e:
+            print(f"❌ Error building export {name}: {e}")
+            with self._lock:
+                self._errors[name] = str(e)
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+
+    def _touch(self, name: str):
+        try:
+            os.utime(self.path(name))
+        except OSError:
+            pass
+
+    def _prune(self):
+        """ลบไฟล์ที่ใช้ล่าสุดนานที่สุดจนเหลือไม่เกิน max_files"""
+        files = [
+            os.path.join(self.folder, f) for f in os.listdir(self.folder) if not f.endswith('.tmp')
+        ]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[self.max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_export_cache = None
+_export_lock = threading.Lock()
+
+
+def get_export_cache() -> ExportArtifactCache:
+    """Cache ตัวเดียวที่ใช้ร่วมกันทั้ง process"""
+    global _export_cache
+    with _export_lock:
+        if _export_cache is None:
+            _export_cache = ExportArtifactCache()
+        return _export_cache
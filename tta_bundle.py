@@ -0,0 +1,141 @@
+"""
+Result bundle: ผลลัพธ์ของ run เป็นตาราง Parquet + manifest.json ในไฟล์ zip (หรือโฟลเดอร์)
+
+เขียน/อ่านเร็วกว่า Excel มาก (columnar ไม่มี XML) และเก็บที่มาของผลลัพธ์ไว้ใน manifest:
+    format, version        รูปแบบ bundle (อ่าน version ที่ใหม่กว่า BUNDLE_VERSION ไม่ได้)
+    run_id, created        run ที่สร้าง bundle
+    inputs                 ไฟล์ต้นทาง (ชื่อ, ขนาด, sha256) เช่น AP / AR / เอกสาร PDF
+    model, prompt_hash     model ของ Gemini และ hash ของ prompt ที่ใช้ดึงข้อมูล
+    tables                 ชื่อตาราง -> ไฟล์, จำนวนแถว, คอลัมน์
+
+Excel ยังคง export ได้เป็นรายงานสำหรับอ่าน (ดู tta_workbook)
+ต้องติดตั้ง pyarrow สำหรับ Parquet
+"""
+
+import hashlib
+import io
+import json
+import os
+import zipfile
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+BUNDLE_FORMAT = 'tta-result-bundle'
+BUNDLE_VERSION = 1
+BUNDLE_EXTENSION = '.bundle.zip'
+MANIFEST_NAME = 'manifest.json'
+
+
+class BundleError(ValueError):
+    """อ่าน/เขียน result bundle ไม่ได้"""
+
+
+def file_digest(path: str) -> Dict:
+    """ชื่อ ขนาด และ sha256 ของไฟล์ต้นทาง"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return {'file': os.path.basename(path), 'bytes': os.path.getsize(path), 'sha256': digest.hexdigest()}
+
+
+def describe_inputs(inputs: Dict[str, Iterable[str]]) -> Dict[str, list]:
+    """ประเภท -> รายการไฟล์ (ข้ามไฟล์ที่ไม่มีแล้ว)"""
+    described = {}
+    for kind, paths in inputs.items():
+        paths = [paths] if isinstance(paths, str) else list(paths or [])
+        described[kind] = [file_digest(p) for p in paths if p and os.path.isfile(p)]
+    return described
+
+
+def build_manifest(tables: Dict[str, pd.DataFrame], run_id: str, inputs: Dict = None,
+                   info: Dict = None) -> Dict:
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': BUNDLE_VERSION,
+        'run_id': run_id,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'inputs': describe_inputs(inputs or {}),
+        'model': None,
+        'prompt_hash': None,
+        'tables': {
+            name: {'file': f'{name}.parquet', 'rows': int(len(df)), 'columns': [str(c) for c in df.columns]}
+            for name, df in tables.items() if df is not None
+        },
+    }
+    manifest.update(info or {})
+    return manifest
+
+
+def write_bundle(tables: Dict[str, pd.DataFrame], target, run_id: str, inputs: Dict = None,
+                 info: Dict = None) -> Dict:
+    """เขียน bundle ลง target (path ของ .zip, โฟลเดอร์ที่มีอยู่แล้ว หรือ file-like) คืน manifest"""
+    if pyarrow is None:
+        raise BundleError("ต้องติดตั้ง pyarrow เพื่อเขียน result bundle")
+
+    manifest = build_manifest(tables, run_id, inputs, info)
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False, indent=2, default=str).encode('utf-8')
+
+    if isinstance(target, str) and os.path.isdir(target):
+        for name, entry in manifest['tables'].items():
+            tables[name].to_parquet(os.path.join(target, entry['file']), index=False)
+        with open(os.path.join(target, MANIFEST_NAME), 'wb') as f:
+            f.write(manifest_bytes)
+        return manifest
+
+    # Parquet บีบอัดในตัวแล้ว zip แค่เก็บ (ไม่บีบซ้ำ)
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_STORED) as bundle:
+        for name, entry in manifest['tables'].items():
+            bundle.writestr(entry['file'], tables[name].to_parquet(index=False))
+        bundle.writestr(MANIFEST_NAME, manifest_bytes)
+    return manifest
+
+
+def _check_manifest(manifest: Dict) -> Dict:
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise BundleError("ไม่ใช่ไฟล์ result bundle")
+    if int(manifest.get('version', 0)) > BUNDLE_VERSION:
+        raise BundleError(
+            f"bundle version {manifest['version']} ใหม่กว่าที่รองรับ ({BUNDLE_VERSION}) กรุณาอัปเดตโปรแกรม"
+        )
+    return manifest
+
+
+def read_bundle(source) -> Tuple[Dict[str, pd.DataFrame], Dict]:
+    """อ่าน bundle (path ของ .zip / โฟลเดอร์ หรือ file-like) คืน (ชื่อตาราง -> DataFrame, manifest)"""
+    if pyarrow is None:
+        raise BundleError("ต้องติดตั้ง pyarrow เพื่ออ่าน result bundle")
+
+    if isinstance(source, str) and os.path.isdir(source):
+        def read_bytes(name):
+            with open(os.path.join(source, name), 'rb') as f:
+                return f.read()
+        names = set(os.listdir(source))
+        return _read_tables(read_bytes, names)
+
+    try:
+        with zipfile.ZipFile(source) as bundle:
+            return _read_tables(bundle.read, set(bundle.namelist()))
+    except zipfile.BadZipFile:
+        raise BundleError("ไฟล์ zip เสียหรือไม่ใช่ result bundle")
+
+
+def _read_tables(read_bytes, names) -> Tuple[Dict[str, pd.DataFrame], Dict]:
+    if MANIFEST_NAME not in names:
+        raise BundleError(f"ไม่พบ {MANIFEST_NAME} - ไม่ใช่ไฟล์ result bundle")
+    manifest = _check_manifest(json.loads(read_bytes(MANIFEST_NAME).decode('utf-8')))
+    files = {name: entry['file'] for name, entry in manifest['tables'].items()}
+
+    tables = {}
+    for name, filename in files.items():
+        if filename not in names:
+            raise BundleError(f"ไม่พบตาราง {filename} ใน bundle")
+        tables[name] = pd.read_parquet(io.BytesIO(read_bytes(filename)))
+    return tables, manifest
@@ -0,0 +1,103 @@
+"""
+ชั้นข้อมูลของกราฟใน Auditor dashboard (ลดจำนวนจุดที่ส่งไป browser)
+
+- histogram: นับ bin ฝั่ง server ด้วย np.histogram ส่งไปแค่ bin ละแท่ง แทนค่าของทุก vendor
+- กราฟแท่ง: top-N + รวมที่เหลือเป็นแท่ง "อื่นๆ"
+- figure cache: เก็บ figure JSON ตาม fingerprint ของชุดข้อมูล ใช้ร่วมกันได้ทุก session
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import config
+
+
+def dataset_fingerprint(*frames) -> str:
+    """hash ของเนื้อหา DataFrame (ข้อมูลเหมือนกัน = fingerprint เดียวกัน ไม่ขึ้นกับ session)"""
+    digest = hashlib.sha1()
+    for df in frames:
+        if df is None:
+            digest.update(b'-')
+            continue
+        digest.update('|'.join(map(str, df.columns)).encode('utf-8'))
+        try:
+            digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        except TypeError:
+            # คอลัมน์ที่มีค่าหลายชนิดปนกัน hash ไม่ได้: ใช้ข้อความแทน
+            digest.update(df.to_csv(index=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def binned_histogram(values, bins: int = None) -> pd.DataFrame:
+    """นับจำนวนต่อ bin: คอลัมน์ left, right, count"""
+    values = pd.to_numeric(pd.Series(values), errors='coerce').dropna().to_numpy()
+    counts, edges = np.histogram(values, bins=bins or config.CHART_HISTOGRAM_BINS)
+    return pd.DataFrame({'left': edges[:-1], 'right': edges[1:], 'count': counts})
+
+
+def histogram_trace(values, bins: int = None, value_label: str = 'Value', **kwargs) -> go.Bar:
+    """histogram ที่นับ bin แล้ว ในรูปกราฟแท่งกว้างเท่า bin (ใช้กับ layout bargap=0)"""
+    table = binned_histogram(values, bins)
+    return go.Bar(
+        x=(table['left'] + table['right']) / 2,
+        y=table['count'],
+        width=table['right'] - table['left'],
+        customdata=table[['left', 'right']].to_numpy(),
+        hovertemplate=f'{value_label}: %{{customdata[0]:.1f}} ถึง %{{customdata[1]:.1f}}<br>Count: %{{y}}<extra></extra>',
+        **kwargs
+    )
+
+
+def top_n(df: pd.DataFrame, label: str, value: str, columns=None, n: int = None,
+          by_abs: bool = False, others_label: str = 'อื่นๆ') -> pd.DataFrame:
+    """n แถวที่ value สูงสุด (by_abs = ตามค่าสัมบูรณ์) ที่เหลือรวมเป็นแถวเดียว"""
+    n = n or config.CHART_TOP_N
+    columns = list(columns or [value])
+    ordered = df.sort_values(value, key=np.abs if by_abs else None, ascending=False)
+    if len(ordered) <= n:
+        return ordered[[label] + columns].reset_index(drop=True)
+
+    rest = ordered.iloc[n:]
+    others = pd.DataFrame([{label: f'{others_label} ({len(rest)})', **rest[columns].sum().to_dict()}])
+    return pd.concat([ordered.head(n)[[label] + columns], others], ignore_index=True)
+
+
+class FigureCache:
+    """LRU ของ figure JSON: key = (fingerprint ของข้อมูล, ชื่อกราฟ)
+
+    เก็บเป็น JSON (immutable) จึงใช้ร่วมกันข้าม session ได้ ผู้เรียกแก้ figure ที่ได้ไปโดยไม่กระทบ cache
+    """
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, fingerprint: str, name, build, *args) -> go.Figure:
+        key = (fingerprint, name)
+        with self._lock:
+            figure_json = self._items.get(key)
+            if figure_json is not None:
+                self._items.move_to_end(key)
+
+        if figure_json is None:
+            figure_json = build(*args).to_json()
+            with self._lock:
+                self._items[key] = figure_json
+                while len(self._items) > self.max_items:
+                    self._items.popitem(last=False)
+
+        return pio.from_json(figure_json)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+figure_cache = FigureCache(config.CHART_CACHE_SIZE)
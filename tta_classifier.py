@@ -0,0 +1,162 @@
+"""
+จัดประเภท allowance ของรายการ AR ที่ไม่มี REF_TYPE (หรือ REF_TYPE ไม่ตรงกับ ALLOWANCE_CATEGORIES)
+จากคำใน DESCRIPTION / DESC2 ด้วย Aho-Corasick automaton (ค้นทุก pattern ในรอบเดียวต่อข้อความ)
+
+ข้อความที่ซ้ำกันจะถูกจัดประเภทครั้งเดียว (factorize) แล้ว map กลับทั้งคอลัมน์
+"""
+
+from collections import deque
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+# คำที่บ่งบอกประเภท (ตัวพิมพ์เล็ก) -> (category_code, confidence)
+# ชื่อ category ใน ALLOWANCE_CATEGORIES จะถูกเพิ่มอัตโนมัติด้วย confidence 0.95
+KEYWORD_PATTERNS = {
+    "unconditional rebate": ("ARB", 0.95),
+    "conditional rebate": ("CRB", 0.95),
+    "rebate": ("ARB", 0.5),
+    "รีเบท": ("ARB", 0.5),
+    "brochure": ("BRO", 0.9),
+    "โบรชัวร์": ("BRO", 0.9),
+    "ค่าโฆษณา": ("BRO", 0.7),
+    "display": ("ADP", 0.85),
+    "ค่าจัดแสดง": ("ADP", 0.8),
+    "merchandise marketing": ("MMF", 0.95),
+    "seasonal": ("SEN", 0.9),
+    "coupon": ("COF", 0.9),
+    "คูปอง": ("COF", 0.9),
+    "anniversary": ("ANI", 0.95),
+    "ครบรอบ": ("ANI", 0.85),
+    "other promotion service": ("OTS", 0.95),
+    "other promotion support": ("OTN", 0.95),
+    "data sharing": ("DTS", 0.95),
+    "non return": ("NRT", 0.9),
+    "ไม่คืนสินค้า": ("NRT", 0.9),
+    "hygiene": ("HQC", 0.9),
+    "quality control": ("HQC", 0.9),
+    "guarantee gp": ("GCS", 0.95),
+    "compensation": ("GCS", 0.8),
+    "ชดเชย": ("GCS", 0.8),
+    "training": ("P13", 0.85),
+    "อบรม": ("P13", 0.8),
+    "new item": ("NIT", 0.95),
+    "entrance fee": ("NIT", 0.8),
+    "สินค้าใหม่": ("NIT", 0.85),
+    "new store": ("NST", 0.95),
+    "เปิดสาขาใหม่": ("NST", 0.9),
+    "renovate": ("RST", 0.9),
+    "ปรับปรุงสาขา": ("RST", 0.85),
+    "pc missing": ("PCM", 0.95),
+    "web portal": ("WPS", 0.95),
+    "web potal": ("WPS", 0.9),
+    "special discount": ("SPD", 0.95),
+    "ส่วนลดพิเศษ": ("SPD", 0.6),
+    "clearance": ("CCS", 0.9),
+    "markdown": ("CCS", 0.9),
+    "mark down": ("CCS", 0.9),
+}
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton แบบ pure Python (ใช้ pyahocorasick แทนถ้าติดตั้งไว้)"""
+
+    def __init__(self, patterns: Dict[str, Tuple]):
+        if ahocorasick is not None:
+            self._native = ahocorasick.Automaton()
+            for pattern, payload in patterns.items():
+                self._native.add_word(pattern, (pattern, payload))
+            self._native.make_automaton()
+            return
+
+        self._native = None
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern, payload in patterns.items():
+            state = 0
+            for ch in pattern:
+                if ch not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = len(self._goto) - 1
+                state = self._goto[state][ch]
+            self._out[state].append((pattern, payload))
+
+        # สร้าง failure link แบบ BFS
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def search(self, text: str) -> List[Tuple]:
+        """คืน (pattern, payload) ทุกตัวที่พบใน text"""
+        if self._native is not None:
+            return [match for _, match in self._native.iter(text)]
+
+        found = []
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            found.extend(self._out[state])
+        return found
+
+
+class CategoryClassifier:
+    """จัดประเภท allowance จากข้อความ description"""
+
+    def __init__(self, categories: Dict[str, str], patterns: Dict[str, Tuple] = None):
+        table = {name.lower(): (code, 0.95) for code, name in categories.items()}
+        table.update(KEYWORD_PATTERNS if patterns is None else patterns)
+        self.categories = categories
+        self.automaton = KeywordAutomaton(
+            {pattern: value for pattern, value in table.items() if value[0] in categories}
+        )
+
+    def classify_text(self, text: str) -> Tuple[str, float, str]:
+        """(category_code, confidence, pattern) ของข้อความเดียว ("" ถ้าไม่พบ)
+
+        เลือก pattern ที่ confidence สูงสุด ถ้าเท่ากันใช้ pattern ที่ยาวกว่า
+        (เช่น "unconditional rebate" ชนะ "conditional rebate" ที่อยู่ข้างใน)
+        """
+        matches = self.automaton.search(text)
+        if not matches:
+            return '', 0.0, ''
+        pattern, (code, confidence) = max(matches, key=lambda m: (m[1][1], len(m[0])))
+        return code, confidence, pattern
+
+    def classify(self, texts: pd.DataFrame) -> pd.DataFrame:
+        """จัดประเภททุกแถวจากคอลัมน์ข้อความ (รวมทุกคอลัมน์เป็นข้อความเดียว)
+
+        Returns:
+            DataFrame (index เดียวกับ texts) คอลัมน์ category_code, confidence, pattern
+        """
+        columns = [texts[col].fillna('').astype(str) for col in texts.columns]
+        combined = columns[0]
+        for column in columns[1:]:
+            combined = combined + ' | ' + column
+        combined = combined.str.lower()
+        codes, uniques = pd.factorize(combined, sort=False)
+        table = pd.DataFrame(
+            [self.classify_text(text) for text in uniques],
+            columns=['category_code', 'confidence', 'pattern']
+        )
+        if table.empty:
+            return pd.DataFrame(columns=['category_code', 'confidence', 'pattern'], index=texts.index)
+        return table.iloc[np.asarray(codes)].set_index(texts.index)
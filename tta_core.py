@@ -1,11 +1,31 @@
 import google.generativeai as genai
-from pdf2image import convert_from_path
+from google.generativeai import caching
+from pdf2image import convert_from_path, pdfinfo_from_path
+import hashlib
 import json
 import time
 import os
-from typing import Dict, List
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import config
+from tta_json import TolerantJSONParser, find_missing_fields, sub_schema
+from tta_ratelimit import GeminiRateLimiter, get_shared_limiter
+from tta_hedging import HedgeBudget, HedgeCancelled, LatencyTracker, run_hedged
+from tta_store import ExtractionStore
+from tta_keys import INVALID_KEY, render_match_key
+from tta_dimensions import CodeDimensions, first_column, read_source_csv
+from tta_classifier import CategoryClassifier
+from tta_rules import RuleSet
+from tta_scenarios import ScenarioEngine
+from tta_drilldown import build_drilldown
+from tta_bundle import BUNDLE_EXTENSION, BundleError, write_bundle
+from tta_excel import write_workbook
+from tta_periods import PERIODS_PER_YEAR, agreement_periods, ap_monthly, ar_dated, payment_frequency, to_period
 
 # กำหนด categories ของ allowance
 ALLOWANCE_CATEGORIES = {
@@ -33,16 +53,200 @@ ALLOWANCE_CATEGORIES = {
     "CCS": "Clearance/Markdown"
 }
 
+# Schema ของ JSON ที่ให้ Gemini ตอบกลับ (ใช้กับ response_schema)
+ALLOWANCE_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "vendor_code": {"type": "string"},
+        "Division_code": {"type": "string"},
+        "Division_name": {"type": "string"},
+        "Department_code": {"type": "array", "items": {"type": "string"}},
+        "Department_name": {"type": "string"},
+        "allowances": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "category_code": {
+                        "type": "string",
+                        "format": "enum",
+                        "enum": list(ALLOWANCE_CATEGORIES.keys())
+                    },
+                    "category_name": {"type": "string"},
+                    "rate_percent": {"type": "number", "nullable": True},
+                    "fix_amount": {"type": "number", "nullable": True},
+                    "description": {"type": "string"},
+                    "payment_terms": {"type": "string"},
+                    "conditions": {
+                        "type": "object",
+                        "nullable": True,
+                        "properties": {
+                            "tiers": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "min_purchase": {"type": "number"},
+                                        "rate_percent": {"type": "number"}
+                                    },
+                                    "required": ["min_purchase", "rate_percent"]
+                                }
+                            },
+                            "tier_mode": {"type": "string", "format": "enum", "enum": ["whole", "marginal"], "nullable": True},
+                            "min_purchase": {"type": "number", "nullable": True},
+                            "growth_target_percent": {"type": "number", "nullable": True},
+                            "base_purchase": {"type": "number", "nullable": True},
+                            "cap_amount": {"type": "number", "nullable": True}
+                        }
+                    }
+                },
+                "required": ["category_code", "rate_percent", "fix_amount", "description", "payment_terms"]
+            }
+        }
+    },
+    "required": ["vendor_code", "Division_code", "Division_name", "Department_code", "Department_name", "allowances"]
+}
+
+# Schema สำหรับวิเคราะห์หลายเอกสารใน request เดียว (แยกผลด้วย document_id)
+BATCH_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "documents": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "document_id": {"type": "string"},
+                    **ALLOWANCE_RESPONSE_SCHEMA["properties"]
+                },
+                "required": ["document_id"] + ALLOWANCE_RESPONSE_SCHEMA["required"]
+            }
+        }
+    },
+    "required": ["documents"]
+}
+
+# Compact wire format: key แบบย่อเพื่อลด output tokens (category_name เติมเองจาก ALLOWANCE_CATEGORIES)
+COMPACT_KEYS = {
+    "vendor_code": "v",
+    "Division_code": "dc",
+    "Division_name": "dn",
+    "Department_code": "pc",
+    "Department_name": "pn",
+    "allowances": "a",
+    "category_code": "c",
+    "rate_percent": "r",
+    "fix_amount": "f",
+    "description": "d",
+    "payment_terms": "t",
+    "conditions": "k",
+    "tiers": "ti",
+    "tier_mode": "tm",
+    "min_purchase": "mp",
+    "growth_target_percent": "g",
+    "base_purchase": "bp",
+    "cap_amount": "cap",
+    "documents": "docs",
+    "document_id": "id"
+}
+EXPANDED_KEYS = {short: full for full, short in COMPACT_KEYS.items()}
+
+# ตัวอย่าง response ที่แสดงใน prompt
+RESPONSE_EXAMPLE = {
+    "vendor_code": "รหัสผู้ขาย",
+    "Division_code": "รหัสแผนก",
+    "Division_name": "ชื่อแผนก",
+    "Department_code": ["รหัสฝ่าย"],
+    "Department_name": "ชื่อฝ่าย",
+    "allowances": [
+        {
+            "category_code": "ARB",
+            "category_name": "Unconditional Rebate",
+            "rate_percent": 5.0,
+            "fix_amount": None,
+            "description": "รายละเอียดเงื่อนไข",
+            "payment_terms": "monthly",
+            "conditions": None
+        },
+        {
+            "category_code": "CRB",
+            "category_name": "Conditional Rebate",
+            "rate_percent": None,
+            "fix_amount": None,
+            "description": "ยอดซื้อ 10 ล้านขึ้นไป 1%, 20 ล้านขึ้นไป 2% สูงสุดไม่เกิน 500,000",
+            "payment_terms": "annually",
+            "conditions": {
+                "tiers": [
+                    {"min_purchase": 10000000, "rate_percent": 1.0},
+                    {"min_purchase": 20000000, "rate_percent": 2.0}
+                ],
+                "tier_mode": "whole",
+                "min_purchase": None,
+                "growth_target_percent": None,
+                "base_purchase": None,
+                "cap_amount": 500000
+            }
+        }
+    ]
+}
+
+# Gemini นับ 1 หน้า PDF ประมาณ 258 input tokens
+TOKENS_PER_PDF_PAGE = 258
+
 
 class TTADocumentAnalyzer:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, max_repair_requests: int = None, limiter: GeminiRateLimiter = None,
+                 hedging: bool = None, batching: bool = None, context_cache: bool = None,
+                 page_split: bool = None, compact_output: bool = None):
         """Initialize Gemini API"""
         genai.configure(api_key=api_key)
         self.model_name = 'gemini-2.5-flash'
         self.model = genai.GenerativeModel(self.model_name)
+        # ใช้ limiter ร่วมกันทุก analyzer ใน process เพื่อไม่ให้เกิน quota
+        self.limiter = limiter or get_shared_limiter()
+        self.max_repair_requests = (
+            config.GEMINI_MAX_REPAIR_REQUESTS if max_repair_requests is None else max_repair_requests
+        )
+        
+        # Hedged requests: ยิงซ้ำเมื่อเอกสารใช้เวลานานเกิน percentile ของ latency ที่ผ่านมา
+        self.hedging = config.GEMINI_HEDGE_ENABLED if hedging is None else hedging
+        self.latency = LatencyTracker(min_samples=config.GEMINI_HEDGE_MIN_SAMPLES)
+        self.hedge_budget = HedgeBudget(config.GEMINI_HEDGE_BUDGET_RATIO)
+        
+        # Batching: รวมเอกสารเล็กหลายไฟล์ไว้ใน request เดียว
+        self.batching = config.GEMINI_BATCH_ENABLED if batching is None else batching
+        
+        # Compact output: ให้ model ตอบด้วย key แบบย่อ แล้วขยายกลับเป็นรูปแบบเต็ม
+        self.compact_output = config.GEMINI_COMPACT_OUTPUT if compact_output is None else compact_output
+        
+        # Page split: แยกเอกสารหลายหน้าเป็นกลุ่มหน้าแล้วดึงข้อมูลพร้อมกัน
+        self.page_split = config.GEMINI_PAGE_SPLIT_ENABLED if page_split is None else page_split
+        
+        # Prompt คงที่ สร้างครั้งเดียวต่อ analyzer และลงทะเบียนเป็น cached context ถ้า backend รองรับ
+        self._analysis_prompt = None
+        self.cached_context = None
+        if config.GEMINI_CONTEXT_CACHE_ENABLED if context_cache is None else context_cache:
+            self._create_context_cache()
+        
+        # Instrumentation: จำนวน request และ token ที่ใช้
+        self._usage_lock = threading.Lock()
+        self.usage = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'output_tokens': 0}
 
     def create_analysis_prompt(self) -> str:
+        if self._analysis_prompt is None:
+            self._analysis_prompt = self._build_analysis_prompt()
+        return self._analysis_prompt
+
+    def _build_analysis_prompt(self) -> str:
         categories_text = "\n".join([f"- {code}: {name}" for code, name in ALLOWANCE_CATEGORIES.items()])
+        response_example = json.dumps(self._to_wire(RESPONSE_EXAMPLE), ensure_ascii=False, indent=2)
+        if self.compact_output:
+            key_legend = ", ".join(f"{short} = {full}" for full, short in COMPACT_KEYS.items())
+            response_format = f"""ใช้ key แบบย่อ ({key_legend})
+        ไม่ต้องใส่ category_name (ระบบเติมให้จากรหัส)
+{response_example}"""
+        else:
+            response_format = response_example
         
         prompt = f"""
         คุณคือผู้เชี่ยวชาญด้านสัญญาการค้า (Trade Terms)
@@ -64,6 +268,10 @@ class TTADocumentAnalyzer:
         - Fix Amount (จำนวนเงินคงที่ ถ้ามี)
         - Description (รายละเอียดหรือเงื่อนไข)
         - Payment Terms (เงื่อนไขการจ่าย เช่น monthly, quarterly, annually)
+        - Conditions (เฉพาะ allowance ที่มีเงื่อนไข เช่น CRB หรือ rebate แบบขั้นบันได ถ้าไม่มีให้เป็น null):
+          tiers (ยอดซื้อขั้นต่ำและ rate ของแต่ละขั้น), tier_mode (whole = rate ขั้นสูงสุดใช้กับยอดทั้งหมด,
+          marginal = คิดแยกแต่ละขั้น), min_purchase (ยอดซื้อขั้นต่ำ), growth_target_percent และ base_purchase
+          (เป้าการเติบโตและยอดฐาน), cap_amount (rebate สูงสุด)
 
         กฎการวิเคราะห์ (Extraction Rules):
         1. **Header vs Detail:** ข้อมูลส่วนหัว Total Contract (เช่น % Auto Rate, Fix Amount) จะเป็น "ผลรวม" ของรายการย่อย ให้โฟกัสที่การดึง "รายการย่อย" (Line Items) ให้ครบทุกบรรทัด
@@ -83,61 +291,189 @@ class TTADocumentAnalyzer:
         - สรุปเฉพาะหัวข้อที่มี Rate หรือ Fix Amount
 
         Response ในรูปแบบ JSON เท่านั้น:
-      {{
-        "vendor_code": "รหัสผู้ขาย",
-        "Division_code": "รหัสแผนก",
-        "Division_name": "ชื่อแผนก",
-        "Department_code": "รหัสฝ่าย",
-        "Department_name": "ชื่อฝ่าย",
-        "allowances": [
-          {{
-            "category_code": "ARB",
-            "category_name": "Unconditional Rebate",
-            "rate_percent": 5.0,
-            "fix_amount": null,
-            "description": "รายละเอียดเงื่อนไข",
-            "payment_terms": "monthly"
-          }}
-        ]
-      }}
+        {response_format}
       """
         return prompt
 
-    def analyze_document(self, pdf_path: str) -> Dict:
-        """วิเคราะห์เอกสาร PDF"""
+    def run_info(self) -> Dict:
+        """model และ hash ของ prompt + schema ที่ใช้ดึงข้อมูล (เก็บใน manifest ของ result bundle)"""
+        fingerprint = self.create_analysis_prompt() + json.dumps(ALLOWANCE_RESPONSE_SCHEMA, sort_keys=True)
+        return {
+            'model': self.model_name,
+            'prompt_hash': hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:16],
+            'compact_output': self.compact_output,
+        }
+
+    def _to_wire(self, data):
+        """แปลงข้อมูลรูปแบบเต็มเป็นรูปแบบที่ส่ง/รับกับ model (compact ถ้าเปิดใช้)"""
+        return to_compact(data) if self.compact_output else data
+
+    def _wire_names(self, fields: List[str]) -> List[str]:
+        return [COMPACT_KEYS.get(field, field) for field in fields] if self.compact_output else list(fields)
+
+    def _create_context_cache(self):
+        """ลงทะเบียนคำสั่งวิเคราะห์เป็น cached context (ถ้าไม่รองรับจะส่ง prompt ปกติ)"""
         try:
-            print(f"\n🤖 กำลังวิเคราะห์: {os.path.basename(pdf_path)}")
-            
-            # Upload file
-            doc_file = genai.upload_file(path=pdf_path, display_name="Trade_Term_Doc")
-            
-            # รอ Processing
-            print("   รอการประมวลผล", end='')
-            while doc_file.state.name == "PROCESSING":
-                print('.', end='')
-                time.sleep(2)
-                doc_file = genai.get_file(doc_file.name)
-            print(" ✓")
+            self.cached_context = caching.CachedContent.create(
+                model=f"models/{self.model_name}",
+                display_name="tta_analysis_instructions",
+                system_instruction=self.create_analysis_prompt(),
+                ttl=timedelta(minutes=config.GEMINI_CONTEXT_CACHE_TTL_MINUTES)
+            )
+            self.model = genai.GenerativeModel.from_cached_content(self.cached_context)
+            print(f"🗂️ ใช้ cached context: {self.cached_context.name}")
+        except Exception as e:
+            self.cached_context = None
+            print(f"ℹ️ ไม่สามารถสร้าง cached context ({type(e).__name__}) - ส่ง prompt ตามปกติ")
+
+    def close(self):
+        """ลบ cached context เมื่อใช้งานเสร็จ"""
+        if self.cached_context is not None:
+            try:
+                self.cached_context.delete()
+            except Exception as e:
+                print(f"Error deleting cached context: {e}")
+            self.cached_context = None
+            self.model = genai.GenerativeModel(self.model_name)
+
+    def _with_instructions(self, parts: List) -> List:
+        """นำคำสั่งวิเคราะห์ไว้หน้าสุด (ถ้าไม่ได้อยู่ใน cached context) เพื่อให้ prefix เหมือนกันทุกเอกสาร"""
+        if self.cached_context is not None:
+            return list(parts)
+        return [self.create_analysis_prompt()] + list(parts)
+
+    def usage_stats(self) -> Dict:
+        """สถิติการใช้งาน: token, limiter, hedging"""
+        with self._usage_lock:
+            stats = dict(self.usage)
+        stats['limiter'] = self.limiter.stats()
+        stats['hedging'] = self.hedge_budget.stats()
+        stats['context_cache'] = self.cached_context is not None
+        return stats
+
+    def _record_usage(self, usage_metadata):
+        if usage_metadata is None:
+            return
+        with self._usage_lock:
+            self.usage['requests'] += 1
+            self.usage['prompt_tokens'] += getattr(usage_metadata, 'prompt_token_count', 0) or 0
+            self.usage['cached_tokens'] += getattr(usage_metadata, 'cached_content_token_count', 0) or 0
+            self.usage['output_tokens'] += getattr(usage_metadata, 'candidates_token_count', 0) or 0
+
+    def create_followup_prompt(self, partial: Dict, missing: List[str]) -> str:
+        """Prompt สำหรับขอข้อมูลเพิ่มเฉพาะฟิลด์ที่ยังขาด"""
+        partial_text = json.dumps(self._to_wire(partial or {}), ensure_ascii=False)
+        return f"""
+        ระบบได้ดึงข้อมูลจากเอกสารแนบนี้มาแล้วบางส่วน ดังนี้:
+        {partial_text}
+
+        โปรดดึงเฉพาะฟิลด์ที่ยังขาด: {", ".join(self._wire_names(missing))}
+        - ใช้กฎการวิเคราะห์เดียวกับคำสั่งด้านบน
+        - สำหรับ allowances ให้ส่งเฉพาะรายการที่ยังไม่มีในข้อมูลด้านบน
+        Response ในรูปแบบ JSON เท่านั้น
+        """
+
+    def create_page_group_prompt(self, pages: List[int], total_pages: int) -> str:
+        """Prompt เฉพาะกลุ่มหน้า (ใช้ในโหมด page split)"""
+        page_text = f"หน้า {pages[0]}" if len(pages) == 1 else f"หน้า {pages[0]}-{pages[-1]}"
+        if pages[0] == 1:
+            return f"""
+        **โหมดแยกหน้า:** รูปภาพแนบคือ{page_text} จากเอกสารทั้งหมด {total_pages} หน้า
+        - ดึง Vendor Code, Division Code/Name, Department Code/Name จากหน้านี้
+        - ดึง allowance เฉพาะส่วนที่มีหัวข้อชัดเจนของหน้า 1 ตามกฎด้านบน
+        """
+        return f"""
+        **โหมดแยกหน้า:** รูปภาพแนบคือ{page_text} จากเอกสารทั้งหมด {total_pages} หน้า (Additional Conditions)
+        - ดึงเฉพาะ allowances ตามกฎ Page 2 Analysis ด้านบน
+        - วิเคราะห์จากบริบทและ map เข้า Category ที่ถูกต้อง
+        """
+
+    def create_batch_prompt(self, document_ids: List[str]) -> str:
+        """Prompt สำหรับวิเคราะห์หลายเอกสารใน request เดียว"""
+        documents_key, document_id_key = self._wire_names(["documents", "document_id"])
+        return f"""
+        **โหมดหลายเอกสาร:** เอกสารแนบมีทั้งหมด {len(document_ids)} ไฟล์ ({", ".join(document_ids)})
+        แต่ละไฟล์จะนำหน้าด้วยข้อความ "document_id: ..." 
+        - ให้วิเคราะห์แต่ละไฟล์แยกกันตามกฎด้านบน ห้ามนำข้อมูลข้ามไฟล์มารวมกัน
+        - ตอบเป็น {{"{documents_key}": [...]}} โดยแต่ละรายการคือ JSON ตามรูปแบบด้านบน และเพิ่มฟิลด์ "{document_id_key}"
+        - ต้องมีครบทุก document_id
+        """
+
+    def analyze_documents(self, pdf_paths: List[str]) -> Dict[str, Dict]:
+        """วิเคราะห์หลายเอกสาร ถ้าเปิด batching จะรวมเอกสารเล็กไว้ใน request เดียว
+
+        Returns:
+            dict ของ pdf_path -> ผลการวิเคราะห์ (None ถ้าล้มเหลว)
+        """
+        results = {}
+        batches = plan_batches(pdf_paths) if self.batching else [[path] for path in pdf_paths]
+        
+        for batch in batches:
+            if len(batch) > 1:
+                results.update(self._analyze_batch(batch))
             
-            if doc_file.state.name == "FAILED":
-                raise ValueError(f"การประมวลผลล้มเหลว: {doc_file.state.name}")
+            # เอกสารเดี่ยว หรือเอกสารที่ batch ไม่ได้ผลครบ วิเคราะห์แยกทีละไฟล์
+            for pdf_path in batch:
+                if results.get(pdf_path) is None:
+                    results[pdf_path] = self.analyze_document(pdf_path)
+        
+        return results
+
+    def _analyze_batch(self, pdf_paths: List[str]) -> Dict[str, Dict]:
+        """วิเคราะห์หลายเอกสารใน generation request เดียว แล้วแยกผลกลับเป็นรายไฟล์"""
+        document_ids = [f"DOC{idx + 1}" for idx in range(len(pdf_paths))]
+        print(f"\n📦 กำลังวิเคราะห์แบบ batch: {', '.join(os.path.basename(p) for p in pdf_paths)}")
+        
+        doc_files = []
+        results = {}
+        try:
+            contents = self._with_instructions([self.create_batch_prompt(document_ids)])
+            for document_id, pdf_path in zip(document_ids, pdf_paths):
+                doc_file = self._upload_document(pdf_path)
+                doc_files.append(doc_file)
+                contents.extend([f"document_id: {document_id}", doc_file])
             
-            # Generate content
             print("   กำลังวิเคราะห์เอกสาร...")
-            prompt = self.create_analysis_prompt()
-            response = self.model.generate_content([doc_file, prompt])
+            batch_result, truncated = self._generate_json(contents, BATCH_RESPONSE_SCHEMA)
+            documents = (batch_result or {}).get('documents') or []
+            if truncated == 'documents':
+                # เอกสารสุดท้ายอาจถูกตัดกลางคัน
+                documents = documents[:-1]
             
-            # Parse JSON
-            response_text = response.text.strip()
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
+            by_id = {str(doc.get('document_id', '')).strip(): doc for doc in documents}
+            for document_id, pdf_path in zip(document_ids, pdf_paths):
+                doc = by_id.get(document_id)
+                if doc is None or find_missing_fields(doc, ALLOWANCE_RESPONSE_SCHEMA):
+                    print(f"   ⚠️ {os.path.basename(pdf_path)}: ผลใน batch ไม่ครบ จะวิเคราะห์แยก")
+                    continue
+                doc.pop('document_id', None)
+                results[pdf_path] = normalize_analysis_result(doc)
             
-            result = json.loads(response_text.strip())
+            print(f"   ✅ batch สำเร็จ {len(results)}/{len(pdf_paths)} ไฟล์")
+        except Exception as e:
+            print(f"   ❌ Batch error: {type(e).__name__}: {e}")
+        finally:
+            for doc_file in doc_files:
+                genai.delete_file(doc_file.name)
+        
+        return results
+
+    def analyze_document(self, pdf_path: str) -> Dict:
+        """วิเคราะห์เอกสาร PDF"""
+        try:
+            print(f"\n🤖 กำลังวิเคราะห์: {os.path.basename(pdf_path)}")
             
-            # Clean up
-            genai.delete_file(doc_file.name)
+            if self.hedging:
+                delay = self.latency.percentile(config.GEMINI_HEDGE_PERCENTILE)
+                result = run_hedged(
+                    lambda cancel_event: self._run_attempt(pdf_path, cancel_event),
+                    delay,
+                    self.hedge_budget
+                )
+                if result is None:
+                    raise ValueError("การวิเคราะห์ล้มเหลวทุก attempt")
+            else:
+                result = self._run_attempt(pdf_path)
             
             print("   ✅ วิเคราะห์สำเร็จ")
             return result
@@ -150,6 +486,135 @@ class TTADocumentAnalyzer:
             traceback.print_exc()
             return None
 
+    def _run_attempt(self, pdf_path: str, cancel_event=None) -> Dict:
+        """Upload + ดึงข้อมูล 1 รอบ (ลบไฟล์ที่ upload เสมอ และบันทึก latency)"""
+        started = time.monotonic()
+        
+        page_groups = split_page_groups(pdf_path) if self.page_split else []
+        if len(page_groups) > 1:
+            result = self._extract_page_groups(page_groups, cancel_event)
+        else:
+            doc_file = self._upload_document(pdf_path, cancel_event)
+            try:
+                print("   กำลังวิเคราะห์เอกสาร...")
+                result = self._extract([doc_file], cancel_event)
+            finally:
+                # Clean up
+                genai.delete_file(doc_file.name)
+        
+        self.latency.observe(time.monotonic() - started)
+        return result
+
+    def _extract_page_groups(self, page_groups: List[Dict], cancel_event=None) -> Dict:
+        """ดึงข้อมูลแต่ละกลุ่มหน้าพร้อมกัน แล้วรวมเป็น JSON เดียว"""
+        total_pages = page_groups[-1]['pages'][-1]
+        print(f"   กำลังวิเคราะห์แยก {len(page_groups)} กลุ่มหน้า ({total_pages} หน้า)...")
+        
+        def extract_group(group):
+            prompt = self.create_page_group_prompt(group['pages'], total_pages)
+            # กลุ่มหน้า 2+ ไม่มีข้อมูลส่วนหัว ขอเฉพาะ allowances
+            schema = (
+                ALLOWANCE_RESPONSE_SCHEMA if group['pages'][0] == 1
+                else sub_schema(ALLOWANCE_RESPONSE_SCHEMA, ['allowances'])
+            )
+            return self._extract([prompt] + group['images'], cancel_event, schema)
+        
+        with ThreadPoolExecutor(max_workers=len(page_groups), thread_name_prefix="tta-pages") as executor:
+            group_results = list(executor.map(extract_group, page_groups))
+        
+        return merge_page_results(group_results)
+
+    def _upload_document(self, pdf_path: str, cancel_event=None):
+        """Upload PDF และรอจนประมวลผลเสร็จ"""
+        doc_file = genai.upload_file(path=pdf_path, display_name="Trade_Term_Doc")
+        
+        # รอ Processing
+        print("   รอการประมวลผล", end='')
+        while doc_file.state.name == "PROCESSING":
+            if cancel_event is not None and cancel_event.is_set():
+                genai.delete_file(doc_file.name)
+                raise HedgeCancelled()
+            print('.', end='')
+            time.sleep(2)
+            doc_file = genai.get_file(doc_file.name)
+        print(" ✓")
+        
+        if doc_file.state.name == "FAILED":
+            genai.delete_file(doc_file.name)
+            raise ValueError(f"การประมวลผลล้มเหลว: {doc_file.state.name}")
+        
+        return doc_file
+
+    def _extract(self, doc_parts: List, cancel_event=None, schema: Dict = None) -> Dict:
+        """ดึงข้อมูลจากเอกสาร (ไฟล์ที่ upload แล้ว หรือรูปภาพรายหน้า) ถ้า response ไม่ครบจะขอเฉพาะฟิลด์ที่ขาดเพิ่ม"""
+        schema = schema or ALLOWANCE_RESPONSE_SCHEMA
+        result, truncated = self._generate_json(self._with_instructions(doc_parts), schema, cancel_event)
+        result = _drop_truncated_tail(result, truncated)
+        missing = find_missing_fields(result, schema, truncated)
+        
+        for _ in range(self.max_repair_requests):
+            if not missing:
+                break
+            print(f"   ↻ ขอข้อมูลเพิ่มเฉพาะฟิลด์ที่ขาด: {', '.join(missing)}")
+            extra, truncated = self._generate_json(
+                self._with_instructions(list(doc_parts) + [self.create_followup_prompt(result, missing)]),
+                sub_schema(schema, missing),
+                cancel_event
+            )
+            result = merge_partial_result(result, _drop_truncated_tail(extra, truncated))
+            missing = find_missing_fields(result, schema, truncated)
+        
+        if result is None:
+            raise ValueError("ไม่สามารถอ่าน JSON จาก response ได้")
+        if missing:
+            print(f"   ⚠️ ยังขาดฟิลด์: {', '.join(missing)}")
+        
+        return normalize_analysis_result(result)
+
+    def _generate_json(self, contents: List, schema: Dict, cancel_event=None):
+        """เรียก Gemini แบบ stream พร้อมบังคับ schema แล้ว parse แบบทนทาน
+
+        Returns:
+            (result, truncated_field) โดย truncated_field คือฟิลด์ระดับบนสุดที่ถูกตัดกลางคัน (None = ไม่ถูกตัด)
+        """
+        generation_config = genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=compact_schema(schema) if self.compact_output else schema
+        )
+        parser = self.limiter.call(self._stream_response, contents, generation_config, cancel_event)
+        result, _ = parser.result()
+        truncated = parser.truncated_field
+        if self.compact_output:
+            truncated = EXPANDED_KEYS.get(truncated, truncated)
+            if result is not None:
+                result = expand_compact(result)
+        return result, truncated
+
+    def _stream_response(self, contents: List, generation_config, cancel_event=None) -> TolerantJSONParser:
+        """ส่ง request และอ่าน stream เข้า parser (error ก่อนได้ข้อมูลจะถูกส่งต่อให้ limiter retry)"""
+        response = self.model.generate_content(contents, generation_config=generation_config, stream=True)
+        
+        parser = TolerantJSONParser()
+        usage_metadata = None
+        try:
+            for chunk in response:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                parser.feed(_response_text(chunk))
+                usage_metadata = getattr(chunk, 'usage_metadata', None) or usage_metadata
+        except Exception as e:
+            if not parser.text:
+                raise
+            # Stream ขาดกลางคัน ใช้ข้อมูลเท่าที่ได้
+            parser.interrupted = True
+            print(f"   ⚠️ Response ถูกตัด: {type(e).__name__}: {e}")
+        finally:
+            self._record_usage(usage_metadata)
+        
+        if cancel_event is not None and cancel_event.is_set():
+            raise HedgeCancelled()
+        return parser
+
     def save_summary(self, analysis_result: Dict, output_path: str):
         """บันทึกผลการวิเคราะห์เป็น JSON"""
         try:
@@ -161,6 +626,269 @@ class TTADocumentAnalyzer:
             return False
 
 
+def count_pdf_pages(pdf_path: str) -> int:
+    """นับจำนวนหน้าของ PDF (คืน None ถ้าอ่านไม่ได้)"""
+    try:
+        return int(pdfinfo_from_path(pdf_path)["Pages"])
+    except Exception:
+        return None
+
+
+def plan_batches(pdf_paths: List[str], max_pages: int = None, max_input_tokens: int = None,
+                 max_output_tokens: int = None) -> List[List[str]]:
+    """จัดกลุ่มเอกสารเล็กเข้า batch ตามจำนวนหน้าและ token ที่ประมาณไว้
+
+    เอกสารที่หน้าเกิน GEMINI_BATCH_SMALL_DOC_PAGES หรือนับหน้าไม่ได้จะอยู่ batch เดี่ยว
+    """
+    max_pages = config.GEMINI_BATCH_MAX_PAGES if max_pages is None else max_pages
+    max_input_tokens = config.GEMINI_BATCH_MAX_INPUT_TOKENS if max_input_tokens is None else max_input_tokens
+    max_output_tokens = config.GEMINI_BATCH_MAX_OUTPUT_TOKENS if max_output_tokens is None else max_output_tokens
+    
+    batches = []
+    current, current_pages = [], 0
+    
+    for pdf_path in pdf_paths:
+        pages = count_pdf_pages(pdf_path)
+        if pages is None or pages > config.GEMINI_BATCH_SMALL_DOC_PAGES:
+            batches.append([pdf_path])
+            continue
+        
+        next_pages = current_pages + pages
+        next_docs = len(current) + 1
+        fits = (
+            next_pages <= max_pages
+            and next_pages * TOKENS_PER_PDF_PAGE <= max_input_tokens
+            and next_docs * config.GEMINI_OUTPUT_TOKENS_PER_DOC <= max_output_tokens
+        )
+        if current and not fits:
+            batches.append(current)
+            current, current_pages = [], 0
+        current.append(pdf_path)
+        current_pages += pages
+    
+    if current:
+        batches.append(current)
+    return batches
+
+
+def split_page_groups(pdf_path: str, dpi: int = None, group_size: int = None) -> List[Dict]:
+    """Render PDF เป็นรูปรายหน้า แล้วแบ่งกลุ่ม: หน้า 1 (ส่วนหัวและหัวข้อหลัก) และหน้า 2+ ทีละ group_size หน้า"""
+    dpi = config.GEMINI_PAGE_SPLIT_DPI if dpi is None else dpi
+    group_size = config.GEMINI_PAGE_GROUP_SIZE if group_size is None else group_size
+    
+    images = convert_from_path(pdf_path, dpi=dpi)
+    groups = [{'pages': [1], 'images': images[:1]}] if images else []
+    for start in range(1, len(images), group_size):
+        chunk = images[start:start + group_size]
+        groups.append({'pages': list(range(start + 1, start + len(chunk) + 1)), 'images': chunk})
+    return groups
+
+
+def merge_page_results(group_results: List[Dict]) -> Dict:
+    """รวมผลของแต่ละกลุ่มหน้า (เรียงตามหน้า) เป็น JSON schema เดียว
+
+    ข้อมูลส่วนหัวใช้จากกลุ่มแรกที่มีค่า allowance ที่กลุ่มหน้าอื่นอ่านซ้ำ (category, rate, fix amount
+    และ conditions ตรงกัน) จะรวมเป็นรายการเดียว (ต่อ description ที่ต่างกันเข้าด้วยกัน)
+    รายการที่ค่าเหมือนกันในกลุ่มเดียวกันเป็นคนละ allowance (เช่น ANI 2 ครั้ง) จึงเก็บไว้ทั้งหมด
+    """
+    merged = {field: None for field in ALLOWANCE_RESPONSE_SCHEMA['required']}
+    merged['allowances'] = []
+    by_key = {}
+    
+    for group, result in enumerate(group_results):
+        for field, value in result.items():
+            if field != 'allowances' and merged.get(field) in (None, '', []) and value not in (None, '', []):
+                merged[field] = value
+        
+        matched = set()
+        for allowance in result.get('allowances') or []:
+            key = (
+                allowance.get('category_code'), allowance.get('rate_percent'), allowance.get('fix_amount'),
+                json.dumps(allowance.get('conditions'), sort_keys=True, ensure_ascii=False)
+            )
+            # รายการเดิมจากกลุ่มก่อนหน้าที่ยังไม่ถูกจับคู่กับรายการของกลุ่มนี้
+            existing = next(
+                (item for source, item in by_key.get(key, [])
+                 if source != group and id(item) not in matched), None
+            )
+            if existing is None:
+                allowance = dict(allowance)
+                by_key.setdefault(key, []).append((group, allowance))
+                merged['allowances'].append(allowance)
+                matched.add(id(allowance))
+                continue
+            matched.add(id(existing))
+            if allowance.get('description') and allowance['description'] not in (existing.get('description') or ''):
+                existing['description'] = ' / '.join(
+                    d for d in (existing.get('description'), allowance['description']) if d
+                )
+    
+    return merged
+
+
+def to_compact(data):
+    """แปลง key รูปแบบเต็มเป็นแบบย่อ (ตัด category_name ออก)"""
+    if isinstance(data, dict):
+        return {
+            COMPACT_KEYS.get(key, key): to_compact(value)
+            for key, value in data.items() if key != 'category_name'
+        }
+    if isinstance(data, list):
+        return [to_compact(item) for item in data]
+    return data
+
+
+def compact_schema(schema: Dict) -> Dict:
+    """แปลง response schema เป็นแบบ key ย่อ"""
+    schema = dict(schema)
+    if 'properties' in schema:
+        schema['properties'] = {
+            COMPACT_KEYS.get(key, key): compact_schema(value)
+            for key, value in schema['properties'].items() if key != 'category_name'
+        }
+    if 'required' in schema:
+        schema['required'] = [COMPACT_KEYS.get(key, key) for key in schema['required'] if key != 'category_name']
+    if 'items' in schema:
+        schema['items'] = compact_schema(schema['items'])
+    return schema
+
+
+def expand_compact(data):
+    """ขยาย key แบบย่อกลับเป็นรูปแบบเต็ม และเติม category_name จาก ALLOWANCE_CATEGORIES"""
+    if isinstance(data, list):
+        return [expand_compact(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    
+    expanded = {}
+    for key, value in data.items():
+        full_key = EXPANDED_KEYS.get(key, key)
+        expanded[full_key] = expand_compact(value)
+        if full_key == 'category_code':
+            expanded['category_name'] = ALLOWANCE_CATEGORIES.get(str(value).strip().upper(), '')
+    return expanded
+
+
+def _response_text(response) -> str:
+    """ดึงข้อความจาก response/chunk (บาง chunk ไม่มี text part)"""
+    try:
+        return response.text
+    except (ValueError, AttributeError):
+        return ''
+
+
+def _drop_truncated_tail(result: Dict, truncated_field: Optional[str]) -> Dict:
+    """ถ้า response ถูกตัดกลาง allowances รายการสุดท้ายอาจไม่ครบ ให้ตัดทิ้งแล้วขอใหม่"""
+    if result and truncated_field == 'allowances' and result.get('allowances'):
+        result = dict(result)
+        result['allowances'] = result['allowances'][:-1]
+    return result
+
+
+def _allowance_key(allowance: Dict) -> str:
+    """key ของ allowance ทั้งรายการ (รวม description / conditions) ใช้เทียบว่าเป็นรายการเดียวกัน"""
+    return json.dumps(allowance, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def merge_partial_result(base: Dict, extra: Dict) -> Dict:
+    """รวมผลที่ขอเพิ่มเข้ากับผลเดิม
+
+    allowances ที่ขอเพิ่มต่อท้ายผลเดิม ยกเว้นรายการที่ตรงกับรายการเดิมทุกฟิลด์ (จับคู่ 1 ต่อ 1)
+    รายการที่ซ้ำกันในผลที่ขอเพิ่มเองยังเก็บไว้ทั้งหมด (สัญญาอาจมี allowance เหมือนกันหลายรายการ)
+    """
+    if not base:
+        return extra
+    if not extra:
+        return base
+    
+    merged = dict(base)
+    for field, value in extra.items():
+        if field == 'allowances':
+            existing = list(merged.get('allowances') or [])
+            unmatched = Counter(_allowance_key(a) for a in existing)
+            for allowance in value or []:
+                key = _allowance_key(allowance)
+                if unmatched[key] > 0:
+                    unmatched[key] -= 1
+                else:
+                    existing.append(allowance)
+            merged['allowances'] = existing
+        elif value not in (None, '', []):
+            merged[field] = value
+    return merged
+
+
+def normalize_analysis_result(result: Dict) -> Dict:
+    """ตัด allowance ที่ไม่มี category_code และเติม category_name ที่ขาด"""
+    allowances = []
+    for allowance in result.get('allowances') or []:
+        category_code = str(allowance.get('category_code') or '').strip().upper()
+        if not category_code:
+            continue
+        allowance['category_code'] = category_code
+        if not allowance.get('category_name'):
+            allowance['category_name'] = ALLOWANCE_CATEGORIES.get(category_code, '')
+        allowances.append(allowance)
+    result['allowances'] = allowances
+    return result
+
+
+# คอลัมน์ของผลคำนวณ allowance (match_key เป็น int64 จาก tta_keys)
+CALCULATED_COLUMNS = [
+    'match_key', 'vendor_code', 'vendor_name', 'division_code', 'department_code',
+    'category_code', 'category_name', 'rate_percent', 'fix_amount', 'applied_rate',
+    'total_purchase', 'should_collect', 'condition_met', 'rule_note', 'description', 'payment_terms'
+]
+
+# คอลัมน์ของผลเปรียบเทียบรายงวด
+PERIOD_COLUMNS = [
+    'match_key', 'vendor_code', 'vendor_name', 'category_code', 'category_name',
+    'payment_terms', 'frequency', 'period', 'purchase', 'expected', 'collected',
+    'difference', 'cumulative_difference', 'status'
+]
+
+# คอลัมน์ข้อความของ AR ที่ใช้จัดประเภทเมื่อไม่มี REF_TYPE
+AR_TEXT_COLUMNS = ['DESC2', 'DESCRIPTION', 'DESC3']
+
+# คอลัมน์ยอดเงินของ AP/AR (ใช้ชื่อแรกที่พบ)
+AMOUNT_COLUMNS = ['EXTENDED_AMOUNT', 'INV_AMOUNT', 'AMOUNT']
+
+# คอลัมน์ที่ต้องมี (ชื่อใดชื่อหนึ่งในแต่ละกลุ่ม)
+AP_REQUIRED_COLUMNS = {
+    'VENDOR': CodeDimensions.VENDOR_COLUMNS,
+    'DEPARTMENT': ['DEPT_CODE', 'DEPT', 'DEPARTMENT', 'DEPARTMENT_ID', 'DPTNBR'],
+    'AMOUNT': AMOUNT_COLUMNS,
+}
+AR_REQUIRED_COLUMNS = {
+    'VENDOR': CodeDimensions.VENDOR_COLUMNS,
+    'DEPARTMENT': ['DPTNBR', 'DEPT_CODE', 'DEPT', 'DEPARTMENT', 'DEPARTMENT_ID', 'CC'],
+    'REF_TYPE': ['REF_TYPE'],
+    'AMOUNT': AMOUNT_COLUMNS,
+}
+
+
+def _amount_column(df: pd.DataFrame) -> pd.Series:
+    """ยอดเงินจากคอลัมน์แรกที่มี เป็นตัวเลข (อ่านไม่ได้ = 0)"""
+    return pd.to_numeric(df[first_column(df, AMOUNT_COLUMNS)], errors='coerce').fillna(0)
+
+
+def reconciliation_status(difference: pd.Series) -> pd.Series:
+    """สถานะการเรียกเก็บจากผลต่าง (ต่างกันไม่ถึง 1 บาทถือว่าครบ)"""
+    return pd.Series(
+        np.select([difference.abs() < 1, difference > 0], ['✅ ครบ', '⚠️ เกิน'], default='❌ ขาด'),
+        index=difference.index
+    )
+
+
+def with_readable_key(df: pd.DataFrame) -> pd.DataFrame:
+    """แทน match_key ด้วย tta_key แบบข้อความ (ใช้ตอนแสดงผล/export)"""
+    if 'match_key' not in df.columns:
+        return df
+    readable = df.drop(columns='match_key')
+    readable.insert(0, 'tta_key', render_match_key(df['match_key']).to_numpy())
+    return readable
+
+
 class TTAReconciliationSystem:
     def __init__(self, base_folder: str = "."):
         self.base_folder = base_folder
@@ -169,38 +897,41 @@ class TTAReconciliationSystem:
         self.ar_data = None
         self.calculated_allowances = None
         self.reconciliation_result = None
+        self.period_result = None
+        self.allowance_conditions = None
+        self.drilldown = {}
+        self.sources = {}
+        self.exported_files = {}
+        self.dimensions = CodeDimensions()
+        self.classifier = CategoryClassifier(ALLOWANCE_CATEGORIES) if config.AR_CLASSIFIER_ENABLED else None
 
-    def load_tta_summaries(self, json_files: List[str] = None) -> bool:
-        """โหลดไฟล์ JSON ที่มีผลการวิเคราะห์"""
+    def load_tta_summaries(self, json_files: List[str] = None, vendors: List[str] = None,
+                           keys: List[str] = None) -> bool:
+        """โหลดผลการวิเคราะห์ TTA
+
+        ถ้าไม่ระบุ json_files จะโหลดจาก ExtractionStore ใน base_folder (เลือกเฉพาะ vendor/key ได้)
+        ถ้า store ยังว่างแต่มีไฟล์ *_summary.json แบบเดิม จะย้ายเข้า store ก่อน
+        """
         try:
             if json_files is None:
-                json_files = [f for f in os.listdir(self.base_folder) if f.endswith('_summary.json')]
+                store = ExtractionStore(os.path.join(self.base_folder, config.EXTRACTION_STORE_FILE))
+                if not len(store):
+                    self._import_legacy_summaries(store)
+                all_data = store.load(vendors=vendors, keys=keys)
+            else:
+                all_data = []
+                for json_file in json_files:
+                    # ถ้าไม่มี path ให้ join กับ base_folder
+                    filepath = json_file if os.path.dirname(json_file) else os.path.join(self.base_folder, json_file)
+                    with open(filepath, 'r', encoding='utf-8') as f:
+                        all_data.append(json.load(f))
             
-            if not json_files:
-                print("❌ ไม่พบไฟล์ JSON")
+            if not all_data:
+                print("❌ ไม่พบผลการวิเคราะห์ TTA")
                 return False
             
-            all_data = []
-            for json_file in json_files:
-                # ถ้าเป็น absolute path ใช้ตรงๆ ถ้าไม่ใช่ ให้ join กับ base_folder
-                if os.path.isabs(json_file):
-                    filepath = json_file
-                else:
-                    # เช็คว่าไฟล์มี path อยู่แล้วหรือไม่
-                    if os.path.dirname(json_file):
-                        # มี path อยู่แล้ว ใช้ตรงๆ
-                        filepath = json_file
-                    else:
-                        # ไม่มี path ให้ join กับ base_folder
-                        filepath = os.path.join(self.base_folder, json_file)
-                
-                print(f"Debug: Loading from {filepath}")
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    all_data.append(data)
-            
             self.tta_data = all_data
-            print(f"✅ โหลด TTA สำเร็จ: {len(all_data)} ไฟล์")
+            print(f"✅ โหลด TTA สำเร็จ: {len(all_data)} เอกสาร")
             return True
             
         except Exception as e:
@@ -209,6 +940,20 @@ class TTAReconciliationSystem:
             traceback.print_exc()
             return False
 
+    def _import_legacy_summaries(self, store: 'ExtractionStore') -> int:
+        """ย้ายไฟล์ *_summary.json แบบเดิมเข้า store (key = ชื่อไฟล์ไม่รวม _summary.json)"""
+        if not os.path.isdir(self.base_folder):
+            return 0
+        items = []
+        for filename in sorted(os.listdir(self.base_folder)):
+            if filename.endswith('_summary.json'):
+                with open(os.path.join(self.base_folder, filename), 'r', encoding='utf-8') as f:
+                    items.append((filename[:-len('_summary.json')], json.load(f)))
+        if items:
+            store.append_many(items)
+            print(f"📦 ย้าย {len(items)} ไฟล์ *_summary.json เข้า {os.path.basename(store.path)}")
+        return len(items)
+
     def load_ap_data(self, csv_file: str = None) -> bool:
         """โหลดข้อมูล Account Payable (ยอดซื้อ)"""
         try:
@@ -220,52 +965,18 @@ class TTAReconciliationSystem:
                 csv_file = csv_files[0]
             
             filepath = os.path.join(self.base_folder, csv_file) if not os.path.isabs(csv_file) else csv_file
-            df = pd.read_csv(filepath)
-            
-            # แปลงชื่อคอลัมน์ให้เป็นมาตรฐาน
-            column_mapping = {
-                'VNDNBR': 'VENDOR_ID',
-                'VndCode': 'VENDOR_ID',
-                'VENDOR_CODE': 'VENDOR_ID',
-                
-                'VNDNAME': 'VENDOR_NAME',
-                'VENDOR_NAME': 'VENDOR_NAME',
-                
-                'DIV': 'DIVISION_ID',
-                'DIVISION': 'DIVISION_ID',
-                'DIVISION_ID': 'DIVISION_ID',
-                
-                'DEPT': 'DEPARTMENT_ID',
-                'DEPARTMENT': 'DEPARTMENT_ID',
-                'DEPARTMENT_ID': 'DEPARTMENT_ID',
-                'DEPT_CODE': 'DEPARTMENT_ID',
-                
-                'INV_AMOUNT': 'EXTENDED_AMOUNT',
-                'EXTENDED_AMOUNT': 'EXTENDED_AMOUNT',
-                'AMOUNT': 'EXTENDED_AMOUNT'
-            }
+            df = read_source_csv(filepath)
             
-            # เปลี่ยนชื่อคอลัมน์
-            df = df.rename(columns=column_mapping)
-            
-            # ตรวจสอบว่ามีคอลัมน์ที่จำเป็นหรือไม่
-            required_columns = ['VENDOR_ID', 'DIVISION_ID', 'DEPARTMENT_ID', 'EXTENDED_AMOUNT']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                print(f"❌ ไฟล์ AP ขาดคอลัมน์: {missing_columns}")
-                print(f"คอลัมน์ที่มี: {list(df.columns)}")
+            if not self._check_columns(df, 'AP', AP_REQUIRED_COLUMNS):
                 return False
+            self.sources['ap'] = filepath
             
-            self.ap_data = df
-            
-            # สร้าง match key
-            self.ap_data['TTA_MATCH_KEY'] = (
-                self.ap_data['VENDOR_ID'].astype(str) + '_' +
-                self.ap_data['DIVISION_ID'].astype(str).str.zfill(2) + '_' +
-                self.ap_data['DEPARTMENT_ID'].astype(str).str.zfill(3)
-            )
+            # normalize vendor/division/department และสร้าง MATCH_KEY (int64)
+            df = self.dimensions.normalize_ap(df)
+            df['EXTENDED_AMOUNT'] = _amount_column(df)
             
+            self.ap_data = df
+            self._report_unresolved(df, 'AP')
             print(f"✅ โหลด AP สำเร็จ: {len(self.ap_data):,} รายการ")
             return True
             
@@ -274,7 +985,10 @@ class TTAReconciliationSystem:
             return False
 
     def load_ar_data(self, csv_file: str = None) -> bool:
-        """โหลดข้อมูล Account Receivable (ยอดเรียกเก็บ)"""
+        """โหลดข้อมูล Account Receivable (ยอดเรียกเก็บ)
+
+        ควรโหลด AP ก่อน เพื่อให้แปลง CC ของ AR ผ่านตาราง DPTNBR ที่เรียนรู้จาก AP ได้
+        """
         try:
             if csv_file is None:
                 csv_files = [f for f in os.listdir(self.base_folder) if 'AR_Detail' in f and f.endswith('.csv')]
@@ -284,50 +998,22 @@ class TTAReconciliationSystem:
                 csv_file = csv_files[0]
             
             filepath = os.path.join(self.base_folder, csv_file) if not os.path.isabs(csv_file) else csv_file
-            df = pd.read_csv(filepath)
-            
-            # แปลงชื่อคอลัมน์ให้เป็นมาตรฐาน
-            column_mapping = {
-                'VNDNBR': 'VENDOR_ID',
-                'VndCode': 'VENDOR_ID',
-                'VENDOR_CODE': 'VENDOR_ID',
-                
-                'DIV': 'DIVISION_ID',
-                'DIVISION': 'DIVISION_ID',
-                
-                'DEPT': 'DEPARTMENT_ID',
-                'DEPARTMENT': 'DEPARTMENT_ID',
-                'DEPT_CODE': 'DEPARTMENT_ID',
-                
-                'EXTENDED_AMOUNT': 'EXTENDED_AMOUNT',
-                'AMOUNT': 'EXTENDED_AMOUNT',
-                'INV_AMOUNT': 'EXTENDED_AMOUNT'
-            }
-            
-            # เปลี่ยนชื่อคอลัมน์
-            df = df.rename(columns=column_mapping)
+            df = read_source_csv(filepath)
             
-            # ตรวจสอบว่ามีคอลัมน์ที่จำเป็นหรือไม่
-            required_columns = ['VENDOR_ID', 'DIVISION_ID', 'DEPARTMENT_ID', 'REF_TYPE', 'EXTENDED_AMOUNT']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                print(f"❌ ไฟล์ AR ขาดคอลัมน์: {missing_columns}")
-                print(f"คอลัมน์ที่มี: {list(df.columns)}")
+            if not self._check_columns(df, 'AR', AR_REQUIRED_COLUMNS):
                 return False
+            self.sources['ar'] = filepath
             
-            self.ar_data = df
+            # normalize vendor/division/department และสร้าง MATCH_KEY (int64)
+            df = self.dimensions.normalize_ar(df)
+            df['EXTENDED_AMOUNT'] = _amount_column(df)
             
             # Clean REF_TYPE
-            self.ar_data['REF_TYPE_CLEAN'] = self.ar_data['REF_TYPE'].str.strip().str.upper()
-            
-            # สร้าง match key
-            self.ar_data['TTA_MATCH_KEY'] = (
-                self.ar_data['VENDOR_ID'].astype(str) + '_' +
-                self.ar_data['DIVISION_ID'].astype(str).str.zfill(2) + '_' +
-                self.ar_data['DEPARTMENT_ID'].astype(str).str.zfill(3)
-            )
+            df['REF_TYPE_CLEAN'] = df['REF_TYPE'].fillna('').astype(str).str.strip().str.upper()
+            df = self._assign_categories(df)
             
+            self.ar_data = df
+            self._report_unresolved(df, 'AR')
             print(f"✅ โหลด AR สำเร็จ: {len(self.ar_data):,} รายการ")
             return True
             
@@ -337,14 +1023,56 @@ class TTAReconciliationSystem:
             traceback.print_exc()
             return False
 
+    def _assign_categories(self, df: pd.DataFrame) -> pd.DataFrame:
+        """กำหนด CATEGORY_CODE ของแต่ละแถว AR
+
+        ใช้ REF_TYPE ถ้าตรงกับ ALLOWANCE_CATEGORIES ไม่เช่นนั้นจัดประเภทจาก DESCRIPTION/DESC2
+        (เก็บ confidence และ pattern ที่ match ไว้ตรวจสอบ ใช้จริงเฉพาะที่ confidence ถึงเกณฑ์)
+        """
+        valid = df['REF_TYPE_CLEAN'].isin(list(ALLOWANCE_CATEGORIES))
+        df['CATEGORY_CODE'] = df['REF_TYPE_CLEAN'].where(valid, '')
+        df['CATEGORY_SOURCE'] = np.where(valid, 'REF_TYPE', '')
+        df['CATEGORY_CONFIDENCE'] = np.where(valid, 1.0, 0.0)
+        df['CATEGORY_PATTERN'] = ''
+        
+        text_columns = [col for col in AR_TEXT_COLUMNS if col in df.columns]
+        if self.classifier is None or valid.all() or not text_columns:
+            return df
+        
+        predicted = self.classifier.classify(df.loc[~valid, text_columns])
+        accepted = predicted['confidence'] >= config.AR_CLASSIFIER_MIN_CONFIDENCE
+        df.loc[~valid, 'CATEGORY_CONFIDENCE'] = predicted['confidence']
+        df.loc[~valid, 'CATEGORY_PATTERN'] = predicted['pattern']
+        df.loc[accepted[accepted].index, 'CATEGORY_CODE'] = predicted.loc[accepted, 'category_code']
+        df.loc[accepted[accepted].index, 'CATEGORY_SOURCE'] = 'DESCRIPTION'
+        
+        print(f"🔎 AR: จัดประเภทจาก description {int(accepted.sum()):,}/{len(predicted):,} รายการที่ไม่มี REF_TYPE ที่ใช้ได้")
+        return df
+
+    @staticmethod
+    def _check_columns(df: pd.DataFrame, source: str, required: Dict[str, List[str]]) -> bool:
+        """ตรวจว่ามีคอลัมน์อย่างน้อยหนึ่งชื่อของแต่ละกลุ่ม"""
+        missing_columns = [name for name, candidates in required.items() if not first_column(df, candidates)]
+        if missing_columns:
+            print(f"❌ ไฟล์ {source} ขาดคอลัมน์: {missing_columns}")
+            print(f"คอลัมน์ที่มี: {list(df.columns)}")
+            return False
+        return True
+
+    @staticmethod
+    def _report_unresolved(df: pd.DataFrame, source: str):
+        unresolved = int((df['MATCH_KEY'] == INVALID_KEY).sum())
+        if unresolved:
+            print(f"⚠️ {source}: {unresolved:,} รายการแปลง vendor/department ไม่ได้ (จะไม่ถูกจับคู่)")
+
     def calculate_allowances(self) -> pd.DataFrame:
         """คำนวณยอดที่ควรเรียกเก็บตาม TTA"""
         if self.tta_data is None or self.ap_data is None:
             print("❌ ต้องโหลด TTA และ AP ก่อน")
             return None
         
-        results = []
-        
+        # แตก TTA เป็นแถวละ (department, allowance)
+        terms = []
         for tta_doc in self.tta_data:
             vendor_code = tta_doc.get('vendor_code', '')
             division_code = str(tta_doc.get('Division_code', '')).zfill(2)
@@ -355,52 +1083,56 @@ class TTAReconciliationSystem:
                 dept_codes = [dept_codes]
             
             for dept_code in dept_codes:
-                dept_code_str = str(dept_code).zfill(3)
-                tta_key = f"{vendor_code}_{division_code}_{dept_code_str}"
-                
-                # Filter AP data
-                ap_subset = self.ap_data[self.ap_data['TTA_MATCH_KEY'] == tta_key]
-                
-                if ap_subset.empty:
-                    continue
-                
-                total_purchase = ap_subset['EXTENDED_AMOUNT'].sum()
-                vendor_name = ap_subset['VENDOR_NAME'].iloc[0] if len(ap_subset) > 0 else ''
-                
-                # คำนวณแต่ละ allowance
                 for allowance in tta_doc.get('allowances', []):
-                    category_code = allowance.get('category_code', '')
-                    category_name = allowance.get('category_name', '')
-                    rate_percent = allowance.get('rate_percent')
-                    fix_amount = allowance.get('fix_amount')
-                    description = allowance.get('description', '')
-                    payment_terms = allowance.get('payment_terms', '')
-                    
-                    # คำนวณยอดที่ควรเรียกเก็บ
-                    should_collect = 0
-                    if rate_percent:
-                        should_collect = total_purchase * (rate_percent / 100)
-                    if fix_amount:
-                        should_collect += fix_amount
-                    
-                    results.append({
-                        'tta_key': tta_key,
+                    terms.append({
                         'vendor_code': vendor_code,
-                        'vendor_name': vendor_name,
                         'division_code': division_code,
-                        'department_code': dept_code_str,
-                        'category_code': category_code,
-                        'category_name': category_name,
-                        'rate_percent': rate_percent,
-                        'fix_amount': fix_amount,
-                        'total_purchase': total_purchase,
-                        'should_collect': should_collect,
-                        'description': description,
-                        'payment_terms': payment_terms
+                        'department_code': str(dept_code).zfill(3),
+                        'category_code': allowance.get('category_code', ''),
+                        'category_name': allowance.get('category_name', ''),
+                        'rate_percent': allowance.get('rate_percent'),
+                        'fix_amount': allowance.get('fix_amount'),
+                        'description': allowance.get('description', ''),
+                        'payment_terms': allowance.get('payment_terms', ''),
+                        'conditions': allowance.get('conditions')
                     })
         
-        self.calculated_allowances = pd.DataFrame(results)
-        print(f"✅ คำนวณสำเร็จ: {len(results)} รายการ")
+        if not terms:
+            self.calculated_allowances = pd.DataFrame(columns=CALCULATED_COLUMNS)
+            print("✅ คำนวณสำเร็จ: 0 รายการ")
+            return self.calculated_allowances
+        
+        terms = pd.DataFrame(terms)
+        terms['match_key'], division, department = self.dimensions.tta_keys(
+            terms['vendor_code'], terms['division_code'], terms['department_code']
+        )
+        # แสดง code ในรูปแบบมาตรฐาน (เช่น Department_code "0240" -> division 02, department 040)
+        known = (division >= 0) & (department >= 0)
+        terms.loc[known, 'division_code'] = pd.Series(division[known]).astype(str).str.zfill(2).to_numpy()
+        terms.loc[known, 'department_code'] = pd.Series(department[known]).astype(str).str.zfill(3).to_numpy()
+        
+        # ยอดซื้อรวมต่อ match key
+        purchases = self.ap_data.groupby('MATCH_KEY', sort=False).agg(
+            total_purchase=('EXTENDED_AMOUNT', 'sum'),
+            vendor_name=('VENDOR_NAME', 'first')
+        )
+        
+        result = terms.merge(purchases, left_on='match_key', right_index=True, how='inner')
+        
+        # คำนวณยอดที่ควรเรียกเก็บ: rate (หรือ tier/เงื่อนไขของ CRB) + fix ทุกแถวในครั้งเดียว
+        rate = pd.to_numeric(result['rate_percent'], errors='coerce').fillna(0)
+        fix = pd.to_numeric(result['fix_amount'], errors='coerce').fillna(0)
+        rules = RuleSet(result['conditions'].tolist(), rate.to_numpy())
+        evaluated = rules.evaluate(result['total_purchase'].to_numpy())
+        result['applied_rate'] = evaluated['applied_rate'].to_numpy()
+        result['condition_met'] = evaluated['condition_met'].to_numpy()
+        result['rule_note'] = evaluated['rule_note'].to_numpy()
+        # fix_amount ของ allowance ที่มีเงื่อนไขได้เฉพาะเมื่อผ่านเงื่อนไข
+        result['should_collect'] = evaluated['rebate'].to_numpy() + fix.where(result['condition_met'], 0)
+        
+        self.calculated_allowances = result[CALCULATED_COLUMNS].reset_index(drop=True)
+        self.allowance_conditions = result['conditions'].tolist()
+        print(f"✅ คำนวณสำเร็จ: {len(self.calculated_allowances)} รายการ")
         return self.calculated_allowances
 
     def reconcile_with_ar(self) -> pd.DataFrame:
@@ -409,51 +1141,148 @@ class TTAReconciliationSystem:
             print("❌ ต้องคำนวณ allowances และโหลด AR ก่อน")
             return None
         
-        reconciliation_results = []
+        # ยอดเรียกเก็บจริงต่อ (match key, category) - category มาจาก REF_TYPE หรือ description
+        collected = self.ar_data.groupby(['MATCH_KEY', 'CATEGORY_CODE'], sort=False)['EXTENDED_AMOUNT'].sum()
+        collected.index.names = ['match_key', 'category_code']
         
-        for tta_key in self.calculated_allowances['tta_key'].unique():
-            tta_subset = self.calculated_allowances[self.calculated_allowances['tta_key'] == tta_key]
-            vendor_code = tta_subset['vendor_code'].iloc[0]
-            vendor_name = tta_subset['vendor_name'].iloc[0]
-            
-            for _, row in tta_subset.iterrows():
-                category_code = row['category_code']
-                category_name = row['category_name']
-                should_collect = row['should_collect']
-                
-                # หา AR ที่ match
-                ar_match = self.ar_data[
-                    (self.ar_data['TTA_MATCH_KEY'] == tta_key) &
-                    (self.ar_data['REF_TYPE_CLEAN'] == category_code)
-                ]
-                
-                actually_collected = ar_match['EXTENDED_AMOUNT'].sum() if not ar_match.empty else 0
-                difference = actually_collected - should_collect
-                
-                if abs(difference) < 1:
-                    status = '✅ ครบ'
-                elif difference > 0:
-                    status = '⚠️ เกิน'
-                else:
-                    status = '❌ ขาด'
-                
-                reconciliation_results.append({
-                    'tta_key': tta_key,
-                    'vendor_code': vendor_code,
-                    'vendor_name': vendor_name,
-                    'category_code': category_code,
-                    'category_name': category_name,
-                    'should_collect': should_collect,
-                    'actually_collected': actually_collected,
-                    'difference': difference,
-                    'status': status,
-                    'variance_pct': (difference / should_collect * 100) if should_collect > 0 else 0
-                })
-        
-        self.reconciliation_result = pd.DataFrame(reconciliation_results)
-        print(f"✅ เปรียบเทียบสำเร็จ: {len(reconciliation_results)} รายการ")
+        result = self.calculated_allowances[[
+            'match_key', 'vendor_code', 'vendor_name', 'category_code', 'category_name', 'should_collect'
+        ]].merge(collected.rename('actually_collected'), left_on=['match_key', 'category_code'],
+                 right_index=True, how='left')
+        
+        result['actually_collected'] = result['actually_collected'].fillna(0)
+        result['difference'] = result['actually_collected'] - result['should_collect']
+        result['status'] = reconciliation_status(result['difference'])
+        should_collect = result['should_collect'].where(result['should_collect'] > 0)
+        result['variance_pct'] = (result['difference'] / should_collect * 100).fillna(0)
+        
+        self.reconciliation_result = result.reset_index(drop=True)
+        # index สำหรับเปิดดูรายการ AR/AP ของแต่ละแถว (match key, category)
+        self.drilldown = build_drilldown(self.ap_data, self.ar_data)
+        print(f"✅ เปรียบเทียบสำเร็จ: {len(self.reconciliation_result)} รายการ")
         return self.reconciliation_result
 
+    def reconcile_by_period(self) -> pd.DataFrame:
+        """เปรียบเทียบยอดที่ควรเรียกเก็บกับยอดเรียกเก็บจริงรายงวด (เดือน/ไตรมาส/ปี ตาม payment_terms)
+
+        ยอดที่ควรเรียกเก็บของงวด = ยอดซื้อของงวด × applied_rate + fix_amount ÷ (จำนวนงวดต่อปี × จำนวนปี)
+        fix_amount กระจายเท่ากันทุกงวดของปีที่มียอดซื้อ (รวมงวดที่ไม่มียอดซื้อ) applied_rate คิดจากยอดทั้งปี
+        ตาม tier/เงื่อนไข ยอดรวมทุกงวดเท่ากับ calculate_allowances เมื่อ AP ทุกแถวระบุเดือน/ปีได้
+        """
+        if self.calculated_allowances is None or self.ap_data is None:
+            print("❌ ต้องคำนวณ allowances ก่อน")
+            return None
+        
+        terms = self.calculated_allowances.drop(columns=['total_purchase', 'should_collect'])
+        terms = terms.assign(
+            frequency=payment_frequency(terms['payment_terms']),
+            rate=terms['applied_rate'],
+            fix=pd.to_numeric(terms['fix_amount'], errors='coerce').fillna(0).where(terms['condition_met'], 0)
+        )
+        purchases = ap_monthly(self.ap_data)
+        if purchases.empty:
+            print("⚠️ AP ไม่มีคอลัมน์วันที่/เดือน/ปี แบ่งยอดซื้อตามงวดไม่ได้ (แสดงเฉพาะยอดเรียกเก็บจริง)")
+        collections = (
+            ar_dated(self.ar_data) if self.ar_data is not None
+            else pd.DataFrame(columns=['MATCH_KEY', 'CATEGORY_CODE', 'date', 'amount'])
+        )
+        
+        frames = []
+        for frequency, group in terms.groupby('frequency', sort=False):
+            ap_periods = (
+                purchases.assign(period=to_period(purchases['month'], frequency))
+                .groupby(['MATCH_KEY', 'period'], as_index=False)['amount'].sum()
+                .rename(columns={'MATCH_KEY': 'match_key', 'amount': 'purchase'})
+            )
+            agreement = agreement_periods(purchases, frequency)
+            ar_periods = (
+                collections.assign(period=to_period(pd.to_datetime(collections['date']), frequency))
+                .groupby(['MATCH_KEY', 'CATEGORY_CODE', 'period'], as_index=False)['amount'].sum()
+                .rename(columns={'MATCH_KEY': 'match_key', 'CATEGORY_CODE': 'category_code', 'amount': 'collected'})
+            )
+            periods = pd.concat([agreement[['match_key', 'period']], ar_periods[['match_key', 'period']]])
+            
+            expanded = (
+                group.merge(periods.drop_duplicates(), on='match_key')
+                .merge(agreement, on=['match_key', 'period'], how='left')
+                .merge(ap_periods, on=['match_key', 'period'], how='left')
+                .merge(ar_periods, on=['match_key', 'category_code', 'period'], how='left')
+            )
+            expanded[['purchase', 'collected']] = expanded[['purchase', 'collected']].fillna(0).astype(float)
+            # fix_amount กระจายทุกงวดของปีที่มียอดซื้อ (งวดนอกปีที่มีแต่ยอดเรียกเก็บล่าช้าไม่นับ)
+            years = expanded['years'].fillna(0).to_numpy(dtype=float)
+            fix_share = np.divide(
+                expanded['fix'].to_numpy(dtype=float), PERIODS_PER_YEAR[frequency] * years,
+                out=np.zeros(len(expanded)), where=years > 0
+            )
+            expanded['expected'] = expanded['purchase'] * (expanded['rate'] / 100) + fix_share
+            frames.append(expanded)
+        
+        if not frames:
+            self.period_result = pd.DataFrame(columns=PERIOD_COLUMNS)
+            return self.period_result
+        
+        # allowance หลายรายการของ category เดียวกันรวมเป็นแถวเดียว (ยอดเรียกเก็บจริงนับครั้งเดียว)
+        result = pd.concat(frames, ignore_index=True).groupby(
+            ['match_key', 'category_code', 'frequency', 'period'], as_index=False, sort=True
+        ).agg(
+            vendor_code=('vendor_code', 'first'),
+            vendor_name=('vendor_name', 'first'),
+            category_name=('category_name', 'first'),
+            payment_terms=('payment_terms', 'first'),
+            purchase=('purchase', 'first'),
+            expected=('expected', 'sum'),
+            collected=('collected', 'first')
+        )
+        result = result[(result['expected'] != 0) | (result['collected'] != 0)]
+        
+        result['difference'] = result['collected'] - result['expected']
+        result['cumulative_difference'] = result.groupby(
+            ['match_key', 'category_code', 'frequency'], sort=False
+        )['difference'].cumsum()
+        result['status'] = reconciliation_status(result['difference'])
+        
+        self.period_result = result[PERIOD_COLUMNS].reset_index(drop=True)
+        print(f"✅ เปรียบเทียบรายงวดสำเร็จ: {len(self.period_result)} รายการ")
+        return self.period_result
+
+    def run_scenarios(self, scenarios: List[Dict]) -> pd.DataFrame:
+        """คำนวณ what-if หลาย scenario พร้อมกัน (ดูรูปแบบ scenario ใน tta_scenarios)
+
+        Returns:
+            DataFrame แบบ long แถวละ scenario × allowance (Baseline = ผลของ calculate_allowances)
+        """
+        if self.calculated_allowances is None or self.ap_data is None:
+            print("❌ ต้องคำนวณ allowances ก่อน")
+            return None
+        
+        collected = (
+            self.reconciliation_result['actually_collected'].to_numpy()
+            if self.reconciliation_result is not None else None
+        )
+        
+        engine = ScenarioEngine(
+            self.calculated_allowances, self.monthly_purchase_matrix(), collected, self.allowance_conditions
+        )
+        return engine.run(scenarios)
+
+    def monthly_purchase_matrix(self) -> np.ndarray:
+        """ยอดซื้อรายเดือนของแต่ละแถว calculated_allowances (แถว × 12 เดือน รวมทุกปีตามเดือนของปี)
+
+        แถวที่ AP ไม่มีวันที่/เดือน/ปี ใช้ total_purchase เฉลี่ยเท่ากันทุกเดือน (ผล Baseline จึงเท่ากับ should_collect)
+        """
+        purchases = ap_monthly(self.ap_data)
+        monthly = (
+            purchases.assign(month_of_year=pd.to_datetime(purchases['month']).dt.month)
+            .pivot_table(index='MATCH_KEY', columns='month_of_year', values='amount', aggfunc='sum', fill_value=0)
+            .reindex(columns=range(1, 13), fill_value=0)
+            .reindex(self.calculated_allowances['match_key'], fill_value=0)
+        ).to_numpy(dtype='float64', copy=True)
+        total = pd.to_numeric(self.calculated_allowances['total_purchase'], errors='coerce').fillna(0).to_numpy()
+        undated = (monthly.sum(axis=1) == 0) & (total != 0)
+        monthly[undated] = total[undated, None] / 12
+        return monthly
+
     def generate_summary_report(self) -> pd.DataFrame:
         """สร้างรายงานสรุป"""
         if self.reconciliation_result is None:
@@ -465,9 +1294,7 @@ class TTAReconciliationSystem:
             'difference': 'sum'
         }).reset_index()
         
-        summary['status'] = summary['difference'].apply(
-            lambda x: '✅ ครบ' if abs(x) < 1 else ('⚠️ เกิน' if x > 0 else '❌ ขาด')
-        )
+        summary['status'] = reconciliation_status(summary['difference'])
         
         summary['variance_pct'] = (
             summary['difference'] / summary['should_collect'] * 100
@@ -475,27 +1302,50 @@ class TTAReconciliationSystem:
         
         return summary
 
-    def export_results(self, output_folder: str = None) -> str:
-        """Export ผลลัพธ์เป็น Excel"""
+    def export_results(self, output_folder: str = None, run_info: Dict = None, inputs: Dict = None) -> str:
+        """Export ผลลัพธ์เป็น result bundle (Parquet + manifest) และรายงาน Excel
+        
+        Args:
+            run_info: ข้อมูลของ run สำหรับ manifest เช่น model, prompt_hash (ดู TTADocumentAnalyzer.run_info)
+            inputs: ไฟล์ต้นทางเพิ่มเติมสำหรับ manifest เช่น {'documents': [pdf paths]} (AP/AR ใส่ให้อัตโนมัติ)
+        
+        Returns:
+            path ของไฟล์ Excel (หรือ bundle ถ้าไม่ได้ export Excel) ไฟล์ทั้งหมดอยู่ใน self.exported_files
+        """
         if output_folder is None:
             output_folder = self.base_folder
         
         try:
             timestamp = pd.Timestamp.now().strftime("%Y%m%d_%H%M%S")
-            filename = os.path.join(output_folder, f"TTA_Reconciliation_{timestamp}.xlsx")
+            run_id = f"TTA_Reconciliation_{timestamp}"
+            self.exported_files = {}
+            
+            sheets = {
+                'Calculated': self.calculated_allowances,
+                'Reconciliation': self.reconciliation_result,
+                'Periods': self.period_result,
+            }
+            sheets = {name: with_readable_key(df) for name, df in sheets.items() if df is not None}
+            summary = self.generate_summary_report()
+            if summary is not None:
+                sheets['Summary'] = summary
+            
+            if config.EXPORT_RESULT_BUNDLE:
+                bundle_file = os.path.join(output_folder, run_id + BUNDLE_EXTENSION)
+                try:
+                    write_bundle(sheets, bundle_file, run_id, {**self.sources, **(inputs or {})}, run_info)
+                    self.exported_files['bundle'] = bundle_file
+                except BundleError as e:
+                    print(f"⚠️ ไม่ได้ export result bundle: {e}")
             
-            with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-                if self.calculated_allowances is not None:
-                    self.calculated_allowances.to_excel(writer, sheet_name='Calculated', index=False)
-                
-                if self.reconciliation_result is not None:
-                    self.reconciliation_result.to_excel(writer, sheet_name='Reconciliation', index=False)
-                
-                summary = self.generate_summary_report()
-                if summary is not None:
-                    summary.to_excel(writer, sheet_name='Summary', index=False)
+            # Excel เป็นรายงานสำหรับอ่าน (export เสมอถ้าเขียน bundle ไม่ได้)
+            if config.EXPORT_EXCEL or 'bundle' not in self.exported_files:
+                filename = os.path.join(output_folder, run_id + '.xlsx')
+                write_workbook(sheets, filename)
+                self.exported_files['excel'] = filename
             
-            print(f"✅ Export สำเร็จ: {os.path.basename(filename)}")
+            filename = self.exported_files.get('excel', self.exported_files.get('bundle'))
+            print(f"✅ Export สำเร็จ: {', '.join(os.path.basename(f) for f in self.exported_files.values())}")
             return filename
         except Exception as e:
             print(f"❌ Error exporting: {e}")
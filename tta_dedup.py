@@ -0,0 +1,190 @@
+"""
+ตรวจจับเอกสาร Agreement ที่สแกนซ้ำ (near-duplicate) ด้วย perceptual hash ของแต่ละหน้า
+เพื่อนำผลการวิเคราะห์เดิมกลับมาใช้แทนการเรียก Gemini ใหม่
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from PIL import Image
+from pdf2image import convert_from_path
+
+import config
+
+
+def dhash(image, hash_size: int = 16) -> int:
+    """Difference hash ขนาด hash_size² bit ของรูปภาพ (ทนต่อการสแกนใหม่/บีบอัดต่างกัน)
+
+    ใช้ 16x16 แทน 8x8 เพราะ Agreement ส่วนใหญ่ใช้แบบฟอร์มเดียวกัน hash หยาบจะแยกเอกสารต่าง vendor ไม่ออก
+    """
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compute_page_hashes(pdf_path: str, dpi: int = None) -> List[int]:
+    """Render ทุกหน้าด้วย pdf2image (ความละเอียดต่ำ) แล้วคำนวณ dhash"""
+    pages = convert_from_path(pdf_path, dpi=dpi or config.DEDUP_DPI, grayscale=True)
+    return [dhash(page, config.DEDUP_HASH_SIZE) for page in pages]
+
+
+def compare_pages(prior: List[int], current: List[int], max_distance: int = None) -> Dict:
+    """เทียบ hash รายหน้าระหว่างเอกสารเดิมกับเอกสารใหม่
+
+    Returns:
+        dict ที่มี similarity (สัดส่วนหน้าของเอกสารเดิมที่พบในเอกสารใหม่)
+        และ new_pages (เลขหน้าของเอกสารใหม่ที่ไม่ตรงกับหน้าใดของเอกสารเดิม เริ่มที่ 1)
+    """
+    max_distance = config.DEDUP_PAGE_MAX_DISTANCE if max_distance is None else max_distance
+    used = set()
+
+    for prior_hash in prior:
+        candidates = [
+            (hamming_distance(prior_hash, current_hash), idx)
+            for idx, current_hash in enumerate(current) if idx not in used
+        ]
+        if candidates:
+            distance, idx = min(candidates)
+            if distance <= max_distance:
+                used.add(idx)
+
+    return {
+        'similarity': len(used) / len(prior) if prior else 0.0,
+        'new_pages': [idx + 1 for idx in range(len(current)) if idx not in used],
+    }
+
+
+class DocumentHashIndex:
+    """Index ของเอกสารที่วิเคราะห์แล้ว เก็บ page hash และผลการวิเคราะห์ไว้ในไฟล์ JSON"""
+
+    def __init__(self, index_path: str = None, threshold: float = None):
+        self.index_path = index_path or os.path.join(config.TEMP_FOLDER, config.DEDUP_INDEX_FILE)
+        self.threshold = config.DEDUP_SIMILARITY_THRESHOLD if threshold is None else threshold
+        self.entries = []
+        self._hash_cache = {}
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('documents', [])
+            except Exception as e:
+                print(f"Error loading hash index: {e}")
+                self.entries = []
+
+    def save(self) -> bool:
+        try:
+            os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                json.dump({'documents': self.entries}, f, ensure_ascii=False)
+            return True
+        except Exception as e:
+            print(f"Error saving hash index: {e}")
+            return False
+
+    def _fingerprint(self, pdf_path: str) -> Dict:
+        """sha256 + page hash ของไฟล์ (cache ไว้ในหน่วยความจำ ไม่ต้อง render ซ้ำ)"""
+        if pdf_path not in self._hash_cache:
+            sha256 = file_sha256(pdf_path)
+            known = next((e for e in self.entries if e.get('sha256') == sha256), None)
+            page_hashes = (
+                [int(h, 16) for h in known['page_hashes']] if known else compute_page_hashes(pdf_path)
+            )
+            self._hash_cache[pdf_path] = {'sha256': sha256, 'page_hashes': page_hashes}
+        return self._hash_cache[pdf_path]
+
+    def find_match(self, pdf_path: str) -> Optional[Dict]:
+        """หาเอกสารเดิมที่เหมือนกันเกิน threshold
+
+        Returns:
+            dict ที่มี entry, similarity, new_pages, exact หรือ None ถ้าไม่พบ
+            exact = ไฟล์เดียวกัน (sha256 ตรงกัน) ใช้ผลเดิมได้ทันที ส่วน near match เป็นเพียงตัวเทียบ
+            (Agreement ใช้แบบฟอร์มเดียวกัน hash ของหน้าแทบไม่ต่างเมื่อต่างแค่ vendor / rate / ยอดเงิน)
+        """
+        if not self.entries:
+            return None
+        try:
+            fingerprint = self._fingerprint(pdf_path)
+        except Exception as e:
+            print(f"Error hashing {os.path.basename(pdf_path)}: {e}")
+            return None
+
+        best = None
+        for entry in self.entries:
+            if entry.get('sha256') == fingerprint['sha256']:
+                return {'entry': entry, 'similarity': 1.0, 'new_pages': [], 'exact': True}
+            comparison = compare_pages(
+                [int(h, 16) for h in entry['page_hashes']], fingerprint['page_hashes']
+            )
+            if comparison['similarity'] >= self.threshold and (
+                best is None or comparison['similarity'] > best['similarity']
+            ):
+                best = dict(comparison, entry=entry, exact=False)
+        return best
+
+    def add(self, pdf_path: str, analysis_result: Dict) -> bool:
+        """บันทึกเอกสารที่วิเคราะห์แล้วลง index"""
+        try:
+            fingerprint = self._fingerprint(pdf_path)
+        except Exception as e:
+            print(f"Error hashing {os.path.basename(pdf_path)}: {e}")
+            return False
+
+        self.entries = [e for e in self.entries if e.get('sha256') != fingerprint['sha256']]
+        self.entries.append({
+            'file': os.path.basename(pdf_path),
+            'sha256': fingerprint['sha256'],
+            'page_hashes': [format(h, 'x') for h in fingerprint['page_hashes']],
+            'result': analysis_result,
+            'added': datetime.now().isoformat(timespec='seconds'),
+        })
+        return True
+
+
+def can_reuse(match: Optional[Dict]) -> bool:
+    """ใช้ผลเดิมได้โดยไม่วิเคราะห์ใหม่: ไฟล์เดียวกัน หรือ near match เมื่อเปิด DEDUP_NEAR_MATCH_REUSE"""
+    return bool(match) and (match['exact'] or config.DEDUP_NEAR_MATCH_REUSE)
+
+
+def _allowance_keys(result: Dict) -> List:
+    return sorted(
+        (str(a.get('category_code')), a.get('rate_percent'), a.get('fix_amount'))
+        for a in result.get('allowances', []) or []
+    )
+
+
+def diff_results(prior: Dict, current: Dict) -> List[str]:
+    """รายการที่ต่างกันระหว่างผลเดิมกับผลใหม่ (vendor / division / department / allowances)"""
+    differences = []
+    for field in ['vendor_code', 'Division_code', 'Department_code']:
+        if prior.get(field) != current.get(field):
+            differences.append(f"{field}: {prior.get(field)} → {current.get(field)}")
+    before, after = _allowance_keys(prior), _allowance_keys(current)
+    removed = [key for key in before if key not in after]
+    added = [key for key in after if key not in before]
+    for code, rate, fix in removed:
+        differences.append(f"allowance เดิม {code} (rate {rate}, fix {fix}) ไม่พบในผลใหม่")
+    for code, rate, fix in added:
+        differences.append(f"allowance ใหม่ {code} (rate {rate}, fix {fix})")
+    return differences
@@ -0,0 +1,203 @@
+"""
+Dimension tables สำหรับ normalize code ของ vendor / division / department จากไฟล์ที่รูปแบบไม่ตรงกัน
+
+- Vendor:     "M7001537", "7001537", 7001537, "0007001537" -> 7001537
+- Department: AP  DIV 02 + DEPT 40, DEPT_CODE "0240", DPTNBR 21340     -> (2, 40)
+              AR  DPTNBR "0450" (div+dept 4 หลัก), CC 21650 (รหัส 5 หลักแบบ AP DPTNBR)
+              TTA Division_code "02" + Department_code "40" หรือ "0240"
+
+แต่ละค่าที่ไม่ซ้ำจะถูกแปลงครั้งเดียวแล้วเก็บใน dict (hashed lookup) จากนั้น map กลับทั้งคอลัมน์แบบ vectorized
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tta_keys import code_to_int, encode_match_key
+
+# ค่าที่ resolve ไม่ได้
+UNKNOWN = -1
+
+# คอลัมน์ code ที่ต้องอ่านเป็นข้อความ (กันเลข 0 นำหน้าหาย เช่น "0240")
+CODE_COLUMNS = [
+    'VNDNBR', 'VndCode', 'VENDOR_ID', 'VENDOR_CODE', 'SUP_CODE',
+    'DIV', 'DIVISION', 'DIVISION_ID', 'DEPT', 'DEPARTMENT', 'DEPARTMENT_ID',
+    'DEPT_CODE', 'DPTNBR', 'CC',
+]
+
+
+def read_source_csv(filepath: str) -> pd.DataFrame:
+    """อ่าน CSV ของ AP/AR: code เป็นข้อความ ตัวเลขที่มี comma คั่นหลักพันเป็น float"""
+    return pd.read_csv(filepath, thousands=',', dtype={col: str for col in CODE_COLUMNS})
+
+
+def first_column(df: pd.DataFrame, candidates: Iterable[str]) -> Optional[str]:
+    """ชื่อคอลัมน์แรกที่มีใน df (ใช้แทนการ rename หลายชื่อเป็นชื่อเดียวซึ่งทำให้คอลัมน์ซ้ำ)"""
+    return next((col for col in candidates if col in df.columns), None)
+
+
+def _lookup(values: pd.Series, cache: Dict, resolve) -> np.ndarray:
+    """Map ค่าทั้งคอลัมน์ผ่าน cache โดยแปลงเฉพาะค่าที่ยังไม่เคยเห็น"""
+    codes, uniques = pd.factorize(values.astype(str), sort=False)
+    new = [u for u in uniques if u not in cache]
+    if new:
+        cache.update(zip(new, resolve(pd.Series(new)).tolist()))
+    mapped = np.array([cache[u] for u in uniques] + [UNKNOWN], dtype='int64')
+    return mapped[codes]
+
+
+def split_dept_code(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """แยก code แบบ div+dept 4 หลัก ("0240" -> (2, 40)) code ไม่เกิน 3 หลักเป็น dept อย่างเดียว ("150" -> (-1, 150))"""
+    series = pd.Series(values) if not isinstance(values, pd.Series) else values
+    numbers = code_to_int(series).to_numpy()
+    if pd.api.types.is_integer_dtype(series):
+        digits = series.astype(str).str.len().to_numpy()
+    else:
+        # จำนวนหลักของข้อความเดิม ("0240" = 4 หลักแม้ค่าเป็น 240)
+        digits = series.astype(str).str.replace(r'\.0$', '', regex=True).str.replace(r'\D', '', regex=True).str.len().to_numpy()
+    valid = numbers >= 0
+    combined = valid & (digits == 4)
+    plain = valid & (digits <= 3)
+    division = np.where(combined, numbers // 100, UNKNOWN)
+    department = np.where(combined, numbers % 100, np.where(plain, numbers % 1000, UNKNOWN))
+    return division, department
+
+
+class VendorDimension:
+    """ตาราง vendor: code ทุกรูปแบบ -> vendor id (int) + ชื่อ vendor"""
+
+    def __init__(self):
+        self._ids = {}
+        self.names = {}
+
+    def resolve(self, values: pd.Series) -> np.ndarray:
+        return _lookup(values, self._ids, code_to_int)
+
+    def learn_names(self, ids: np.ndarray, names: pd.Series):
+        pairs = pd.DataFrame({'id': ids, 'name': names.to_numpy()})
+        pairs = pairs[(pairs['id'] != UNKNOWN) & pairs['name'].notna()].drop_duplicates('id')
+        for vendor_id, name in zip(pairs['id'], pairs['name']):
+            self.names.setdefault(int(vendor_id), name)
+
+    def table(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            sorted(self.names.items()), columns=['vendor_id', 'vendor_name']
+        )
+
+
+class DepartmentDimension:
+    """ตาราง department: DPTNBR 5 หลัก (เรียนรู้จาก AP) -> (division, department)"""
+
+    def __init__(self):
+        self._dptnbr = {}
+
+    def learn(self, dptnbr: pd.Series, division: np.ndarray, department: np.ndarray):
+        """เก็บคู่ DPTNBR -> (div, dept) จากแถวที่มีทั้งสองอย่าง"""
+        numbers = code_to_int(dptnbr).to_numpy()
+        valid = (numbers >= 0) & (division >= 0) & (department >= 0)
+        pairs = pd.DataFrame({'n': numbers[valid], 'div': division[valid], 'dept': department[valid]})
+        for number, div, dept in pairs.drop_duplicates('n').itertuples(index=False):
+            self._dptnbr.setdefault(int(number), (int(div), int(dept)))
+
+    def resolve_dptnbr(self, values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """แปลง DPTNBR/CC 5 หลักผ่านตารางที่เรียนรู้ไว้ (ไม่พบ = -1)"""
+        numbers = code_to_int(values)
+        codes, uniques = pd.factorize(numbers, sort=False)
+        found = [self._dptnbr.get(int(n), (UNKNOWN, UNKNOWN)) for n in uniques] + [(UNKNOWN, UNKNOWN)]
+        table = np.array(found, dtype='int64')
+        return table[codes, 0], table[codes, 1]
+
+    def table(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [(n, div, dept) for n, (div, dept) in sorted(self._dptnbr.items())],
+            columns=['dptnbr', 'division', 'department']
+        )
+
+
+def _fill(target: np.ndarray, source: np.ndarray) -> np.ndarray:
+    return np.where(target == UNKNOWN, source, target)
+
+
+class CodeDimensions:
+    """รวม dimension ทั้งหมด ใช้ normalize AP / AR / TTA ให้ได้ MATCH_KEY ชุดเดียวกัน"""
+
+    VENDOR_COLUMNS = ['VndCode', 'VENDOR_ID', 'VENDOR_CODE', 'SUP_CODE', 'VNDNBR']
+    VENDOR_NAME_COLUMNS = ['VNDNAME', 'VENDOR_NAME', 'CUSTNAME']
+
+    def __init__(self):
+        self.vendors = VendorDimension()
+        self.departments = DepartmentDimension()
+
+    def _vendor_ids(self, df: pd.DataFrame) -> np.ndarray:
+        """vendor id จากคอลัมน์แรกที่มี เติมช่องว่างจากคอลัมน์ถัดไป"""
+        ids = np.full(len(df), UNKNOWN, dtype='int64')
+        for col in self.VENDOR_COLUMNS:
+            if col in df.columns:
+                ids = _fill(ids, self.vendors.resolve(df[col]))
+        name_col = first_column(df, self.VENDOR_NAME_COLUMNS)
+        if name_col:
+            self.vendors.learn_names(ids, df[name_col])
+        return ids
+
+    def normalize_ap(self, df: pd.DataFrame) -> pd.DataFrame:
+        """เพิ่ม VENDOR_ID / DIVISION_ID / DEPARTMENT_ID / MATCH_KEY ให้ AP และเรียนรู้ตาราง DPTNBR"""
+        vendor = self._vendor_ids(df)
+        division = np.full(len(df), UNKNOWN, dtype='int64')
+        department = np.full(len(df), UNKNOWN, dtype='int64')
+
+        div_col = first_column(df, ['DIV', 'DIVISION', 'DIVISION_ID'])
+        dept_col = first_column(df, ['DEPT', 'DEPARTMENT', 'DEPARTMENT_ID'])
+        if div_col and dept_col:
+            division = code_to_int(df[div_col]).to_numpy()
+            department = code_to_int(df[dept_col]).to_numpy()
+        if 'DEPT_CODE' in df.columns:
+            code_div, code_dept = split_dept_code(df['DEPT_CODE'])
+            division, department = _fill(division, code_div), _fill(department, code_dept)
+        if 'DPTNBR' in df.columns:
+            self.departments.learn(df['DPTNBR'], division, department)
+            map_div, map_dept = self.departments.resolve_dptnbr(df['DPTNBR'])
+            division, department = _fill(division, map_div), _fill(department, map_dept)
+
+        return self._with_keys(df, vendor, division, department)
+
+    def normalize_ar(self, df: pd.DataFrame) -> pd.DataFrame:
+        """AR ไม่มีคอลัมน์ division: ใช้ DPTNBR 4 หลัก (div+dept) แล้วเติมจาก CC ผ่านตาราง DPTNBR ของ AP"""
+        vendor = self._vendor_ids(df)
+        division = np.full(len(df), UNKNOWN, dtype='int64')
+        department = np.full(len(df), UNKNOWN, dtype='int64')
+
+        div_col = first_column(df, ['DIV', 'DIVISION', 'DIVISION_ID'])
+        dept_col = first_column(df, ['DEPT', 'DEPARTMENT', 'DEPARTMENT_ID'])
+        if div_col and dept_col:
+            division = code_to_int(df[div_col]).to_numpy()
+            department = code_to_int(df[dept_col]).to_numpy()
+        for col in ('DEPT_CODE', 'DPTNBR'):
+            if col in df.columns:
+                code_div, code_dept = split_dept_code(df[col])
+                division, department = _fill(division, code_div), _fill(department, code_dept)
+        if 'CC' in df.columns:
+            map_div, map_dept = self.departments.resolve_dptnbr(df['CC'])
+            division, department = _fill(division, map_div), _fill(department, map_dept)
+
+        return self._with_keys(df, vendor, division, department)
+
+    def tta_keys(self, vendor_codes: pd.Series, division_codes: pd.Series,
+                 department_codes: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(match_key, division, department) ของแถว TTA (Department_code อาจเป็น "40" หรือ "0240")"""
+        vendor = self.vendors.resolve(vendor_codes)
+        division = code_to_int(division_codes).to_numpy()
+        code_div, department = split_dept_code(department_codes)
+        division = _fill(division, code_div)
+        keys = encode_match_key(vendor, division, department).to_numpy()
+        return keys, division, department
+
+    def _with_keys(self, df: pd.DataFrame, vendor, division, department) -> pd.DataFrame:
+        df = df.copy()
+        name_col = first_column(df, self.VENDOR_NAME_COLUMNS)
+        df['VENDOR_NAME'] = df[name_col] if name_col else pd.Series(vendor).map(self.vendors.names).to_numpy()
+        df['VENDOR_ID'] = vendor
+        df['DIVISION_ID'] = division
+        df['DEPARTMENT_ID'] = department
+        df['MATCH_KEY'] = encode_match_key(vendor, division, department).to_numpy()
+        return df
@@ -0,0 +1,90 @@
+"""
+Drill-down จากแถว reconciliation ไปยังรายการ AR / AP ที่อยู่เบื้องหลังตัวเลข
+
+ตอนสร้าง index จะเรียงรายการตาม (match key, category, วันที่) ครั้งเดียว แล้วเก็บช่วงแถว (start, end)
+ของแต่ละกลุ่มไว้ใน dict การเปิดดูแถวหนึ่งจึงเป็นการ slice ตารางที่เรียงไว้ ไม่ต้อง filter ทั้งตาราง
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+import config
+from tta_dimensions import first_column
+from tta_periods import AP_DATE_COLUMNS, AP_YEAR_COLUMNS, AR_DATE_COLUMNS, parse_dates
+
+AR_DETAIL_COLUMNS = [
+    'TRXNBR', 'TRXDT', 'REFERENCE', 'REF_TYPE', 'CATEGORY_CODE', 'CATEGORY_SOURCE',
+    'DESCRIPTION', 'DESC2', 'CC', 'DPTNBR', 'EXTENDED_AMOUNT',
+]
+AP_DETAIL_COLUMNS = [
+    'INV_DATE', 'INV_YEAR', 'VNDNBR', 'VNDNAME', 'VNDTYPE', 'DPTNBR', 'DEPT_CODE',
+    'INV_AMOUNT', 'INVPAYAMT', 'EXTENDED_AMOUNT',
+]
+
+
+class DrillDownIndex:
+    """รายการที่เรียงตามกลุ่ม + offset ของแต่ละกลุ่ม: key (tuple ของ group_columns) -> (start, end)"""
+
+    def __init__(self, transactions: pd.DataFrame, group_columns, order: pd.Series = None, columns=None):
+        self.group_columns = list(group_columns)
+        columns = [col for col in (columns or transactions.columns) if col in transactions.columns]
+
+        sorter = pd.DataFrame({
+            col: transactions[col].to_numpy() for col in self.group_columns
+        })
+        if order is not None:
+            sorter['_order'] = np.asarray(order)
+        positions = sorter.sort_values(list(sorter.columns), kind='stable').index.to_numpy()
+
+        self.rows = transactions[columns].iloc[positions].reset_index(drop=True)
+        grouped = sorter.iloc[positions].reset_index(drop=True)[self.group_columns]
+
+        group_ids = grouped.groupby(self.group_columns, sort=False, dropna=False).ngroup().to_numpy()
+        starts = np.flatnonzero(np.diff(group_ids, prepend=-1))
+        ends = np.append(starts[1:], len(group_ids))
+        keys = grouped.iloc[starts].itertuples(index=False, name=None)
+        self.offsets: Dict[Tuple, Tuple[int, int]] = {
+            self._key(key): (int(start), int(end)) for key, start, end in zip(keys, starts, ends)
+        }
+
+    @staticmethod
+    def _key(values) -> Tuple:
+        # np.int64 กับ int hash เท่ากัน แต่แปลงให้เป็นชนิดเดียวกันไว้ก่อน
+        return tuple(int(v) if isinstance(v, (int, np.integer)) else str(v) for v in values)
+
+    def count(self, *key) -> int:
+        start, end = self.offsets.get(self._key(key), (0, 0))
+        return end - start
+
+    def pages(self, *key, page_size: int = None) -> int:
+        page_size = page_size or config.DRILLDOWN_PAGE_SIZE
+        return max(1, -(-self.count(*key) // page_size))
+
+    def lookup(self, *key, page: int = 0, page_size: int = None) -> pd.DataFrame:
+        """รายการของกลุ่ม (หน้าที่ page เริ่ม 0)"""
+        page_size = page_size or config.DRILLDOWN_PAGE_SIZE
+        start, end = self.offsets.get(self._key(key), (0, 0))
+        first = min(start + page * page_size, end)
+        return self.rows.iloc[first:min(first + page_size, end)]
+
+    def total(self, *key, column: str = 'EXTENDED_AMOUNT') -> float:
+        start, end = self.offsets.get(self._key(key), (0, 0))
+        return float(self.rows[column].iloc[start:end].sum())
+
+
+def build_drilldown(ap: pd.DataFrame = None, ar: pd.DataFrame = None) -> Dict[str, DrillDownIndex]:
+    """index ของ AR ตาม (MATCH_KEY, CATEGORY_CODE) และ AP ตาม MATCH_KEY เรียงตามวันที่"""
+    indexes = {}
+    if ar is not None:
+        date_col = first_column(ar, AR_DATE_COLUMNS)
+        order = parse_dates(ar[date_col]) if date_col else None
+        indexes['ar'] = DrillDownIndex(ar, ['MATCH_KEY', 'CATEGORY_CODE'], order, AR_DETAIL_COLUMNS)
+    if ap is not None:
+        date_col = first_column(ap, AP_DATE_COLUMNS) or first_column(ap, AP_YEAR_COLUMNS)
+        order = parse_dates(ap[date_col]) if date_col in AP_DATE_COLUMNS else (
+            pd.to_numeric(ap[date_col], errors='coerce') if date_col else None
+        )
+        indexes['ap'] = DrillDownIndex(ap, ['MATCH_KEY'], order, AP_DETAIL_COLUMNS)
+    return indexes
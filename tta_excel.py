@@ -0,0 +1,131 @@
+"""
+เขียนรายงาน Excel แบบ streaming (openpyxl write-only) หน่วยความจำคงที่ไม่ขึ้นกับจำนวนแถว
+
+- แปลง DataFrame ทีละช่วง (EXCEL_CHUNK_ROWS แถว) แล้วส่งทีละแถวลง XML ของ sheet โดยตรง
+  แทน pd.ExcelWriter ที่สร้าง cell object ของทั้ง workbook ไว้ในหน่วยความจำก่อนบันทึก
+- รูปแบบตัวเลข (เงิน / %) และสีของสถานะใช้ความสามารถของ Excel เอง (number format + conditional formatting)
+  ค่าใน cell ยังเป็นตัวเลข/ข้อความดิบ ไม่ต้องจัดรูปแบบใน pandas
+- ตารางที่เกินจำนวนแถวสูงสุดของ Excel ถูกแบ่งเป็น sheet ต่อเนื่อง "<ชื่อ>_2", "<ชื่อ>_3", ...
+"""
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+import config
+
+# แถวข้อมูลสูงสุดต่อ sheet (Excel รองรับ 1,048,576 แถวรวม header)
+EXCEL_MAX_ROWS = 1_048_575
+
+CURRENCY_FORMAT = '#,##0.00'
+PERCENT_FORMAT = '0.00"%"'
+
+# คอลัมน์ที่เป็นจำนวนเงิน / เปอร์เซ็นต์ (ค่า 2.5 = 2.5%)
+CURRENCY_COLUMNS = [
+    'fix_amount', 'total_purchase', 'should_collect', 'actually_collected', 'difference',
+    'purchase', 'expected', 'collected', 'cumulative_difference'
+]
+PERCENT_COLUMNS = ['rate_percent', 'applied_rate', 'variance_pct']
+
+# สถานะ -> (สีตัวอักษร, สีพื้น)
+STATUS_STYLES = {
+    config.STATUS_COMPLETE: (config.COLOR_SUCCESS, 'E8F5E9'),
+    config.STATUS_OVER: (config.COLOR_WARNING, 'FFF3E0'),
+    config.STATUS_UNDER: (config.COLOR_DANGER, 'FFEBEE'),
+}
+
+HEADER_FONT = Font(bold=True, color='FFFFFF')
+HEADER_FILL = PatternFill('solid', fgColor=config.COLOR_PRIMARY.lstrip('#'))
+
+
+def sheet_parts(name: str, rows: int) -> List[str]:
+    """ชื่อ sheet ของตารางที่มี rows แถว (แบ่งเป็น sheet ต่อเนื่องถ้าเกิน EXCEL_MAX_ROWS)"""
+    parts = max(1, -(-rows // EXCEL_MAX_ROWS))
+    return [name] + [f"{name}_{part}"[:31] for part in range(2, parts + 1)]
+
+
+def _column_values(series: pd.Series) -> list:
+    """ค่าของคอลัมน์เป็น Python object (ค่าว่าง/NaN = None เพื่อให้เป็น cell ว่าง, ±inf = ข้อความ 'inf' / '-inf')"""
+    values = series.astype(object).where(series.notna(), None)
+    if pd.api.types.is_float_dtype(series.dtype):
+        # Excel ไม่มีค่า inf (openpyxl เขียนเป็น cell เสีย) ใช้ข้อความแบบ inf_rep='inf' ของ to_excel เดิม
+        infinite = np.isinf(series.to_numpy(dtype='float64', na_value=np.nan))
+        if infinite.any():
+            values = values.mask(infinite, np.where(series > 0, 'inf', '-inf'))
+    return values.tolist()
+
+
+def _write_sheet(wb: Workbook, name: str, df: pd.DataFrame, chunk_rows: int):
+    columns = [str(col) for col in df.columns]
+    formats = {
+        col: CURRENCY_FORMAT if col in CURRENCY_COLUMNS else PERCENT_FORMAT
+        for col in columns if col in CURRENCY_COLUMNS or col in PERCENT_COLUMNS
+    }
+
+    for part, sheet_name in enumerate(sheet_parts(name, len(df))):
+        block = df.iloc[part * EXCEL_MAX_ROWS:(part + 1) * EXCEL_MAX_ROWS]
+        ws = wb.create_sheet(sheet_name)
+        last_row = len(block) + 1
+        last_col = get_column_letter(max(1, len(columns)))
+
+        # ตั้งค่าที่ต้องประกาศก่อนเขียนแถว (write-only ส่ง XML ทีละส่วน)
+        ws.freeze_panes = 'A2'
+        for idx, col in enumerate(columns, 1):
+            ws.column_dimensions[get_column_letter(idx)].width = max(12, min(40, len(col) + 4))
+        if columns:
+            ws.auto_filter.ref = f"A1:{last_col}{last_row}"
+        if 'status' in columns:
+            status_col = get_column_letter(columns.index('status') + 1)
+            status_range = f"{status_col}2:{status_col}{max(2, last_row)}"
+            for status, (color, fill) in STATUS_STYLES.items():
+                ws.conditional_formatting.add(status_range, CellIsRule(
+                    operator='equal', formula=[f'"{status}"'],
+                    font=Font(bold=True, color=color.lstrip('#')),
+                    fill=PatternFill('solid', fgColor=fill, bgColor=fill)
+                ))
+
+        header = []
+        for col in columns:
+            cell = WriteOnlyCell(ws, value=col)
+            cell.font = HEADER_FONT
+            cell.fill = HEADER_FILL
+            cell.alignment = Alignment(horizontal='center')
+            header.append(cell)
+        ws.append(header)
+
+        # cell ต้นแบบต่อคอลัมน์ที่มี number format: แถวถูกเขียนลง stream ทันทีจึงใช้ cell เดิมซ้ำได้
+        templates = []
+        for col in columns:
+            template = None
+            if col in formats:
+                template = WriteOnlyCell(ws)
+                template.number_format = formats[col]
+            templates.append(template)
+
+        for start in range(0, len(block), chunk_rows):
+            chunk = block.iloc[start:start + chunk_rows]
+            values = [_column_values(chunk.iloc[:, idx]) for idx in range(len(columns))]
+            for row in zip(*values):
+                cells = []
+                for value, template in zip(row, templates):
+                    if template is not None and value is not None:
+                        template.value = value
+                        value = template
+                    cells.append(value)
+                ws.append(cells)
+
+
+def write_workbook(sheets: Dict[str, pd.DataFrame], target, chunk_rows: int = None):
+    """เขียน workbook จาก ชื่อ sheet -> DataFrame ลง target (path หรือ file-like) แบบ streaming"""
+    chunk_rows = chunk_rows or config.EXCEL_CHUNK_ROWS
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        if df is not None:
+            _write_sheet(wb, name, df, chunk_rows)
+    wb.save(target)
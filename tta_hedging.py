@@ -0,0 +1,126 @@
+"""
+Hedged requests สำหรับลด tail latency ของการวิเคราะห์เอกสาร
+ถ้า attempt แรกใช้เวลานานเกิน percentile ของ latency ที่ผ่านมา จะยิง attempt ซ้ำ
+แล้วใช้คำตอบที่ได้ก่อน ส่วน attempt ที่แพ้จะถูกสั่งยกเลิก (จำนวน hedge จำกัดด้วย budget)
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+
+class HedgeCancelled(Exception):
+    """attempt ถูกยกเลิกเพราะอีก attempt ได้คำตอบแล้ว"""
+
+
+class LatencyTracker:
+    """เก็บ latency ล่าสุดแบบ sliding window และคำนวณ percentile"""
+
+    def __init__(self, window: int = 50, min_samples: int = 3):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """คืน percentile ของ latency (None ถ้าข้อมูลยังไม่พอ)"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """จำกัดจำนวน hedge เป็นสัดส่วนของ request หลัก (+ burst เล็กน้อย)"""
+
+    def __init__(self, ratio: float, burst: int = 1):
+        self.ratio = ratio
+        self.burst = burst
+        self.primary = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def record_primary(self):
+        with self._lock:
+            self.primary += 1
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 <= self.ratio * self.primary + self.burst:
+                self.hedged += 1
+                return True
+            return False
+
+    def record_hedge_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'primary': self.primary, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins}
+
+
+def run_hedged(attempt: Callable, delay: Optional[float], budget: HedgeBudget):
+    """รัน attempt(cancel_event) แบบ hedged
+
+    Args:
+        attempt: function ที่รับ threading.Event และคืนผลลัพธ์ (None = ไม่สำเร็จ)
+                 ต้องตรวจ event เป็นระยะ และ cleanup ทรัพยากรของตัวเองเมื่อถูกยกเลิก
+        delay: เวลาที่รอก่อนยิง hedge (None = ไม่ hedge)
+        budget: HedgeBudget ที่ใช้ร่วมกัน
+
+    Returns:
+        ผลลัพธ์แรกที่ใช้ได้ หรือ None ถ้าทุก attempt ล้มเหลว
+    """
+    budget.record_primary()
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tta-hedge")
+    events = {}
+
+    def submit():
+        event = threading.Event()
+        future = executor.submit(attempt, event)
+        events[future] = event
+        return future
+
+    try:
+        primary = submit()
+        pending = {primary}
+        done, pending = wait(pending, timeout=delay)
+
+        if pending and delay is not None and budget.try_spend():
+            print(f"   ⏱️ เกิน {delay:.1f} วินาที - ส่ง hedge request")
+            pending.add(submit())
+
+        error = None
+        while True:
+            for future in done:
+                try:
+                    result = future.result()
+                except HedgeCancelled:
+                    continue
+                except Exception as e:
+                    error = e
+                    continue
+                if result is not None:
+                    if future is not primary:
+                        budget.record_hedge_win()
+                    return result
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+        if error is not None:
+            raise error
+        return None
+    finally:
+        # ยกเลิก attempt ที่ยังทำงานอยู่ (attempt จะลบไฟล์ที่ upload ไว้เอง)
+        for event in events.values():
+            event.set()
+        executor.shutdown(wait=False)
@@ -0,0 +1,171 @@
+"""
+Parser แบบทนทาน (tolerant) สำหรับ JSON ที่ได้จาก Gemini
+รองรับข้อความที่มี ```json fence, ข้อความแปลกปลอมก่อน/หลัง JSON,
+trailing comma และ response ที่ถูกตัดกลางคัน (เช่น stream ขาด)
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+
+# จำนวนตำแหน่งตัดสูงสุดที่จะลอง parse ย้อนหลังเมื่อ JSON ไม่สมบูรณ์
+MAX_REPAIR_ATTEMPTS = 200
+
+
+def _scan(text: str) -> Tuple[str, List[Tuple[int, str]], bool, Optional[str]]:
+    """สแกน JSON ตั้งแต่ '{' ตัวแรก
+
+    Returns:
+        (ข้อความที่ทำความสะอาดแล้ว, จุดตัดที่ปลอดภัย, สมบูรณ์หรือไม่, ฟิลด์ระดับบนสุดที่ค่ายังเปิดค้างอยู่)
+        จุดตัดแต่ละจุดเก็บ (ตำแหน่ง, วงเล็บที่ต้องปิด) เพื่อใช้ประกอบ JSON ที่ถูกตัดให้ parse ได้
+    """
+    start = text.find('{')
+    if start < 0:
+        return '', [], False, None
+
+    out = []
+    cuts = []
+    stack = []
+    in_string = False
+    escape = False
+    expect_key = False
+    key_start = None
+    current_key = None
+
+    for ch in text[start:]:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if key_start is not None:
+                    current_key = ''.join(out[key_start:-1])
+                    key_start = None
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+            if expect_key and len(stack) == 1:
+                key_start = len(out)
+            expect_key = False
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            out.append(ch)
+            expect_key = len(stack) == 1
+            cuts.append((len(out), ''.join(reversed(stack))))
+        elif ch in '}]':
+            # ตัด trailing comma ก่อนปิดวงเล็บ
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                # จบ object หลักแล้ว ไม่สนข้อความที่ตามมา
+                return ''.join(out), cuts, True, None
+            cuts.append((len(out), ''.join(reversed(stack))))
+        elif ch == ',':
+            cuts.append((len(out), ''.join(reversed(stack))))
+            out.append(ch)
+            expect_key = len(stack) == 1
+        else:
+            out.append(ch)
+
+    open_field = current_key if len(stack) >= 2 else None
+    return ''.join(out), cuts, False, open_field
+
+
+def repair_json(text: str) -> Tuple[Optional[Dict], bool, Optional[str]]:
+    """แปลงข้อความเป็น dict ให้ได้มากที่สุด
+
+    Returns:
+        (result, complete, truncated_field)
+        complete เป็น False ถ้าต้องตัดข้อมูลส่วนท้ายทิ้งเพื่อให้ parse ได้
+        truncated_field คือฟิลด์ระดับบนสุดที่ถูกตัดกลางคัน (ถ้ามี)
+    """
+    if not text:
+        return None, False, None
+
+    cleaned, cuts, complete, open_field = _scan(text)
+    if not cleaned:
+        return None, False, None
+
+    if complete:
+        try:
+            return json.loads(cleaned, strict=False), True, None
+        except json.JSONDecodeError:
+            pass
+
+    # ลองตัดย้อนหลังทีละจุดจนกว่าจะ parse ได้
+    for pos, closers in reversed(cuts[-MAX_REPAIR_ATTEMPTS:]):
+        candidate = cleaned[:pos].rstrip().rstrip(',') + closers
+        try:
+            result = json.loads(candidate, strict=False)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(result, dict):
+            return result, False, open_field
+
+    return None, False, None
+
+
+class TolerantJSONParser:
+    """สะสมข้อความจาก streaming response แล้ว parse แบบทนทาน"""
+
+    def __init__(self):
+        self._chunks = []
+        self.interrupted = False
+        self.truncated_field = None
+
+    def feed(self, chunk: str):
+        """เพิ่ม chunk ของข้อความ"""
+        if chunk:
+            self._chunks.append(chunk)
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._chunks)
+
+    def result(self) -> Tuple[Optional[Dict], bool]:
+        """คืนค่า (dict ที่กู้ได้, สมบูรณ์หรือไม่) และเก็บฟิลด์ที่ถูกตัดไว้ใน truncated_field"""
+        result, complete, self.truncated_field = repair_json(self.text)
+        return result, complete
+
+
+def find_missing_fields(result: Optional[Dict], schema: Dict, truncated_field: str = None) -> List[str]:
+    """หาฟิลด์ระดับบนสุดที่ยังขาดหรือว่างตาม schema
+
+    ฟิลด์ที่ถูกตัดกลางคัน (truncated_field) อาจมีข้อมูลไม่ครบ จึงนับว่าขาดด้วย
+    """
+    properties = schema.get('properties', {})
+    required = schema.get('required', list(properties))
+
+    if not result:
+        return list(required)
+
+    missing = []
+    for field in required:
+        value = result.get(field)
+        if value is None or value == '' or value == []:
+            missing.append(field)
+
+    if truncated_field in properties and truncated_field not in missing:
+        missing.append(truncated_field)
+
+    return missing
+
+
+def sub_schema(schema: Dict, fields: List[str]) -> Dict:
+    """สร้าง schema ที่มีเฉพาะฟิลด์ที่ระบุ (ใช้ขอข้อมูลเพิ่มเฉพาะส่วนที่ขาด)"""
+    properties = schema.get('properties', {})
+    return {
+        'type': 'object',
+        'properties': {field: properties[field] for field in fields if field in properties},
+        'required': [field for field in fields if field in properties],
+    }
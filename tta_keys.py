@@ -0,0 +1,68 @@
+"""
+Match key แบบ int64 สำหรับจับคู่ TTA / AP / AR ตาม vendor + division + department
+แทนการต่อ string "vendor_div_dept" ทุกแถว (join/filter เป็นการเทียบตัวเลข)
+
+รูปแบบ: vendor * 10^5 + division * 10^3 + department
+"""
+
+import numpy as np
+import pandas as pd
+
+DIVISION_SLOTS = 100        # division 2 หลัก
+DEPARTMENT_SLOTS = 1000     # department 3 หลัก
+VENDOR_FACTOR = DIVISION_SLOTS * DEPARTMENT_SLOTS
+
+# key ของแถวที่ code ไม่ถูกต้อง (ไม่ match กับอะไรเลย)
+INVALID_KEY = -1
+
+
+def code_to_int(values) -> pd.Series:
+    """แปลง code (เช่น "0240", "M7001537", 40) เป็นตัวเลข ใช้เฉพาะตัวเลขในข้อความ (ไม่ได้ = -1)"""
+    series = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_integer_dtype(series):
+        return series.astype('int64')
+    digits = series.astype(str).str.replace(r'\.0$', '', regex=True).str.replace(r'\D', '', regex=True)
+    return pd.to_numeric(digits, errors='coerce').fillna(-1).astype('int64')
+
+
+def encode_match_key(vendor, division, department) -> pd.Series:
+    """รวม vendor / division / department เป็น int64 key (แบบ vectorized)"""
+    vendor = code_to_int(vendor).to_numpy()
+    division = code_to_int(division).to_numpy()
+    department = code_to_int(department).to_numpy()
+
+    keys = vendor * VENDOR_FACTOR + division * DEPARTMENT_SLOTS + department
+    valid = (
+        (vendor >= 0)
+        & (division >= 0) & (division < DIVISION_SLOTS)
+        & (department >= 0) & (department < DEPARTMENT_SLOTS)
+    )
+    return pd.Series(np.where(valid, keys, INVALID_KEY), dtype='int64')
+
+
+def decode_match_key(keys) -> pd.DataFrame:
+    """แยก key กลับเป็น vendor / division / department"""
+    keys = np.asarray(keys, dtype='int64')
+    return pd.DataFrame({
+        'vendor': keys // VENDOR_FACTOR,
+        'division': keys // DEPARTMENT_SLOTS % DIVISION_SLOTS,
+        'department': keys % DEPARTMENT_SLOTS,
+    })
+
+
+def render_match_key(keys) -> pd.Series:
+    """แปลง key เป็นข้อความ "vendor_dd_ddd" สำหรับแสดงผล/export เท่านั้น"""
+    parts = decode_match_key(keys)
+    rendered = (
+        parts['vendor'].astype(str) + '_' +
+        parts['division'].astype(str).str.zfill(2) + '_' +
+        parts['department'].astype(str).str.zfill(3)
+    )
+    rendered[np.asarray(keys) == INVALID_KEY] = ''
+    return rendered
+
+
+def parse_match_key(rendered) -> pd.Series:
+    """แปลงข้อความ "vendor_dd_ddd" (จาก render_match_key) กลับเป็น int64 key"""
+    parts = pd.Series(rendered).fillna('').astype(str).str.split('_', expand=True).reindex(columns=range(3))
+    return encode_match_key(parts[0], parts[1], parts[2])
@@ -0,0 +1,148 @@
+"""
+แบ่งยอด AP / AR ตามงวด (รายเดือน / รายไตรมาส / รายปี) ตาม payment_terms ของ allowance
+ใช้กับ TTAReconciliationSystem.reconcile_by_period
+
+- AP ที่มีเฉพาะ INV_YEAR จะถูกเฉลี่ยเท่ากันทุกเดือนของปี (ถ้ามีคอลัมน์วันที่/เดือนจะใช้ค่าจริง)
+- AR ใช้วันที่ TRXDT (วันที่เรียกเก็บจริง) ถ้าไม่มีใช้ Year
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from tta_dimensions import first_column
+
+# ความถี่ของงวด -> จำนวนงวดต่อปี
+PERIODS_PER_YEAR = {'M': 12, 'Q': 4, 'Y': 1}
+
+AP_DATE_COLUMNS = ['INV_DATE', 'INVDT', 'TRXDT', 'DATE']
+AP_MONTH_COLUMNS = ['INV_MONTH', 'MONTH']
+AP_YEAR_COLUMNS = ['INV_YEAR', 'YEAR', 'Year']
+AR_DATE_COLUMNS = ['TRXDT', 'TRX_DATE', 'DATE']
+AR_YEAR_COLUMNS = ['Year', 'YEAR', 'INV_YEAR']
+
+# ตรวจรายปี / รายไตรมาสก่อนรายเดือน ("every 12 months", "quarterly (3 months)" มีคำว่า month)
+_ANNUAL = re.compile(r'annual|yearly|\b12\s*months?\b|รายปี|ปีละ|ทุกปี|12 เดือน|สิบสองเดือน')
+_QUARTERLY = re.compile(r'quarter|\b3\s*months?\b|ไตรมาส|3 เดือน|สามเดือน')
+_MONTHLY = re.compile(r'monthly|\bevery\s+month\b|\bper\s+month\b|\b1\s*month\b|รายเดือน|ทุกเดือน|เดือนละ')
+
+
+def _frequency_of(text: str) -> str:
+    if _ANNUAL.search(text):
+        return 'Y'
+    if _QUARTERLY.search(text):
+        return 'Q'
+    if _MONTHLY.search(text):
+        return 'M'
+    return 'Y'
+
+
+def payment_frequency(payment_terms: pd.Series) -> pd.Series:
+    """แปลง payment_terms (ข้อความอิสระ) เป็น 'M' / 'Q' / 'Y' (ไม่ระบุ = รายปี)"""
+    codes, uniques = pd.factorize(payment_terms.fillna('').astype(str).str.lower(), sort=False)
+    mapped = np.array([_frequency_of(text) for text in uniques] + ['Y'], dtype=object)
+    return pd.Series(mapped[codes], index=payment_terms.index)
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """อ่านวันที่รูปแบบ 11-Jan-24 ก่อน แล้วค่อยลองรูปแบบอื่น (day first)"""
+    dates = pd.to_datetime(values, format='%d-%b-%y', errors='coerce')
+    missing = dates.isna() & values.notna()
+    if missing.any():
+        dates[missing] = pd.to_datetime(values[missing], errors='coerce', dayfirst=True)
+    return dates
+
+
+def _year_start(years: pd.Series) -> pd.Series:
+    years = pd.to_numeric(years, errors='coerce')
+    return pd.to_datetime(years.astype('Int64').astype(str) + '-01-01', errors='coerce')
+
+
+def ap_monthly(ap: pd.DataFrame) -> pd.DataFrame:
+    """ยอดซื้อรายเดือน: MATCH_KEY, month (Timestamp ต้นเดือน), amount"""
+    date_col = first_column(ap, AP_DATE_COLUMNS)
+    month_col = first_column(ap, AP_MONTH_COLUMNS)
+    year_col = first_column(ap, AP_YEAR_COLUMNS)
+
+    if date_col:
+        months = parse_dates(ap[date_col]).dt.to_period('M').dt.to_timestamp()
+        return pd.DataFrame({
+            'MATCH_KEY': ap['MATCH_KEY'].to_numpy(),
+            'month': months.to_numpy(),
+            'amount': ap['EXTENDED_AMOUNT'].to_numpy(),
+        }).dropna(subset=['month'])
+
+    if year_col and month_col:
+        years = pd.to_numeric(ap[year_col], errors='coerce')
+        months = pd.to_numeric(ap[month_col], errors='coerce')
+        month_start = pd.to_datetime(
+            pd.DataFrame({'year': years, 'month': months, 'day': 1}), errors='coerce'
+        )
+        return pd.DataFrame({
+            'MATCH_KEY': ap['MATCH_KEY'].to_numpy(),
+            'month': month_start.to_numpy(),
+            'amount': ap['EXTENDED_AMOUNT'].to_numpy(),
+        }).dropna(subset=['month'])
+
+    if year_col:
+        # มีแค่ปี: กระจายเท่ากัน 12 เดือน (np.repeat แทนการวน loop)
+        starts = _year_start(ap[year_col]).to_numpy()
+        valid = ~pd.isna(starts)
+        repeated_starts = np.repeat(starts[valid], 12)
+        offsets = np.tile(np.arange(12), int(valid.sum()))
+        months = pd.DatetimeIndex(repeated_starts).to_period('M') + offsets
+        return pd.DataFrame({
+            'MATCH_KEY': np.repeat(ap['MATCH_KEY'].to_numpy()[valid], 12),
+            'month': months.to_timestamp(),
+            'amount': np.repeat(ap['EXTENDED_AMOUNT'].to_numpy()[valid] / 12, 12),
+        })
+
+    # ไม่มีคอลัมน์วันที่/เดือน/ปี: ตารางว่างที่ชนิดคอลัมน์เหมือนกรณีปกติ (month ต้องเป็น datetime ให้ .dt ใช้ได้)
+    return pd.DataFrame({
+        'MATCH_KEY': ap['MATCH_KEY'].iloc[:0].to_numpy(),
+        'month': pd.Series(dtype='datetime64[ns]'),
+        'amount': pd.Series(dtype='float64'),
+    })
+
+
+def ar_dated(ar: pd.DataFrame) -> pd.DataFrame:
+    """ยอดเรียกเก็บพร้อมวันที่: MATCH_KEY, CATEGORY_CODE, date, amount"""
+    date_col = first_column(ar, AR_DATE_COLUMNS)
+    year_col = first_column(ar, AR_YEAR_COLUMNS)
+
+    dates = parse_dates(ar[date_col]) if date_col else pd.Series(pd.NaT, index=ar.index)
+    if year_col:
+        dates = dates.fillna(_year_start(ar[year_col]))
+
+    return pd.DataFrame({
+        'MATCH_KEY': ar['MATCH_KEY'].to_numpy(),
+        'CATEGORY_CODE': ar['CATEGORY_CODE'].to_numpy(),
+        'date': dates.to_numpy(),
+        'amount': ar['EXTENDED_AMOUNT'].to_numpy(),
+    }).dropna(subset=['date'])
+
+
+def agreement_periods(purchases: pd.DataFrame, frequency: str) -> pd.DataFrame:
+    """ทุกงวดของทุกปีที่ MATCH_KEY มียอดซื้อ (รวมงวดที่ไม่มียอดซื้อ): match_key, period, years"""
+    years = (
+        pd.DataFrame({'match_key': purchases['MATCH_KEY'].to_numpy(),
+                      'year': pd.to_datetime(purchases['month']).dt.year.to_numpy()})
+        .drop_duplicates()
+    )
+    if years.empty:
+        return pd.DataFrame(columns=['match_key', 'period', 'years'])
+    # 12 เดือนของแต่ละปี แล้วแปลงเป็นงวดตามความถี่
+    starts = pd.to_datetime(years['year'].astype(str) + '-01-01').to_numpy()
+    months = pd.DatetimeIndex(np.repeat(starts, 12)).to_period('M') + np.tile(np.arange(12), len(years))
+    periods = pd.DataFrame({
+        'match_key': np.repeat(years['match_key'].to_numpy(), 12),
+        'period': to_period(pd.Series(months.to_timestamp()), frequency).to_numpy(),
+    }).drop_duplicates()
+    counts = years.groupby('match_key').size().rename('years')
+    return periods.merge(counts, left_on='match_key', right_index=True)
+
+
+def to_period(dates: pd.Series, frequency: str) -> pd.Series:
+    """Timestamp -> ชื่องวด เช่น '2023-01', '2023Q1', '2023'"""
+    return dates.dt.to_period(frequency).astype(str)
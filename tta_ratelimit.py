@@ -0,0 +1,249 @@
+"""
+Rate limiter ฝั่ง client สำหรับ Gemini API
+- Token bucket คุมจำนวน request ต่อนาที
+- AIMD คุมจำนวน request ที่ทำงานพร้อมกัน (เพิ่มทีละน้อยเมื่อสำเร็จ ลดครึ่งเมื่อโดน quota/overload)
+- Retry ด้วย exponential backoff แบบ jitter
+ใช้ร่วมกันได้ทุก TTADocumentAnalyzer ใน process เดียว ทั้งแบบ thread และ asyncio
+"""
+
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+import config
+
+
+# Error ที่หมายถึงโดน quota / rate limit
+QUOTA_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+
+# Error ที่หมายถึง server overload หรือชั่วคราว
+OVERLOAD_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.GatewayTimeout,
+)
+
+_RETRY_DELAY_PATTERN = re.compile(r'retry_delay\s*\{\s*seconds:\s*(\d+)')
+
+
+def is_quota_error(error: Exception) -> bool:
+    return isinstance(error, QUOTA_ERRORS) or getattr(error, 'code', None) == 429
+
+
+def is_overload_error(error: Exception) -> bool:
+    return isinstance(error, OVERLOAD_ERRORS) or getattr(error, 'code', None) in (500, 503, 504)
+
+
+def suggested_retry_delay(error: Exception) -> Optional[float]:
+    """อ่าน retry_delay ที่ server แนะนำ (ถ้ามี) จากข้อความ error"""
+    match = _RETRY_DELAY_PATTERN.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+class TokenBucket:
+    """Token bucket สำหรับคุมอัตรา request ต่อนาที (ปรับอัตราได้ระหว่างทำงาน)"""
+
+    def __init__(self, rate_per_minute: float, burst: int = None):
+        self.max_rate = rate_per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = float(burst if burst is not None else max(1, int(rate_per_minute // 6)))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """ลองหยิบ token คืนค่า 0 ถ้าได้ ไม่เช่นนั้นคืนเวลาที่ต้องรอ (วินาที)"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds: float, now: float):
+        """หยุดแจก token ชั่วคราว (เช่นเมื่อ server บอก retry_delay)"""
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = now
+
+
+class AIMDLimiter:
+    """คุมจำนวน request พร้อมกันแบบ Additive-Increase / Multiplicative-Decrease"""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease_factor: float = 0.5):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease_factor = decrease_factor
+        self.limit = float(max_limit)
+        self.in_flight = 0
+
+    def try_enter(self) -> bool:
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def leave(self):
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def on_success(self):
+        # เพิ่มประมาณ +1 ต่อ 1 รอบของ limit
+        self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def on_overload(self):
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+class GeminiRateLimiter:
+    """Limiter ที่รวม token bucket + AIMD + retry ใช้ได้ทั้ง thread และ asyncio"""
+
+    def __init__(self, requests_per_minute: float = None, max_concurrency: int = None,
+                 max_retries: int = None, backoff_base: float = None, backoff_max: float = None):
+        rpm = config.GEMINI_REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute
+        self.bucket = TokenBucket(rpm)
+        self.concurrency = AIMDLimiter(config.GEMINI_MAX_CONCURRENCY if max_concurrency is None else max_concurrency)
+        self.max_retries = config.GEMINI_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base = config.GEMINI_BACKOFF_BASE if backoff_base is None else backoff_base
+        self.backoff_max = config.GEMINI_BACKOFF_MAX if backoff_max is None else backoff_max
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._stats = {'requests': 0, 'retries': 0, 'quota_errors': 0, 'overload_errors': 0, 'wait_seconds': 0.0}
+
+    # ---------- acquire / release ----------
+
+    def _try_acquire(self) -> float:
+        """ต้องถือ lock อยู่ คืน 0 ถ้าได้สิทธิ์ ไม่เช่นนั้นคืนเวลาที่ควรรอ"""
+        if self.concurrency.in_flight >= int(self.concurrency.limit):
+            return 0.05
+        wait = self.bucket.take(time.monotonic())
+        if wait > 0:
+            return wait
+        self.concurrency.try_enter()
+        self._stats['requests'] += 1
+        return 0.0
+
+    def acquire(self):
+        """รอจนได้สิทธิ์ส่ง request (blocking)"""
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    break
+                self._condition.wait(timeout=wait)
+            self._stats['wait_seconds'] += time.monotonic() - started
+
+    async def acquire_async(self):
+        """รอจนได้สิทธิ์ส่ง request โดยไม่ block event loop"""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                wait = self._try_acquire()
+                if wait == 0:
+                    self._stats['wait_seconds'] += time.monotonic() - started
+                    return
+            await asyncio.sleep(wait)
+
+    def release(self, error: Exception = None):
+        """คืนสิทธิ์พร้อมแจ้งผลลัพธ์ของ request เพื่อปรับ limit"""
+        with self._condition:
+            self.concurrency.leave()
+            if error is None:
+                self.concurrency.on_success()
+                self.bucket.rate = min(self.bucket.max_rate, self.bucket.rate * 1.05)
+            elif is_quota_error(error):
+                self._stats['quota_errors'] += 1
+                self.concurrency.on_overload()
+                self.bucket.rate = max(self.bucket.max_rate * 0.1, self.bucket.rate * 0.5)
+                delay = suggested_retry_delay(error)
+                if delay:
+                    self.bucket.pause(delay, time.monotonic())
+            elif is_overload_error(error):
+                self._stats['overload_errors'] += 1
+                self.concurrency.on_overload()
+            self._condition.notify_all()
+
+    # ---------- call with retry ----------
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Exponential backoff แบบ full jitter (ใช้ retry_delay ของ server ถ้ามากกว่า)"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        return max(delay, suggested_retry_delay(error) or 0)
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        return attempt < self.max_retries and (is_quota_error(error) or is_overload_error(error))
+
+    def call(self, func: Callable, *args, **kwargs):
+        """เรียก func ภายใต้ limiter พร้อม retry เมื่อโดน quota/overload"""
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                self.release(e)
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self._backoff(attempt, e)
+                with self._lock:
+                    self._stats['retries'] += 1
+                print(f"   ⏳ {type(e).__name__} - retry ใน {delay:.1f} วินาที ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.release()
+            return result
+
+    async def call_async(self, func: Callable, *args, **kwargs):
+        """เหมือน call แต่สำหรับ coroutine function"""
+        attempt = 0
+        while True:
+            await self.acquire_async()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                self.release(e)
+                if not self._should_retry(e, attempt):
+                    raise
+                delay = self._backoff(attempt, e)
+                with self._lock:
+                    self._stats['retries'] += 1
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.release()
+            return result
+
+    def stats(self) -> Dict:
+        """สถิติการทำงานของ limiter"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['concurrency_limit'] = int(self.concurrency.limit)
+            stats['in_flight'] = self.concurrency.in_flight
+            stats['requests_per_minute'] = round(self.bucket.rate * 60, 2)
+            return stats
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_limiter() -> GeminiRateLimiter:
+    """Limiter ตัวเดียวที่ใช้ร่วมกันทั้ง process"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = GeminiRateLimiter()
+        return _shared_limiter
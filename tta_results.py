@@ -0,0 +1,141 @@
+"""
+ผลลัพธ์ที่ใช้ร่วมกันทุก session ใน process เดียวกัน (Streamlit รันทุก session ใน process เดียว)
+
+- 1 run = ข้อมูลชุดเดียวในหน่วยความจำ session อื่น attach ด้วย run id แทนการอัปโหลด/อ่านไฟล์ซ้ำ
+- DataFrame ถูก freeze เป็น read-only view ของ buffer เดิม (แก้ค่าในที่ไม่ได้ จึงไม่กระทบ session อื่น)
+  frame ที่มาจาก ResultSnapshot จึงใช้หน่วยความจำชุดเดียวกับ snapshot ไม่มีสำเนาที่สอง
+- นับจำนวน session ที่ attach อยู่ run ที่ไม่มีใคร attach ถูก evict แบบ LRU เมื่อเกิน SHARED_RESULTS_MAX_RUNS
+- RunHandle เก็บไว้ใน session_state เมื่อ session จบ handle ถูก GC แล้ว detach อัตโนมัติ (weakref.finalize)
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+
+
+def freeze_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """DataFrame ที่ทุกคอลัมน์ NumPy เป็น read-only view ของ df (ไม่คัดลอกข้อมูล)
+
+    ข้อความแบบ str / category / Arrow dtype แก้ในที่ไม่ได้อยู่แล้วจึงใช้ array เดิม
+    """
+    if not isinstance(df, pd.DataFrame):
+        return df
+    columns = {}
+    for col in df.columns:
+        values = df[col].to_numpy().view() if isinstance(df[col].dtype, np.dtype) else df[col].array
+        if isinstance(values, np.ndarray):
+            # ปิดการเขียนเฉพาะ view นี้ buffer เดิมยังเป็นของ df (เช่น ResultSnapshot ที่ publish)
+            values.flags.writeable = False
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+class SharedRun:
+    """ผลของ run หนึ่ง: data (ชื่อ -> DataFrame แบบ read-only) + ระบบที่ประมวลผล (ถ้ามี)"""
+
+    def __init__(self, run_id: str, label: str, frames: Dict[str, pd.DataFrame], system=None):
+        self.run_id = run_id
+        self.label = label
+        self.data = {name: freeze_frame(df) for name, df in frames.items()}
+        self.system = system
+        self.created = datetime.now()
+        self.refs = 0
+
+
+class RunHandle:
+    """การใช้ run ของหนึ่ง session (release ซ้ำได้ ครั้งที่สองไม่มีผล)"""
+
+    def __init__(self, store: 'SharedResultStore', run: SharedRun):
+        self.run_id = run.run_id
+        self.label = run.label
+        self.data = run.data
+        self.system = run.system
+        self.created = run.created
+        self._finalizer = weakref.finalize(self, store._release, run.run_id)
+
+    def release(self):
+        self._finalizer()
+
+
+class SharedResultStore:
+    """run ที่ประมวลผลแล้วของทั้ง process: publish ครั้งเดียว attach ได้หลาย session"""
+
+    def __init__(self, max_runs: int = None):
+        self.max_runs = max_runs or config.SHARED_RESULTS_MAX_RUNS
+        self._runs = OrderedDict()
+        # RLock: finalizer ของ RunHandle อาจถูกเรียกจาก GC ระหว่างที่ thread เดียวกันถือ lock อยู่
+        self._lock = threading.RLock()
+
+    def publish(self, run_id: str, label: str, frames: Dict[str, pd.DataFrame], system=None) -> SharedRun:
+        """เพิ่ม run (ถ้ามี run id นี้อยู่แล้วใช้ของเดิม)"""
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                run = SharedRun(run_id, label, frames, system)
+                self._runs[run_id] = run
+            self._runs.move_to_end(run_id)
+            self._evict(keep=run_id)
+            return run
+
+    def attach(self, run_id: str) -> Optional[RunHandle]:
+        """เพิ่ม reference ของ run (ไม่พบ = None)"""
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return None
+            run.refs += 1
+            self._runs.move_to_end(run_id)
+            return RunHandle(self, run)
+
+    def runs(self) -> List[Dict]:
+        """รายการ run ล่าสุดก่อน"""
+        with self._lock:
+            return [
+                {'run_id': run.run_id, 'label': run.label, 'created': run.created, 'sessions': run.refs}
+                for run in reversed(self._runs.values())
+            ]
+
+    def __contains__(self, run_id: str) -> bool:
+        with self._lock:
+            return run_id in self._runs
+
+    def _release(self, run_id: str):
+        with self._lock:
+            run = self._runs.get(run_id)
+            # ไม่ evict ที่นี่ (อาจถูกเรียกจาก GC ระหว่าง _evict) run ที่ว่างถูกลบตอน publish ครั้งถัดไป
+            if run is not None:
+                run.refs = max(0, run.refs - 1)
+
+    def _evict(self, keep: str = None):
+        """ลบ run ที่เก่าที่สุดที่ไม่มี session ใช้อยู่จนจำนวนไม่เกิน max_runs (เรียกขณะถือ lock)
+
+        keep: run ที่เพิ่ง publish (ยังไม่มี session attach แต่ผู้เรียกกำลังจะใช้) ไม่ถูกลบ
+        ถ้าทุก run ถูกใช้อยู่ store จะเกิน max_runs ชั่วคราวจนกว่าจะมี run ว่าง
+        """
+        while len(self._runs) > self.max_runs:
+            idle = next(
+                (run_id for run_id, run in self._runs.items() if run.refs == 0 and run_id != keep), None
+            )
+            if idle is None:
+                break
+            del self._runs[idle]
+
+
+_shared_results = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_results() -> SharedResultStore:
+    """Store ตัวเดียวที่ใช้ร่วมกันทั้ง process"""
+    global _shared_results
+    with _shared_lock:
+        if _shared_results is None:
+            _shared_results = SharedResultStore()
+        return _shared_results
@@ -0,0 +1,130 @@
+"""
+เงื่อนไขของ allowance แบบมีเงื่อนไข (CRB / rebate ขั้นบันได) และตัวคำนวณแบบ vectorized ด้วย NumPy
+
+conditions ของ allowance (ทุก field เป็น optional):
+    tiers                  [{min_purchase, rate_percent}, ...] ขั้นของ rate ตามยอดซื้อ
+    tier_mode              "whole"    = rate ของขั้นสูงสุดที่ถึง ใช้กับยอดซื้อทั้งหมด (ค่าเริ่มต้น)
+                           "marginal" = แต่ละขั้นคิด rate เฉพาะยอดซื้อส่วนที่อยู่ในขั้นนั้น
+    min_purchase           ยอดซื้อขั้นต่ำ ต่ำกว่านี้ไม่ได้ rebate
+    growth_target_percent  ต้องเติบโตจาก base_purchase อย่างน้อยกี่ %
+    base_purchase          ยอดซื้อฐานสำหรับคิดการเติบโต
+    cap_amount             rebate สูงสุด
+"""
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+
+def _number(value, default=np.nan) -> float:
+    try:
+        return float(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        return default
+
+
+class RuleSet:
+    """เงื่อนไขของหลาย allowance ในรูป array (แถวละ allowance) สำหรับคำนวณครั้งเดียวทั้งชุด"""
+
+    def __init__(self, conditions: List[Dict], base_rates) -> None:
+        n = len(conditions)
+        max_tiers = max([len((c or {}).get('tiers') or []) for c in conditions] + [1])
+
+        self.base_rate = np.nan_to_num(np.asarray(base_rates, dtype='float64'))
+        self.min_purchase = np.full(n, np.nan)
+        self.growth_target = np.full(n, np.nan)
+        self.base_purchase = np.full(n, np.nan)
+        self.cap = np.full(n, np.inf)
+        self.marginal = np.zeros(n, dtype=bool)
+        # tier ที่ไม่มีใช้ threshold = inf (ไม่มีวันถึง)
+        self.tier_floor = np.full((n, max_tiers), np.inf)
+        self.tier_rate = np.zeros((n, max_tiers))
+        self.has_tiers = np.zeros(n, dtype=bool)
+
+        for i, condition in enumerate(conditions):
+            if not condition:
+                continue
+            self.min_purchase[i] = _number(condition.get('min_purchase'))
+            self.growth_target[i] = _number(condition.get('growth_target_percent'))
+            self.base_purchase[i] = _number(condition.get('base_purchase'))
+            self.cap[i] = _number(condition.get('cap_amount'), np.inf)
+            self.marginal[i] = str(condition.get('tier_mode') or '').lower() == 'marginal'
+
+            tiers = sorted(
+                (_number(t.get('min_purchase'), 0.0), _number(t.get('rate_percent'), 0.0))
+                for t in condition.get('tiers') or [] if isinstance(t, dict)
+            )
+            if tiers:
+                self.has_tiers[i] = True
+                self.tier_floor[i, :len(tiers)] = [floor for floor, _ in tiers]
+                self.tier_rate[i, :len(tiers)] = [rate for _, rate in tiers]
+
+    def repeat(self, times: int, base_rates) -> 'RuleSet':
+        """RuleSet ชุดเดิมต่อกัน times รอบ (ใช้คำนวณหลาย scenario พร้อมกัน) โดยเปลี่ยน rate พื้นฐานได้"""
+        repeated = RuleSet.__new__(RuleSet)
+        for name, value in vars(self).items():
+            repeated.__dict__[name] = np.tile(value, (times, 1)) if value.ndim == 2 else np.tile(value, times)
+        repeated.base_rate = np.nan_to_num(np.asarray(base_rates, dtype='float64')).ravel()
+        return repeated
+
+    def __len__(self) -> int:
+        return len(self.base_rate)
+
+    def evaluate(self, purchase) -> pd.DataFrame:
+        """คำนวณ rebate (ส่วนที่เป็น rate ไม่รวม fix_amount) ของทุกแถวพร้อมกัน
+
+        Returns:
+            DataFrame คอลัมน์ rebate, applied_rate (% ที่ได้จริงเทียบยอดซื้อ), tier (ขั้นที่ถึง เริ่ม 1, 0 = ไม่ถึง),
+            condition_met และ rule_note
+        """
+        purchase = np.asarray(purchase, dtype='float64')
+        reached = purchase[:, None] >= self.tier_floor
+        tier = reached.sum(axis=1)
+
+        # whole: rate ของขั้นสูงสุดที่ถึง
+        top_rate = np.where(
+            tier > 0, self.tier_rate[np.arange(len(self)), np.maximum(tier - 1, 0)], 0.0
+        )
+        whole = purchase * top_rate / 100
+
+        # marginal: ยอดซื้อในแต่ละขั้น = min(ยอดซื้อ, floor ขั้นถัดไป) - floor ขั้นนี้
+        next_floor = np.concatenate([self.tier_floor[:, 1:], np.full((len(self), 1), np.inf)], axis=1)
+        with np.errstate(invalid='ignore'):
+            in_tier = np.clip(np.minimum(purchase[:, None], next_floor) - self.tier_floor, 0, None)
+        marginal = np.nansum(np.where(reached, in_tier, 0.0) * self.tier_rate, axis=1) / 100
+
+        rebate = np.where(
+            self.has_tiers,
+            np.where(self.marginal, marginal, whole),
+            purchase * self.base_rate / 100
+        )
+
+        below_minimum = purchase < np.nan_to_num(self.min_purchase, nan=-np.inf)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = (purchase - self.base_purchase) / self.base_purchase * 100
+        needs_growth = ~np.isnan(self.growth_target)
+        growth_unknown = needs_growth & ~(self.base_purchase > 0)
+        growth_missed = needs_growth & ~growth_unknown & (growth < self.growth_target)
+        no_tier = self.has_tiers & (tier == 0)
+
+        condition_met = ~(below_minimum | growth_unknown | growth_missed | no_tier)
+        rebate = np.minimum(np.where(condition_met, rebate, 0.0), self.cap)
+
+        note = np.full(len(self), '', dtype=object)
+        note[rebate >= self.cap] = 'ถึงเพดาน cap'
+        note[no_tier] = 'ไม่ถึงขั้นแรก'
+        note[growth_missed] = 'ไม่ถึงเป้าเติบโต'
+        note[growth_unknown] = 'ไม่มียอดฐานสำหรับคิดการเติบโต'
+        note[below_minimum] = 'ยอดซื้อไม่ถึงขั้นต่ำ'
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            applied_rate = np.where(purchase != 0, rebate / purchase * 100, 0.0)
+
+        return pd.DataFrame({
+            'rebate': rebate,
+            'applied_rate': applied_rate,
+            'tier': tier,
+            'condition_met': condition_met,
+            'rule_note': note,
+        })
@@ -0,0 +1,131 @@
+"""
+What-if scenario: เปลี่ยน rate / fix amount / ยอดซื้อ แล้วคำนวณยอดที่ควรเรียกเก็บใหม่หลาย scenario พร้อมกัน
+
+scenario เป็น dict:
+    name             ชื่อ scenario
+    rate_overrides   {"ARB": 3.0, "7001537:ARB": 2.75}  (key = category หรือ vendor_code:category)
+    fix_overrides    {"DTS": 60000}
+    exclude_months   [10, 11, 12]  ไม่นับยอดซื้อของเดือนเหล่านี้
+    exclude_quarters [4]           ไม่นับยอดซื้อของไตรมาสเหล่านี้
+    purchase_scale   0.9           คูณยอดซื้อ (เช่น ยอดซื้อลดลง 10%)
+
+ยอดซื้อถูกรวมไว้ก่อนเป็น matrix (แถว allowance × 12 เดือน) แล้วทุก scenario คำนวณด้วย matrix operation ครั้งเดียว
+"""
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from tta_rules import RuleSet
+
+BASELINE = {'name': 'Baseline'}
+
+
+def _month_mask(scenario: Dict) -> np.ndarray:
+    mask = np.ones(12)
+    for month in scenario.get('exclude_months') or []:
+        if 1 <= int(month) <= 12:
+            mask[int(month) - 1] = 0
+    for quarter in scenario.get('exclude_quarters') or []:
+        if 1 <= int(quarter) <= 4:
+            mask[(int(quarter) - 1) * 3:int(quarter) * 3] = 0
+    return mask
+
+
+class ScenarioEngine:
+    """คำนวณหลาย scenario บนผลของ calculate_allowances
+
+    Args:
+        calculated: calculated_allowances (แถวละ vendor key × allowance)
+        monthly_purchase: ยอดซื้อ (แถว × 12 เดือน) ถ้าไม่มี (หรือแถวที่เป็น 0 ทั้งแถว) จะเฉลี่ย total_purchase เท่ากันทุกเดือน
+        collected: ยอดเรียกเก็บจริงของแต่ละแถว (ไม่มี = 0)
+        conditions: conditions ของแต่ละแถว (None = ใช้ applied_rate เป็น rate คงที่)
+    """
+
+    def __init__(self, calculated: pd.DataFrame, monthly_purchase: np.ndarray = None,
+                 collected: np.ndarray = None, conditions: List = None):
+        self.rows = calculated.reset_index(drop=True)
+        n = len(self.rows)
+
+        total = pd.to_numeric(self.rows['total_purchase'], errors='coerce').fillna(0).to_numpy()
+        self.monthly = np.repeat(total[:, None] / 12, 12, axis=1)
+        if monthly_purchase is not None:
+            # แถวที่ไม่มียอดซื้อรายเดือนเลย (AP ไม่มีวันที่ / snapshot เก่า) ใช้ค่าเฉลี่ยจาก total_purchase
+            monthly = np.asarray(monthly_purchase, dtype='float64')
+            dated = (monthly.sum(axis=1) != 0) | (total == 0)
+            self.monthly[dated] = monthly[dated]
+        self.collected = np.zeros(n) if collected is None else np.nan_to_num(np.asarray(collected, dtype='float64'))
+
+        rate_column = 'rate_percent' if conditions is not None else 'applied_rate'
+        if rate_column not in self.rows.columns:
+            rate_column = 'rate_percent'
+        self.base_rate = pd.to_numeric(self.rows[rate_column], errors='coerce').fillna(0).to_numpy()
+        self.base_fix = pd.to_numeric(self.rows['fix_amount'], errors='coerce').fillna(0).to_numpy()
+        if conditions is None and 'condition_met' in self.rows.columns:
+            # ไม่มี conditions: ใช้ผลเดิมว่าผ่านเงื่อนไขหรือไม่
+            self.base_fix = np.where(self.rows['condition_met'].fillna(True).astype(bool), self.base_fix, 0.0)
+        self.rules = RuleSet(conditions if conditions is not None else [None] * n, self.base_rate)
+
+        self.category = self.rows['category_code'].astype(str).to_numpy()
+        self.vendor_category = (self.rows['vendor_code'].astype(str) + ':' + self.rows['category_code'].astype(str)).to_numpy()
+
+    def _overrides(self, scenarios: List[Dict], field: str, base: np.ndarray) -> np.ndarray:
+        """matrix (scenario × แถว) ของค่าหลัง override (vendor:category มีผลเหนือ category)"""
+        values = np.tile(base, (len(scenarios), 1))
+        for s, scenario in enumerate(scenarios):
+            overrides = scenario.get(field) or {}
+            for key, value in sorted(overrides.items(), key=lambda item: ':' in item[0]):
+                target = self.vendor_category if ':' in key else self.category
+                values[s, target == key] = float(value)
+        return values
+
+    def run(self, scenarios: List[Dict]) -> pd.DataFrame:
+        """คำนวณทุก scenario (Baseline ถูกเพิ่มเป็น scenario แรกเสมอ)
+
+        Returns:
+            DataFrame แบบ long: scenario + คอลัมน์ของแถว + purchase, should_collect,
+            actually_collected, difference, variance_pct
+        """
+        scenarios = [BASELINE] + [s for s in scenarios if s.get('name') != BASELINE['name']]
+        count, n = len(scenarios), len(self.rows)
+
+        masks = np.array([_month_mask(s) for s in scenarios])                    # (S, 12)
+        scale = np.array([float(s.get('purchase_scale', 1.0)) for s in scenarios])
+        purchase = scale[:, None] * (masks @ self.monthly.T)                       # (S, n)
+        rate = self._overrides(scenarios, 'rate_overrides', self.base_rate)       # (S, n)
+        fix = self._overrides(scenarios, 'fix_overrides', self.base_fix)          # (S, n)
+
+        evaluated = self.rules.repeat(count, rate).evaluate(purchase.ravel())
+        met = evaluated['condition_met'].to_numpy().reshape(count, n)
+        should_collect = evaluated['rebate'].to_numpy().reshape(count, n) + np.where(met, fix, 0)
+
+        difference = self.collected[None, :] - should_collect
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance_pct = np.where(should_collect > 0, difference / should_collect * 100, 0.0)
+
+        result = pd.concat([self.rows[['vendor_code', 'vendor_name', 'category_code']]] * count, ignore_index=True)
+        if 'match_key' in self.rows.columns:
+            result.insert(0, 'match_key', np.tile(self.rows['match_key'].to_numpy(), count))
+        result.insert(0, 'scenario', np.repeat([s.get('name', f'Scenario {i}') for i, s in enumerate(scenarios)], n))
+        result['rate_percent'] = rate.ravel()
+        result['fix_amount'] = fix.ravel()
+        result['purchase'] = purchase.ravel()
+        result['should_collect'] = should_collect.ravel()
+        result['actually_collected'] = np.tile(self.collected, count)
+        result['difference'] = difference.ravel()
+        result['variance_pct'] = variance_pct.ravel()
+        return result
+
+
+def summarize_scenarios(results: pd.DataFrame) -> pd.DataFrame:
+    """ยอดรวมต่อ scenario และส่วนต่างเทียบกับ Baseline"""
+    summary = results.groupby('scenario', sort=False).agg(
+        purchase=('purchase', 'sum'),
+        should_collect=('should_collect', 'sum'),
+        actually_collected=('actually_collected', 'sum'),
+        difference=('difference', 'sum')
+    ).reset_index()
+    baseline = summary.loc[summary['scenario'] == BASELINE['name'], 'should_collect']
+    summary['change_vs_baseline'] = summary['should_collect'] - (baseline.iloc[0] if len(baseline) else 0)
+    return summary
@@ -0,0 +1,148 @@
+"""
+ผลลัพธ์แบบย่อของ run หนึ่ง (ResultSnapshot) เก็บใน session / shared store แทน TTAReconciliationSystem ทั้งชุด
+
+เก็บเฉพาะสิ่งที่หน้าเว็บใช้: calculated / reconciliation / periods / summary, drill-down index
+และข้อมูลสำหรับ what-if (ยอดซื้อรายเดือน + conditions) ข้อมูล AP / AR / TTA ดิบไม่ถูกเก็บ
+คอลัมน์ข้อความที่ค่าซ้ำกันมากเป็น categorical (ใช้ Arrow dtype กับที่เหลือถ้าติดตั้ง pyarrow)
+บันทึกลงดิสก์ได้ (pickle) เพื่อเปิดต่อหลังรีสตาร์ทแอป
+"""
+
+import os
+import pickle
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import config
+from tta_scenarios import ScenarioEngine
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# คอลัมน์ข้อความที่ค่าไม่ซ้ำไม่เกินสัดส่วนนี้ของจำนวนแถวจะเป็น categorical
+CATEGORICAL_RATIO = 0.5
+
+SNAPSHOT_EXTENSION = '.snapshot.pkl'
+
+
+def compact_frame(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """ลดหน่วยความจำของ DataFrame: ข้อความซ้ำมาก -> category, float64 ที่เป็นจำนวนเต็มไม่แตะ (ใช้คำนวณต่อ)"""
+    if df is None:
+        return None
+    compact = {}
+    for col in df.columns:
+        values = df[col]
+        is_text = values.dtype == object or pd.api.types.is_string_dtype(values.dtype)
+        if is_text and not isinstance(values.dtype, pd.CategoricalDtype):
+            if values.nunique(dropna=False) <= max(1, len(values) * CATEGORICAL_RATIO):
+                values = values.astype('category')
+            elif pyarrow is not None and config.SNAPSHOT_ARROW:
+                values = values.astype(pd.ArrowDtype(pyarrow.string()))
+        compact[col] = values
+    return pd.DataFrame(compact, index=df.index)
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return 0 if df is None else int(df.memory_usage(deep=True).sum())
+
+
+class ResultSnapshot:
+    """ผลลัพธ์ที่หน้าเว็บใช้ (ชื่อ attribute เหมือน TTAReconciliationSystem เพื่อใช้แทนกันได้)"""
+
+    def __init__(self, calculated_allowances: pd.DataFrame, reconciliation_result: pd.DataFrame = None,
+                 period_result: pd.DataFrame = None, summary: pd.DataFrame = None,
+                 monthly_purchase: np.ndarray = None, allowance_conditions: List = None,
+                 drilldown: Dict = None, output_file: str = None):
+        self.calculated_allowances = compact_frame(calculated_allowances)
+        self.reconciliation_result = compact_frame(reconciliation_result)
+        self.period_result = compact_frame(period_result)
+        self.summary = compact_frame(summary)
+        self.monthly_purchase = monthly_purchase
+        self.allowance_conditions = allowance_conditions
+        self.drilldown = drilldown or {}
+        for index in self.drilldown.values():
+            index.rows = compact_frame(index.rows)
+        self.output_file = output_file
+        self.created = datetime.now()
+
+    @classmethod
+    def from_system(cls, system, output_file: str = None) -> 'ResultSnapshot':
+        """ย่อผลจาก TTAReconciliationSystem ที่ประมวลผลเสร็จแล้ว (หลังจากนี้ทิ้ง system ได้)"""
+        monthly = (
+            system.monthly_purchase_matrix()
+            if system.calculated_allowances is not None and system.ap_data is not None else None
+        )
+        return cls(
+            system.calculated_allowances,
+            system.reconciliation_result,
+            system.period_result,
+            system.generate_summary_report(),
+            monthly,
+            system.allowance_conditions,
+            system.drilldown,
+            output_file
+        )
+
+    def generate_summary_report(self) -> pd.DataFrame:
+        return self.summary
+
+    def run_scenarios(self, scenarios: List[Dict]) -> pd.DataFrame:
+        """what-if แบบเดียวกับ TTAReconciliationSystem.run_scenarios"""
+        if self.calculated_allowances is None:
+            return None
+        collected = (
+            self.reconciliation_result['actually_collected'].to_numpy()
+            if self.reconciliation_result is not None else None
+        )
+        engine = ScenarioEngine(
+            self.calculated_allowances, self.monthly_purchase, collected, self.allowance_conditions
+        )
+        return engine.run(scenarios)
+
+    def memory_usage(self) -> int:
+        """ขนาดโดยประมาณ (bytes)"""
+        frames = [self.calculated_allowances, self.reconciliation_result, self.period_result, self.summary]
+        frames += [index.rows for index in self.drilldown.values()]
+        monthly = 0 if self.monthly_purchase is None else self.monthly_purchase.nbytes
+        return sum(frame_bytes(df) for df in frames) + monthly
+
+    def save(self, path: str = None) -> str:
+        """บันทึกลงดิสก์ (ค่าเริ่มต้น: TEMP_FOLDER/snapshots/<ชื่อไฟล์ export>.snapshot.pkl)"""
+        if path is None:
+            name = os.path.basename(self.output_file or 'TTA_Reconciliation').split('.')[0]
+            path = os.path.join(snapshot_folder(), name + SNAPSHOT_EXTENSION)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @staticmethod
+    def load(path: str) -> Optional['ResultSnapshot']:
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"❌ Error loading snapshot {os.path.basename(path)}: {e}")
+            return None
+
+
+def snapshot_folder() -> str:
+    return os.path.join(config.TEMP_FOLDER, config.SNAPSHOT_FOLDER)
+
+
+def list_snapshots(folder: str = None) -> List[str]:
+    """path ของ snapshot ที่บันทึกไว้ ล่าสุดก่อน"""
+    folder = folder or snapshot_folder()
+    if not os.path.isdir(folder):
+        return []
+    paths = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(SNAPSHOT_EXTENSION)]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def snapshot_run_id(path: str) -> str:
+    """run id ของ snapshot (= ชื่อไฟล์ export เหมือน run ที่ publish จาก Analysis Mode)"""
+    return os.path.basename(path)[:-len(SNAPSHOT_EXTENSION)]
@@ -0,0 +1,115 @@
+"""
+Statement รายผู้ขาย (ส่งให้ supplier ตอนปิดปี / ใช้ตอนมีข้อโต้แย้ง): 1 workbook ต่อ vendor รวมเป็น zip
+
+- แบ่งข้อมูลตาม vendor ครั้งเดียวต่อตาราง (groupby().indices) แล้วส่งเฉพาะส่วนของ vendor นั้นให้ worker
+  ไม่มีการ filter ตารางเต็มซ้ำทีละ vendor
+- สร้าง workbook แบบขนานด้วย process pool (spawn) แต่ละ worker คืน bytes ของไฟล์
+  แล้ว process หลักเขียนลง zip ทันทีที่เสร็จ (ไม่เก็บทุกไฟล์ไว้ในหน่วยความจำ)
+"""
+
+import io
+import multiprocessing
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+import config
+from tta_excel import write_workbook
+
+# ชื่อ sheet ใน statement -> ตาราง (เรียงตามลำดับที่แสดงใน workbook)
+STATEMENT_SHEETS = ['Summary', 'Reconciliation', 'Calculated', 'Periods']
+
+
+def vendor_groups(tables: Dict[str, pd.DataFrame]) -> Dict[str, Dict]:
+    """vendor_code -> {'name': ชื่อ, 'sheets': {ชื่อตาราง: แถวของ vendor}} (group แต่ละตารางครั้งเดียว)"""
+    groups = {}
+    for sheet, df in tables.items():
+        if df is None or df.empty or 'vendor_code' not in df.columns:
+            continue
+        codes = df['vendor_code'].astype(str)
+        for code, positions in codes.groupby(codes, sort=False).indices.items():
+            rows = df.take(positions)
+            group = groups.setdefault(code, {'name': '', 'sheets': {}})
+            if not group['name'] and 'vendor_name' in rows.columns:
+                group['name'] = str(rows['vendor_name'].iloc[0])
+            group['sheets'][sheet] = rows.reset_index(drop=True)
+    return groups
+
+
+def statement_filename(vendor_code: str, vendor_name: str) -> str:
+    """ชื่อไฟล์ของ statement (ตัดอักขระที่ใช้ในชื่อไฟล์ไม่ได้)"""
+    name = re.sub(r'[\\/:*?"<>|\s]+', '_', vendor_name).strip('_')[:60]
+    return f"{vendor_code}_{name}.xlsx" if name else f"{vendor_code}.xlsx"
+
+
+def _build_statement(task: Tuple[str, str, Dict[str, pd.DataFrame]]) -> Tuple[str, bytes]:
+    """worker: สร้าง workbook ของ vendor เดียว คืน (ชื่อไฟล์, bytes)"""
+    vendor_code, vendor_name, sheets = task
+    output = io.BytesIO()
+    write_workbook({name: sheets[name] for name in STATEMENT_SHEETS if name in sheets}, output)
+    return statement_filename(vendor_code, vendor_name), output.getvalue()
+
+
+def export_vendor_statements(reconciliation: pd.DataFrame, calculated: pd.DataFrame,
+                             summary: pd.DataFrame = None, periods: pd.DataFrame = None,
+                             output_folder: str = None, vendors: List[str] = None,
+                             progress: Callable[[int, int], None] = None) -> Optional[str]:
+    """สร้าง statement ของทุก vendor (หรือเฉพาะ vendors) ลง zip ใน output_folder คืน path ของ zip
+
+    Args:
+        progress: เรียก progress(เสร็จแล้ว, ทั้งหมด) ทุกครั้งที่ statement เสร็จหนึ่งไฟล์
+    """
+    groups = vendor_groups({
+        'Summary': summary, 'Reconciliation': reconciliation, 'Calculated': calculated, 'Periods': periods
+    })
+    if vendors is not None:
+        wanted = {str(v) for v in vendors}
+        groups = {code: group for code, group in groups.items() if code in wanted}
+    if not groups:
+        print("⚠️ ไม่มีข้อมูล vendor สำหรับสร้าง statement")
+        return None
+
+    output_folder = output_folder or config.OUTPUT_FOLDER
+    os.makedirs(output_folder, exist_ok=True)
+    timestamp = datetime.now().strftime(config.EXPORT_DATE_FORMAT)
+    zip_path = os.path.join(output_folder, f"TTA_Statements_{timestamp}.zip")
+
+    tasks = [(code, group['name'], group['sheets']) for code, group in groups.items()]
+    workers = min(config.STATEMENT_WORKERS or os.cpu_count() or 1, len(tasks))
+    # ข้อมูลน้อยสร้างใน process เดียว (เริ่ม process ใหม่ต้อง import pandas / openpyxl ซ้ำ ช้ากว่างานจริง)
+    rows = sum(len(df) for _, _, sheets in tasks for df in sheets.values())
+    if rows < config.STATEMENT_PARALLEL_MIN_ROWS:
+        workers = 1
+
+    try:
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED) as bundle:
+            # xlsx บีบอัดในตัวแล้ว zip แค่เก็บ
+            def add(result, done):
+                filename, content = result
+                bundle.writestr(filename, content)
+                if progress:
+                    progress(done, len(tasks))
+
+            if workers <= 1:
+                for done, task in enumerate(tasks, 1):
+                    add(_build_statement(task), done)
+            else:
+                # spawn: ไม่ fork process ของ Streamlit ที่มีหลาย thread
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                    futures = [executor.submit(_build_statement, task) for task in tasks]
+                    for done, future in enumerate(as_completed(futures), 1):
+                        add(future.result(), done)
+
+        print(f"✅ สร้าง statement {len(tasks)} vendor: {os.path.basename(zip_path)}")
+        return zip_path
+    except Exception as e:
+        print(f"❌ Error creating vendor statements: {e}")
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        return None
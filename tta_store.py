@@ -0,0 +1,207 @@
+"""
+ที่เก็บผลการวิเคราะห์ Agreement แบบไฟล์เดียว (JSON Lines, append-only)
+แทนการเขียน/อ่าน *_summary.json ทีละไฟล์ พร้อม index ตาม vendor code เพื่อโหลดเฉพาะบาง vendor ได้
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _loads(line: bytes) -> Dict:
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def _dumps(record: Dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(record) + b'\n'
+    return (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def _vendor_key(vendor_code) -> str:
+    return str(vendor_code or '').strip()
+
+
+class ExtractionStore:
+    """เก็บผลการวิเคราะห์บรรทัดละเอกสาร (record หลังสุดของ key เดียวกันคือค่าปัจจุบัน)
+
+    index (ไฟล์ .idx.json) เก็บ byte offset ของ record ล่าสุดของแต่ละเอกสาร แยกตาม vendor
+    ถ้า index ไม่ตรงกับขนาดไฟล์จะสแกนเฉพาะส่วนที่ต่อท้ายมาใหม่ (index เป็นเพียง cache
+    append ทีละเอกสารไม่บันทึก index ให้เรียก save_index ครั้งเดียวหลังจบ run)
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(config.TEMP_FOLDER, config.EXTRACTION_STORE_FILE)
+        self.index_path = os.path.splitext(self.path)[0] + '.idx.json'
+        self._lock = threading.Lock()
+        self._keys = {}     # key -> offset
+        self._vendors = {}  # key -> vendor code
+        self._size = 0
+        self._load_index()
+
+    # ---------- index ----------
+
+    def _load_index(self):
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                self._keys = index.get('keys', {})
+                self._vendors = index.get('vendors', {})
+                self._size = index.get('size', 0)
+            except Exception as e:
+                print(f"Error loading store index: {e}")
+                self._keys, self._vendors, self._size = {}, {}, 0
+
+        file_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if file_size < self._size:
+            # ไฟล์ถูกเขียนใหม่ - index เดิมใช้ไม่ได้
+            self._keys, self._vendors, self._size = {}, {}, 0
+        if file_size > self._size:
+            self._scan_from(self._size)
+
+    def _scan_from(self, offset: int):
+        """อ่าน record ตั้งแต่ offset แล้วเพิ่มเข้า index"""
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if line.strip():
+                    try:
+                        # บรรทัดสุดท้ายอาจเขียนไม่จบ (ไม่มี newline / JSON ไม่ครบ) - _size หยุดที่ต้นบรรทัด
+                        if not line.endswith(b'\n'):
+                            raise ValueError
+                        record = _loads(line)
+                    except ValueError:
+                        break
+                    self._keys[record['key']] = offset
+                    self._vendors[record['key']] = record.get('vendor', '')
+                offset += len(line)
+        self._size = offset
+
+    def save_index(self) -> bool:
+        try:
+            with self._lock:
+                index = {'size': self._size, 'keys': self._keys, 'vendors': self._vendors}
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False)
+            return True
+        except Exception as e:
+            print(f"Error saving store index: {e}")
+            return False
+
+    # ---------- write ----------
+
+    def append(self, key: str, analysis_result: Dict) -> bool:
+        """เพิ่มผลการวิเคราะห์ของเอกสาร key (แทนที่ record เดิมของ key เดียวกัน) ไม่บันทึก index"""
+        return self._write([(key, analysis_result)])
+
+    def append_many(self, items: Iterable) -> bool:
+        """เพิ่มหลายเอกสารในการเขียนครั้งเดียว แล้วบันทึก index"""
+        return self._write(items) and self.save_index()
+
+    def _write(self, items: Iterable) -> bool:
+        saved = datetime.now().isoformat(timespec='seconds')
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with self._lock, open(self.path, 'ab') as f:
+                offset = f.tell()
+                if offset < self._size:
+                    # ไฟล์ถูกเขียนใหม่ - index เดิมใช้ไม่ได้
+                    self._keys, self._vendors, self._size = {}, {}, 0
+                if offset != self._size:
+                    # มี record ที่ต่อท้ายมาใหม่ยังไม่อยู่ใน index และ/หรือบรรทัดท้ายที่เขียนไม่จบ
+                    self._scan_from(self._size)
+                    f.truncate(self._size)
+                    offset = self._size
+                for key, analysis_result in items:
+                    vendor = _vendor_key(analysis_result.get('vendor_code'))
+                    line = _dumps({'key': key, 'vendor': vendor, 'saved': saved, 'result': analysis_result})
+                    f.write(line)
+                    self._keys[key] = offset
+                    self._vendors[key] = vendor
+                    offset += len(line)
+                self._size = offset
+        except Exception as e:
+            print(f"Error saving to store: {e}")
+            return False
+        return True
+
+    def compact(self) -> bool:
+        """เขียนไฟล์ใหม่ให้เหลือเฉพาะ record ล่าสุดของแต่ละเอกสาร"""
+        records = self._read_records(self.keys())
+        tmp_path = self.path + '.tmp'
+        try:
+            with self._lock:
+                with open(tmp_path, 'wb') as f:
+                    for record in records:
+                        f.write(_dumps(record))
+                os.replace(tmp_path, self.path)
+                self._keys, self._vendors, self._size = {}, {}, 0
+                self._scan_from(0)
+        except Exception as e:
+            print(f"Error compacting store: {e}")
+            return False
+        return self.save_index()
+
+    # ---------- read ----------
+
+    def keys(self, vendors: Iterable[str] = None) -> List[str]:
+        """key ของเอกสารทั้งหมด (หรือเฉพาะ vendor ที่ระบุ) เรียงตามตำแหน่งในไฟล์"""
+        with self._lock:
+            if vendors is None:
+                selected = list(self._keys)
+            else:
+                wanted = {_vendor_key(v) for v in vendors}
+                selected = [k for k in self._keys if self._vendors.get(k) in wanted]
+            return sorted(selected, key=self._keys.get)
+
+    def vendors(self) -> List[str]:
+        with self._lock:
+            return sorted(set(self._vendors.values()))
+
+    def _read_records(self, keys: List[str]) -> List[Dict]:
+        if not keys or not os.path.exists(self.path):
+            return []
+        with self._lock:
+            offsets = sorted(self._keys[k] for k in keys if k in self._keys)
+            total = len(self._keys)
+
+        records = []
+        with open(self.path, 'rb') as f:
+            if len(offsets) == total:
+                # โหลดทั้งหมด: อ่านทั้งไฟล์ครั้งเดียว แล้วตัด record ตาม offset ใน index
+                data = f.read()
+                for offset in offsets:
+                    end = data.find(b'\n', offset)
+                    records.append(_loads(data[offset:end if end >= 0 else len(data)]))
+            else:
+                for offset in offsets:
+                    f.seek(offset)
+                    records.append(_loads(f.readline()))
+        return records
+
+    def load(self, vendors: Iterable[str] = None, keys: Iterable[str] = None) -> List[Dict]:
+        """โหลดผลการวิเคราะห์ (ทั้งหมด / เฉพาะ vendor / เฉพาะ key)"""
+        if keys is not None:
+            with self._lock:
+                selected = [k for k in keys if k in self._keys]
+            if vendors is not None:
+                allowed = set(self.keys(vendors))
+                selected = [k for k in selected if k in allowed]
+        else:
+            selected = self.keys(vendors)
+        return [record['result'] for record in self._read_records(selected)]
+
+    def __len__(self) -> int:
+        return len(self._keys)
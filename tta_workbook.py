@@ -0,0 +1,102 @@
+"""
+อ่านไฟล์ผลลัพธ์ (Excel ที่ export จาก Analysis Mode) ในรอบเดียว พร้อมตรวจ schema ของแต่ละ sheet
+
+- Excel: เปิด workbook ครั้งเดียว (pd.ExcelFile) แล้วอ่านทุก sheet ที่ต้องใช้จาก workbook เดิม
+  แทนการเรียก pd.read_excel แยกทีละ sheet ซึ่งแตก zip / parse XML ใหม่ทุกครั้ง
+- Result bundle (.zip / โฟลเดอร์ของ Parquet + manifest ดู tta_bundle): อ่านได้โดยไม่ต้อง parse XML
+"""
+
+import os
+import re
+from typing import Dict
+
+import pandas as pd
+
+from tta_bundle import BundleError, read_bundle
+
+# sheet -> (key ใน auditor_data, คอลัมน์ที่ต้องมี, ต้องมี sheet นี้หรือไม่)
+RESULT_SHEETS = {
+    'Calculated': ('calculated', [
+        'vendor_code', 'vendor_name', 'category_code', 'rate_percent', 'fix_amount',
+        'total_purchase', 'should_collect'
+    ], True),
+    'Reconciliation': ('reconciliation', [
+        'vendor_code', 'vendor_name', 'category_code', 'category_name', 'should_collect',
+        'actually_collected', 'difference', 'status', 'variance_pct'
+    ], True),
+    'Summary': ('summary', [
+        'vendor_code', 'vendor_name', 'should_collect', 'actually_collected', 'difference',
+        'status', 'variance_pct'
+    ], True),
+    'Periods': ('periods', [
+        'vendor_code', 'vendor_name', 'category_code', 'payment_terms', 'period',
+        'purchase', 'expected', 'collected', 'difference', 'cumulative_difference'
+    ], False),
+}
+
+# คอลัมน์ code ที่ต้องอ่านเป็นข้อความ (กันเลข 0 นำหน้าหาย / period ถูกแปลงเป็นวันที่)
+TEXT_COLUMNS = ['tta_key', 'vendor_code', 'division_code', 'department_code', 'category_code', 'period']
+
+# คอลัมน์ตัวเลขที่ต้องเป็น float (ค่าที่อ่านไม่ได้ = 0)
+NUMBER_COLUMNS = [
+    'rate_percent', 'fix_amount', 'applied_rate', 'total_purchase', 'should_collect',
+    'actually_collected', 'difference', 'variance_pct', 'purchase', 'expected', 'collected',
+    'cumulative_difference'
+]
+
+
+class WorkbookError(ValueError):
+    """ไฟล์ผลลัพธ์ไม่ถูกต้อง (ไม่มี sheet / คอลัมน์ที่ต้องใช้)"""
+
+
+def _validate(sheet: str, df: pd.DataFrame) -> pd.DataFrame:
+    _, required, _ = RESULT_SHEETS[sheet]
+    missing = [col for col in required if col not in df.columns]
+    if missing:
+        raise WorkbookError(f"Sheet '{sheet}' ไม่มีคอลัมน์: {', '.join(missing)}")
+    for col in NUMBER_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('float64')
+    for col in TEXT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _collect(available, read) -> Dict[str, pd.DataFrame]:
+    """อ่านทุก sheet ที่รู้จักผ่าน read(sheet) ตรวจ schema แล้วคืน dict ตาม key ของ auditor_data"""
+    frames = {}
+    for sheet, (key, _, required) in RESULT_SHEETS.items():
+        if sheet not in available:
+            if required:
+                raise WorkbookError(f"ไม่พบ sheet '{sheet}'")
+            frames[key] = None
+            continue
+        frames[key] = _validate(sheet, read(sheet))
+    return frames
+
+
+def read_result_workbook(source) -> Dict[str, pd.DataFrame]:
+    """อ่านไฟล์ Excel ผลลัพธ์ (path หรือ file-like) เปิด workbook ครั้งเดียวแล้วอ่านทุก sheet"""
+    dtype = {col: str for col in TEXT_COLUMNS}
+    with pd.ExcelFile(source) as workbook:
+        def read(sheet):
+            # ตารางใหญ่ถูกแบ่งเป็น sheet ต่อเนื่อง <ชื่อ>_2, <ชื่อ>_3, ... (ดู tta_excel.sheet_parts)
+            parts = [s for s in workbook.sheet_names if s == sheet or re.fullmatch(re.escape(sheet) + r'_\d+', s)]
+            frames = [workbook.parse(part, dtype=dtype) for part in parts]
+            return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+        return _collect(workbook.sheet_names, read)
+
+
+def read_results(source, filename: str = None) -> Dict[str, pd.DataFrame]:
+    """อ่านไฟล์ผลลัพธ์ตามชนิด: .zip / โฟลเดอร์ = result bundle (เพิ่ม key 'manifest'), อื่นๆ = Excel"""
+    name = (filename or getattr(source, 'name', None) or str(source)).lower()
+    if name.endswith('.zip') or (isinstance(source, str) and os.path.isdir(source)):
+        try:
+            tables, manifest = read_bundle(source)
+        except BundleError as e:
+            raise WorkbookError(str(e))
+        frames = _collect(tables, tables.get)
+        frames['manifest'] = manifest
+        return frames
+    return read_result_workbook(source)